@@ -1,5 +1,9 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
 from django.shortcuts import redirect
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections, transaction
+from django.utils.functional import cached_property
 from django.utils.safestring import mark_safe
 from django.utils import timezone
 from django.db.models import Sum
@@ -8,10 +12,62 @@ import json
 
 from .models import (
     Kategori, IsKalemi, Tedarikci, Teklif, SatinAlma, GiderKategorisi, Harcama, Odeme, 
-    Malzeme, DepoHareket, Hakedis, MalzemeTalep, Depo, DepoTransfer
+    Malzeme, DepoHareket, ArsivDepoHareket, Hakedis, MalzemeTalep, Depo, DepoTransfer, DovizKuru,
+    CariBakiye
 )
-from .utils import tcmb_kur_getir 
 from .forms import DepoTransferForm 
+from .services import StockService
+from . import stok_sorgulari
+
+# Ortak stok durum etiketlerinin admin listesindeki renkleri
+ADMIN_STOK_RENKLERI = {'YOK': 'gray', 'KRİTİK': 'red', 'AZALDI': 'orange', 'YETERLİ': 'green'}
+
+
+class TahminiSayimPaginator(Paginator):
+    """
+    Büyük defter tabloları (DepoHareket, DepoTransfer) için sayfalayıcı.
+    Filtresiz listede tüm tabloyu COUNT(*) ile saymak yerine veritabanı istatistiğinden tahmin alır;
+    filtre/arama varsa (daha küçük küme) gerçek sayım yapılır. SQLite'ta istatistik olmadığından
+    (MAX(id), arşivlenen/silinen satırlar yüzünden gerçeği aşar) her zaman gerçek sayım kullanılır.
+    """
+    TAHMIN_ESIGI = 10000
+    tahmini_mi = False
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            tahmin = self._tahmini_satir_sayisi()
+            if tahmin and tahmin > self.TAHMIN_ESIGI:
+                self.tahmini_mi = True
+                return tahmin
+        return super().count
+
+    def validate_number(self, number):
+        # Tahmin gerçek satır sayısının altında kalabilir: tahmini son sayfanın ötesi boş sayfa değil, hata sayılmaz
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if not self.tahmini_mi:
+                raise
+            return int(number)
+
+    def _tahmini_satir_sayisi(self):
+        model = self.object_list.model
+        baglanti = connections[self.object_list.db]
+        if baglanti.vendor not in ('postgresql', 'mysql'):
+            return 0
+        tablo = model._meta.db_table
+        with baglanti.cursor() as cursor:
+            if baglanti.vendor == 'postgresql':
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [tablo])
+            else:
+                cursor.execute(
+                    "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+                    [tablo],
+                )
+            satir = cursor.fetchone()
+        return int(satir[0]) if satir and satir[0] else 0
+
 
 # --- YARDIMCI MODELLER ---
 class IsKalemiInline(admin.TabularInline):
@@ -26,6 +82,7 @@ class KategoriAdmin(admin.ModelAdmin):
 @admin.register(IsKalemi)
 class IsKalemiAdmin(admin.ModelAdmin):
     list_display = ('isim', 'kategori', 'hedef_miktar', 'birim', 'kdv_orani')
+    list_select_related = ('kategori',)
     list_filter = ('kategori',)
     search_fields = ('isim',)
 
@@ -56,36 +113,92 @@ class MalzemeAdmin(admin.ModelAdmin):
         queryset, use_distinct = super().get_search_results(request, queryset, search_term)
         return queryset, use_distinct
 
+    def get_queryset(self, request):
+        # Stok ve durum, listedeki tüm satırlar için tek sorguda ortak katmandan gelir (N+1 yok)
+        return stok_sorgulari.stoklu_malzemeler(super().get_queryset(request))
+
     def stok_durumu(self, obj):
-        stok = obj.stok
-        renk = "green"
-        if stok <= obj.kritik_stok:
-            renk = "red"
-        elif stok <= obj.kritik_stok * 1.2:
-            renk = "orange"
-        
-        return mark_safe(f'<span style="color:{renk}; font-weight:bold;">{stok}</span>')
+        renk = ADMIN_STOK_RENKLERI[obj.stok_durumu]
+        return mark_safe(f'<span style="color:{renk}; font-weight:bold;">{obj.hesaplanan_stok}</span>')
+    stok_durumu.admin_order_field = 'hesaplanan_stok'
     stok_durumu.short_description = "Anlık Stok"
 
 @admin.register(DepoTransfer)
 class DepoTransferAdmin(admin.ModelAdmin):
     form = DepoTransferForm
     list_display = ('tarih', 'malzeme', 'miktar', 'kaynak_depo', 'hedef_depo')
+    list_select_related = ('malzeme', 'kaynak_depo', 'hedef_depo')
     list_filter = ('kaynak_depo', 'hedef_depo')
+    # Defter tablosu: Her sayfada tüm tabloyu saymamak için
+    paginator = TahminiSayimPaginator
+    show_full_result_count = False
     autocomplete_fields = ['malzeme']
 
+    # Stok formun clean()'inden sonra başka bir işlemle azalmış olabilir: sinyaldeki kilitli kontrol
+    # ValidationError fırlatırsa kayıt geri alınır ve 500 yerine mesajla forma dönülür
+    def save_model(self, request, obj, form, change):
+        try:
+            with transaction.atomic():
+                super().save_model(request, obj, form, change)
+        except ValidationError as e:
+            request.transfer_reddedildi = True
+            self.message_user(request, f"⛔ {' '.join(e.messages)}", messages.ERROR)
+
+    def log_addition(self, request, obj, message):
+        if not getattr(request, 'transfer_reddedildi', False):
+            return super().log_addition(request, obj, message)
+
+    def response_add(self, request, obj, post_url_continue=None):
+        if getattr(request, 'transfer_reddedildi', False):
+            return redirect(request.get_full_path())
+        return super().response_add(request, obj, post_url_continue)
+
 @admin.register(DepoHareket)
 class DepoHareketAdmin(admin.ModelAdmin):
     list_display = ('tarih', 'islem_turu', 'depo', 'malzeme', 'miktar', 'tedarikci')
+    list_select_related = ('depo', 'malzeme', 'tedarikci')
     list_filter = ('islem_turu', 'depo')
+    # Defter tablosu: Her sayfada tüm tabloyu saymamak için
+    paginator = TahminiSayimPaginator
+    show_full_result_count = False
     search_fields = ('malzeme__isim', 'irsaliye_no', 'tedarikci__firma_unvani')
     autocomplete_fields = ['malzeme', 'tedarikci', 'depo']
 
+    # Admin üzerinden yapılan ekleme/düzenleme/silmeler de StokBakiye'yi güncellemeli
+    def save_model(self, request, obj, form, change):
+        StockService.hareket_kaydet(obj)
+
+    def delete_model(self, request, obj):
+        StockService.hareketleri_sil(obj)
+
+    def delete_queryset(self, request, queryset):
+        StockService.hareketleri_sil(queryset)
+
+@admin.register(ArsivDepoHareket)
+class ArsivDepoHareketAdmin(admin.ModelAdmin):
+    # Arşiv salt okunurdur (python manage.py hareket_arsivle ile dolar)
+    list_display = ('tarih', 'islem_turu', 'depo', 'malzeme', 'miktar', 'kapanis_tarihi')
+    list_select_related = ('depo', 'malzeme')
+    list_filter = ('islem_turu', 'kapanis_tarihi')
+    search_fields = ('malzeme__isim', 'irsaliye_no')
+    paginator = TahminiSayimPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 # --- TALEP YÖNETİMİ ---
 
 @admin.register(MalzemeTalep)
 class MalzemeTalepAdmin(admin.ModelAdmin):
     list_display = ('talep_ozeti', 'miktar_goster', 'talep_eden', 'oncelik_durumu', 'durum_goster', 'tarih')
+    list_select_related = ('malzeme', 'is_kalemi', 'talep_eden')
     list_filter = ('durum', 'oncelik')
     # Arama yaparken hem malzeme hem iş kalemine bak
     search_fields = ('malzeme__isim', 'is_kalemi__isim', 'aciklama')
@@ -121,6 +234,8 @@ class MalzemeTalepAdmin(admin.ModelAdmin):
 @admin.register(Teklif)
 class TeklifAdmin(admin.ModelAdmin):
     list_display = ('urun_adi', 'tedarikci', 'toplam_fiyat_goster', 'durum')
+    # urun_adi (__str__) tedarikçi + malzeme/iş kalemini okur; satır başına sorgu olmasın
+    list_select_related = ('tedarikci', 'malzeme', 'is_kalemi')
     list_filter = ('durum', 'tedarikci')
     search_fields = ('malzeme__isim', 'is_kalemi__isim', 'tedarikci__firma_unvani')
     
@@ -129,13 +244,15 @@ class TeklifAdmin(admin.ModelAdmin):
     urun_adi.short_description = "Teklif İçeriği"
 
     def toplam_fiyat_goster(self, obj):
-        return f"{obj.toplam_fiyat_tl:,.2f} TL"
+        return f"{obj.toplam_tutar_tl:,.2f} TL"
     toplam_fiyat_goster.short_description = "Toplam Tutar (KDV Dahil)"
+    toplam_fiyat_goster.admin_order_field = 'toplam_tutar_tl'
 
 @admin.register(SatinAlma)
 class SatinAlmaAdmin(admin.ModelAdmin):
     # YENİ MODEL YAPISINA GÖRE GÜNCELLENDİ
     list_display = ('teklif', 'siparis_tarihi', 'teslimat_durumu', 'ilerleme_durumu')
+    list_select_related = ('teklif__tedarikci', 'teklif__malzeme', 'teklif__is_kalemi')
     list_filter = ('teslimat_durumu', 'siparis_tarihi')
     search_fields = ('teklif__tedarikci__firma_unvani', 'teklif__malzeme__isim')
     
@@ -156,18 +273,41 @@ class SatinAlmaAdmin(admin.ModelAdmin):
 @admin.register(Odeme)
 class OdemeAdmin(admin.ModelAdmin):
     list_display = ('tedarikci', 'tutar', 'odeme_turu', 'tarih')
+    list_select_related = ('tedarikci',)
     list_filter = ('odeme_turu',)
     search_fields = ('tedarikci__firma_unvani',)
 
 @admin.register(Harcama)
 class HarcamaAdmin(admin.ModelAdmin):
     list_display = ('aciklama', 'tutar', 'kategori', 'tarih')
+    list_select_related = ('kategori',)
     list_filter = ('kategori',)
 
 @admin.register(GiderKategorisi)
 class GiderKategorisiAdmin(admin.ModelAdmin):
     pass
 
+@admin.register(DovizKuru)
+class DovizKuruAdmin(admin.ModelAdmin):
+    list_display = ('tarih', 'para_birimi', 'kur', 'doviz_satis', 'efektif_satis', 'guncelleme_tarihi')
+    list_filter = ('para_birimi',)
+    date_hierarchy = 'tarih'
+
+@admin.register(CariBakiye)
+class CariBakiyeAdmin(admin.ModelAdmin):
+    # Satırlar defterden yazılır (CariService); elle düzenlenmez
+    list_display = ('tedarikci', 'borc', 'alacak', 'bakiye', 'son_hareket_tarihi', 'guncelleme_tarihi')
+    list_select_related = ('tedarikci',)
+    search_fields = ('tedarikci__firma_unvani',)
+    ordering = ('-bakiye',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(Hakedis)
 class HakedisAdmin(admin.ModelAdmin):
-    list_display = ('satinalma', 'hakedis_no', 'tarih', 'onay_durumu')
\ No newline at end of file
+    list_display = ('satinalma', 'hakedis_no', 'tarih', 'onay_durumu')
+    list_select_related = ('satinalma__teklif__tedarikci', 'satinalma__teklif__malzeme', 'satinalma__teklif__is_kalemi')
\ No newline at end of file
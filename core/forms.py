@@ -1,7 +1,7 @@
 from django import forms
 from decimal import Decimal
 from .models import (
-    DepoTransfer, Depo, Teklif, Malzeme, 
+    DepoTransfer, SevkIrsaliyesi, Depo, Teklif, Malzeme, 
     IsKalemi, Tedarikci, MalzemeTalep, KDV_ORANLARI, Fatura, Hakedis, Odeme, Kategori
 )
 
@@ -73,6 +73,66 @@ class DepoTransferForm(forms.ModelForm):
             
         return cleaned_data
 
+# ========================================================
+# 1.1 ÇOK KALEMLİ SEVK İRSALİYESİ FORMLARI
+# ========================================================
+
+class SevkIrsaliyesiForm(forms.ModelForm):
+    class Meta:
+        model = SevkIrsaliyesi
+        fields = ['irsaliye_no', 'kaynak_depo', 'hedef_depo', 'tarih', 'aciklama']
+        widgets = {
+            'irsaliye_no': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'İrsaliye No', 'aria-label': 'İrsaliye No'}),
+            'kaynak_depo': forms.Select(attrs={'class': 'form-select', 'aria-label': 'Kaynak Depo'}),
+            'hedef_depo': forms.Select(attrs={'class': 'form-select', 'aria-label': 'Hedef Depo'}),
+            'tarih': forms.DateInput(attrs={'class': 'form-control', 'type': 'date', 'aria-label': 'Tarih'}),
+            'aciklama': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Örn: 34 ABC 123 Plakalı Kamyon', 'aria-label': 'Açıklama'}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Sanal depodan çıkış (sipariş eşleşmesi) Mal Kabul ekranından yapılır
+        self.fields['kaynak_depo'].queryset = Depo.objects.filter(is_sanal=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        kaynak = cleaned_data.get('kaynak_depo')
+        hedef = cleaned_data.get('hedef_depo')
+        if kaynak and hedef and kaynak == hedef:
+            raise forms.ValidationError("Kaynak ve Hedef depo aynı olamaz.")
+        return cleaned_data
+
+
+class TopluMalKabulForm(forms.ModelForm):
+    """Çok siparişli mal kabul belgesi: kaynak her zaman sanal depodur, kalemler siparişlerden gelir."""
+    class Meta:
+        model = SevkIrsaliyesi
+        fields = ['irsaliye_no', 'hedef_depo', 'tarih', 'aciklama']
+        widgets = {
+            'irsaliye_no': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Tedarikçi İrsaliye No', 'aria-label': 'İrsaliye No'}),
+            'hedef_depo': forms.Select(attrs={'class': 'form-select', 'aria-label': 'Hedef Depo'}),
+            'tarih': forms.DateInput(attrs={'class': 'form-control', 'type': 'date', 'aria-label': 'Tarih'}),
+            'aciklama': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Örn: 34 ABC 123 Plakalı Kamyon', 'aria-label': 'Açıklama'}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['hedef_depo'].queryset = Depo.objects.filter(is_sanal=False)
+
+
+class IrsaliyeKalemiForm(forms.Form):
+    malzeme = forms.ModelChoiceField(
+        queryset=Malzeme.objects.all(),
+        widget=forms.Select(attrs={'class': 'form-select', 'aria-label': 'Malzeme'})
+    )
+    miktar = forms.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal('0.01'),
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Miktar', 'step': '0.01', 'aria-label': 'Miktar'})
+    )
+
+
+IrsaliyeKalemiFormSet = forms.formset_factory(IrsaliyeKalemiForm, extra=3, min_num=1, validate_min=True)
+
 # ========================================================
 # 2. TEKLİF GİRİŞ FORMU
 # ========================================================
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from core.models import CariBakiye, Tedarikci
+from core.services import CariService
+
+
+class Command(BaseCommand):
+    help = (
+        'Tedarikçi cari bakiyelerini (CariBakiye) faturalar, onaylı hakedişler, ödemeler ve faturadan düşülen '
+        'iadelerden yeniden kurar. Tablo ilk kez oluşturulduktan sonra veya toplu veri aktarımından sonra çalıştırılır; '
+        'günlük kayıtlar cariyi sinyaller üzerinden kendisi günceller.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--parti', type=int, default=500, help='Tek seferde yeniden hesaplanacak tedarikçi sayısı.')
+
+    def handle(self, *args, **options):
+        parti = max(options['parti'], 1)
+        son_id, islenen = 0, 0
+
+        # id üzerinden imleçli okuma; her parti kendi işleminde kilitlenip yazılır
+        while True:
+            tedarikci_ids = list(Tedarikci.objects.filter(id__gt=son_id).order_by('id').values_list('id', flat=True)[:parti])
+            if not tedarikci_ids:
+                break
+            islenen += CariService.cari_bakiyelerini_guncelle(tedarikci_ids)
+            son_id = tedarikci_ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {islenen} tedarikçinin cari bakiyesi yeniden kuruldu "
+            f"({CariBakiye.objects.exclude(bakiye=0).count()} açık cari)."
+        ))
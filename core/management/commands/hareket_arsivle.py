@@ -0,0 +1,28 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from core.services import StockService
+
+
+class Command(BaseCommand):
+    help = (
+        'Kapanış tarihinden eski depo hareketlerini arşiv tablosuna taşır; yerlerine malzeme x depo başına '
+        'tek bir devir (açılış bakiyesi) satırı yazar. Stok bakiyeleri değişmez.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kapanis', required=True, help='Kapanış tarihi (YYYY-AA-GG). Bu tarihten ESKİ hareketler arşivlenir.')
+        parser.add_argument('--parti', type=int, default=2000, help='Tek seferde taşınacak hareket sayısı.')
+
+    def handle(self, *args, **options):
+        try:
+            kapanis = date.fromisoformat(options['kapanis'])
+        except ValueError:
+            raise CommandError("Kapanış tarihi YYYY-AA-GG biçiminde olmalı.")
+        if kapanis > date.today():
+            raise CommandError("Kapanış tarihi ileri bir tarih olamaz.")
+
+        self.stdout.write(f"📦 {kapanis:%d.%m.%Y} öncesi hareketler arşivleniyor...")
+        arsivlenen, devir = StockService.hareketleri_arsivle(kapanis, parti=options['parti'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {arsivlenen} hareket arşive taşındı, {devir} devir (açılış bakiyesi) satırı yazıldı."
+        ))
@@ -0,0 +1,46 @@
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from core.services import KurService
+from core.utils import tcmb_kurlari_akis
+
+
+class Command(BaseCommand):
+    help = (
+        'TCMB geçmiş kur bültenlerini (arşiv formatı, Örn: kurlar/202610/16102026.xml) yerel bir dizinden okuyup '
+        'DovizKuru tablosuna toplu yazar. Dosyalar akış halinde ayrıştırılır; aynı gün tekrar yüklenirse üzerine yazılır.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('dizin', help='Bülten XML dosyalarının bulunduğu dizin (alt dizinler dahil taranır).')
+        parser.add_argument('--parti', type=int, default=2000, help='Tek seferde yazılacak kur satırı sayısı.')
+
+    def handle(self, *args, **options):
+        dizin = Path(options['dizin'])
+        if not dizin.is_dir():
+            raise CommandError(f"Dizin bulunamadı: {dizin}")
+        parti = max(options['parti'], 1)
+        kodlar = KurService.doviz_kodlari()
+
+        dosyalar = sorted(dizin.rglob('*.xml'))
+        self.stdout.write(f"📂 {len(dosyalar)} bülten dosyası okunuyor...")
+
+        tampon, yazilan, hatali = [], 0, []
+        for dosya in dosyalar:
+            try:
+                # Bozuk dosyanın yarım satırları tampona karışmasın: dosya önce kendi içinde okunur
+                tampon.extend(list(tcmb_kurlari_akis(str(dosya), kodlar)))
+            except Exception as e:
+                hatali.append((dosya, e))
+                continue
+            if len(tampon) >= parti:
+                yazilan += KurService.kurlari_kaydet(tampon, parti=parti)
+                tampon = []
+        if tampon:
+            yazilan += KurService.kurlari_kaydet(tampon, parti=parti)
+
+        for dosya, hata in hatali[:20]:
+            self.stdout.write(self.style.WARNING(f"   ⚠️ {dosya.name} atlandı: {hata}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(dosyalar) - len(hatali)} bülten işlendi, {yazilan} kur satırı yazıldı"
+            f"{f', {len(hatali)} dosya atlandı' if hatali else ''}."
+        ))
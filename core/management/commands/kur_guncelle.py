@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.services import KurService
+from core.utils import TCMB_GUNLUK_URL, tcmb_kurlari_ayristir, tcmb_xml_indir
+
+
+class Command(BaseCommand):
+    help = (
+        'TCMB günlük kur bültenini (XML) indirip DovizKuru tablosuna yazar. Ekranlar kurları bu tablodan okur; '
+        'komut zamanlanmış görev (cron) ile iş günlerinde bülten saatinden sonra çalıştırılmalıdır.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=TCMB_GUNLUK_URL, help='Bülten adresi.')
+        parser.add_argument('--dosya', help='İndirmek yerine yerel bir bülten XML dosyası oku.')
+
+    def handle(self, *args, **options):
+        try:
+            if options['dosya']:
+                with open(options['dosya'], 'rb') as f:
+                    icerik = f.read()
+            else:
+                icerik = tcmb_xml_indir(options['url'])
+            tarih, kurlar = tcmb_kurlari_ayristir(icerik, kodlar=KurService.doviz_kodlari())
+        except Exception as e:
+            raise CommandError(f"Kur bülteni okunamadı: {e}")
+
+        if not kurlar:
+            raise CommandError("Bültende tanımlı para birimleri için kur bulunamadı.")
+
+        yazilan = KurService.kurlari_kaydet([(tarih, kod, degerler) for kod, degerler in kurlar.items()])
+        ozet = ', '.join(f"{kod}: {degerler['kur']}" for kod, degerler in sorted(kurlar.items()))
+        self.stdout.write(self.style.SUCCESS(f"✅ {tarih:%d.%m.%Y} bülteni: {yazilan} kur yazıldı ({ozet})."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from core.services import MaliyetService
+from core.stok_sorgulari import kullanilabilir_bakiyeler
+
+
+class Command(BaseCommand):
+    help = (
+        'Maliyet katmanlarını ve stok değerlerini (StokBakiye.maliyet_tutari) hareket geçmişinden yeniden kurar. '
+        'İlk kurulumda ve STOK_MALIYET_YONTEMI değiştirildiğinde çalıştırılır; normal akışta değerler artımlı güncellenir.'
+    )
+
+    def handle(self, *args, **options):
+        yontem = MaliyetService.yontem()
+        self.stdout.write(f"⚙️ Yöntem: {yontem} | Hareket geçmişi işleniyor...")
+
+        islenen = MaliyetService.yeniden_kur()
+
+        toplam = kullanilabilir_bakiyeler().aggregate(t=Sum('maliyet_tutari'))['t'] or 0
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {islenen} hareket işlendi. Toplam stok değeri (kullanım yerleri hariç): {toplam:,.2f} TL"
+        ))
@@ -0,0 +1,188 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, ROUND_HALF_UP
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from core.models import ArsivDepoHareket, DepoHareket, Fatura, Hakedis, Malzeme, SatinAlma, StokBakiye
+from core.services import StockService
+
+# Hakediş miktarları kayıt başına kuruşa yuvarlandığı için bu kadarlık fark sapma sayılmaz
+TOLERANS = Decimal('0.01')
+
+
+def parcalara_bol(idler, boyut):
+    return [idler[i:i + boyut] for i in range(0, len(idler), boyut)]
+
+
+def siparis_parcasi(siparis_ids):
+    """
+    Bir grup sipariş için sayaçların olması gereken değerleri gruplu sorgularla hesaplar.
+      teslim_edilen      = Malzeme: sanal depodan siparişe bağlı çıkışlar (mal kabul; canlı defter + arşiv)
+                           Hizmet : toplam_miktar x hakediş ilerleme oranları
+      faturalanan_miktar = Fatura miktarları toplamı (+ Hizmet: hakediş miktarları)
+      sanal_bekleyen / acik_mi projeksiyonları = defterdeki sanal depo bakiyesi / açıklık kuralı
+    [(siparis, {alan: (kayitli, beklenen)})] döner; sadece sapanlar.
+    """
+    try:
+        siparisler = list(SatinAlma.objects.filter(id__in=siparis_ids).select_related('teklif').only(
+            'id', 'toplam_miktar', 'teslim_edilen', 'faturalanan_miktar', 'teslimat_durumu', 'sanal_bekleyen',
+            'acik_mi', 'teklif__malzeme_id'
+        ).annotate(defter_bekleyen=StockService.sanal_bekleyen_ifadesi()))
+
+        teslimler = {}
+        for hareketler in (DepoHareket.objects, ArsivDepoHareket.objects):
+            for siparis_id, toplam in hareketler.filter(
+                siparis_id__in=siparis_ids, depo__is_sanal=True, islem_turu='cikis'
+            ).values('siparis_id').annotate(t=Sum('miktar')).values_list('siparis_id', 't'):
+                teslimler[siparis_id] = teslimler.get(siparis_id, Decimal('0')) + toplam
+
+        faturalar = dict(
+            Fatura.objects.filter(satinalma_id__in=siparis_ids)
+            .values('satinalma_id').annotate(t=Sum('miktar')).values_list('satinalma_id', 't')
+        )
+
+        hakedis_oranlari = {}
+        for satinalma_id, oran in Hakedis.objects.filter(satinalma_id__in=siparis_ids).values_list(
+            'satinalma_id', 'tamamlanma_orani'
+        ):
+            hakedis_oranlari.setdefault(satinalma_id, []).append(oran or Decimal('0'))
+
+        sapmalar = []
+        for siparis in siparisler:
+            if siparis.teklif.malzeme_id:
+                hakedis_miktari = Decimal('0')
+                beklenen_teslim = teslimler.get(siparis.id, Decimal('0'))
+            else:
+                # hakedis_ekle her hakedişte (toplam x oran / 100) kadar teslim ve fatura sayar
+                hakedis_miktari = sum(
+                    ((siparis.toplam_miktar * oran) / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                    for oran in hakedis_oranlari.get(siparis.id, [])
+                )
+                beklenen_teslim = hakedis_miktari
+            beklenen_fatura = faturalar.get(siparis.id, Decimal('0')) + hakedis_miktari
+
+            farklar = {}
+            if abs(siparis.teslim_edilen - beklenen_teslim) > TOLERANS:
+                farklar['teslim_edilen'] = (siparis.teslim_edilen, beklenen_teslim)
+            if abs(siparis.faturalanan_miktar - beklenen_fatura) > TOLERANS:
+                farklar['faturalanan_miktar'] = (siparis.faturalanan_miktar, beklenen_fatura)
+            if siparis.sanal_bekleyen != siparis.defter_bekleyen:
+                farklar['sanal_bekleyen'] = (siparis.sanal_bekleyen, siparis.defter_bekleyen)
+            beklenen_acik = siparis.defter_bekleyen > 0 or siparis.toplam_miktar > beklenen_fatura
+            if siparis.acik_mi != beklenen_acik:
+                farklar['acik_mi'] = (siparis.acik_mi, beklenen_acik)
+            if farklar:
+                sapmalar.append((siparis, farklar))
+        return sapmalar
+    finally:
+        connection.close()
+
+
+def bakiye_parcasi(malzeme_ids):
+    """
+    Bir grup malzemenin StokBakiye satırlarını defterle (canlı hareketler + devir satırları) karşılaştırır.
+    [((malzeme_id, depo_id), kayitli, beklenen)] döner; sadece sapanlar.
+    """
+    try:
+        beklenen = dict(
+            ((m_id, d_id), toplam or Decimal('0'))
+            for m_id, d_id, toplam in DepoHareket.objects.filter(malzeme_id__in=malzeme_ids, depo__isnull=False)
+            .values('malzeme_id', 'depo_id').annotate(t=Sum(StockService.imzali_miktar()))
+            .values_list('malzeme_id', 'depo_id', 't')
+        )
+        kayitli = dict(
+            ((m_id, d_id), miktar)
+            for m_id, d_id, miktar in StokBakiye.objects.filter(malzeme_id__in=malzeme_ids)
+            .values_list('malzeme_id', 'depo_id', 'miktar')
+        )
+        return [
+            (cift, kayitli.get(cift, Decimal('0')), beklenen.get(cift, Decimal('0')))
+            for cift in sorted(set(beklenen) | set(kayitli))
+            if kayitli.get(cift, Decimal('0')) != beklenen.get(cift, Decimal('0'))
+        ]
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Sipariş sayaçlarını (teslim_edilen, faturalanan_miktar, sanal_bekleyen, acik_mi) ve stok bakiyelerini (StokBakiye) '
+        'defterden (DepoHareket, Fatura, Hakediş) yeniden hesaplayıp karşılaştırır. Kayıtlar parçalar halinde '
+        'iş parçacığı havuzunda işlenir; sapmalar raporlanır, --duzelt verilirse toplu olarak düzeltilir.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duzelt', action='store_true', help='Sapmaları defterdeki değerlerle düzeltir.')
+        parser.add_argument('--parti', type=int, default=500, help='Bir iş parçacığının tek seferde işlediği kayıt sayısı.')
+        parser.add_argument('--is-parcacigi', type=int, default=4, help='Eş zamanlı iş parçacığı sayısı.')
+        parser.add_argument('--goster', type=int, default=50, help='Listelenecek en fazla sapma satırı.')
+
+    def handle(self, *args, **options):
+        self.is_parcacigi = max(options['is_parcacigi'], 1)
+        vt_adi = str(connection.settings_dict['NAME'])
+        if connection.vendor == 'sqlite' and (vt_adi in ('', ':memory:') or 'mode=memory' in vt_adi):
+            # Bellek içi SQLite iş parçacıkları arasında paylaşılmaz
+            self.is_parcacigi = 1
+
+        siparis_sapmalari = self.paralel(
+            siparis_parcasi, list(SatinAlma.objects.order_by('id').values_list('id', flat=True)), options['parti']
+        )
+        bakiye_sapmalari = self.paralel(
+            bakiye_parcasi, list(Malzeme.objects.order_by('id').values_list('id', flat=True)), options['parti']
+        )
+
+        self.raporla(siparis_sapmalari, bakiye_sapmalari, options['goster'])
+
+        if not (siparis_sapmalari or bakiye_sapmalari):
+            self.stdout.write(self.style.SUCCESS("✅ Sayaçlar ve bakiyeler defterle tutarlı."))
+        elif options['duzelt']:
+            self.duzelt(siparis_sapmalari, bakiye_sapmalari)
+        else:
+            self.stdout.write(self.style.WARNING("Düzeltmek için --duzelt ile tekrar çalıştırın."))
+
+    def paralel(self, isci, idler, parti):
+        parcalar = parcalara_bol(idler, max(parti, 1))
+        if self.is_parcacigi == 1:
+            sonuclar = map(isci, parcalar)
+            return [sapma for sonuc in sonuclar for sapma in sonuc]
+        with ThreadPoolExecutor(max_workers=self.is_parcacigi) as havuz:
+            return [sapma for sonuc in havuz.map(isci, parcalar) for sapma in sonuc]
+
+    def raporla(self, siparis_sapmalari, bakiye_sapmalari, goster):
+        self.stdout.write(f"🔎 Sipariş sayacı sapması: {len(siparis_sapmalari)} | Stok bakiyesi sapması: {len(bakiye_sapmalari)}")
+        satirlar = [
+            f"   Sipariş #{siparis.id} {alan}: kayıtlı {kayitli} -> defter {beklenen}"
+            for siparis, farklar in siparis_sapmalari for alan, (kayitli, beklenen) in farklar.items()
+        ] + [
+            f"   Bakiye (malzeme #{m_id}, depo #{d_id}): kayıtlı {kayitli} -> defter {beklenen}"
+            for (m_id, d_id), kayitli, beklenen in bakiye_sapmalari
+        ]
+        for satir in satirlar[:goster]:
+            self.stdout.write(satir)
+        if len(satirlar) > goster:
+            self.stdout.write(f"   ... ve {len(satirlar) - goster} sapma daha")
+
+    def duzelt(self, siparis_sapmalari, bakiye_sapmalari):
+        with transaction.atomic():
+            siparisler = []
+            for siparis, farklar in siparis_sapmalari:
+                for alan, (_, beklenen) in farklar.items():
+                    setattr(siparis, alan, beklenen)
+                siparis.teslimat_durumunu_hesapla()
+                siparisler.append(siparis)
+            SatinAlma.objects.bulk_update(
+                siparisler, ['teslim_edilen', 'faturalanan_miktar', 'teslimat_durumu'], batch_size=500
+            )
+            # Projeksiyonlar (sanal_bekleyen, acik_mi) düzeltilen sayaçlardan yeniden yazılır
+            StockService.siparis_ozetlerini_guncelle(siparis.id for siparis in siparisler)
+
+            # Bakiye farkları, artımlı yazma yolu ile (kilitli, bulk_update/bulk_create) uygulanır
+            StockService.bakiyeleri_toplu_guncelle({
+                cift: beklenen - kayitli for cift, kayitli, beklenen in bakiye_sapmalari
+            })
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(siparisler)} sipariş ve {len(bakiye_sapmalari)} stok bakiyesi defterle eşitlendi."
+        ))
+        if bakiye_sapmalari:
+            self.stdout.write("Stok değerleri (TL) için 'maliyet_yeniden_kur' komutunu çalıştırın.")
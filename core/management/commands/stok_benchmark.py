@@ -0,0 +1,124 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum, Q
+from core.models import Depo, Malzeme, Tedarikci, Teklif, SatinAlma, DepoHareket
+
+
+class Command(BaseCommand):
+    help = (
+        'DepoHareket üzerindeki stok sorgu şekilleri için EXPLAIN QUERY PLAN ve süre ölçümü yapar. '
+        'Sentetik hareketler bir transaction içinde üretilir ve iş bitince geri alınır.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hareket', type=int, default=200000, help='Üretilecek sentetik hareket sayısı')
+        parser.add_argument('--malzeme', type=int, default=500, help='Sentetik malzeme sayısı')
+        parser.add_argument('--depo', type=int, default=6, help='Sentetik depo sayısı')
+        parser.add_argument('--tekrar', type=int, default=20, help='Her sorgu şekli için tekrar sayısı')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.veri_uret(options['hareket'], options['malzeme'], options['depo'])
+            self.olc(options['tekrar'])
+            # Sentetik veriyi kalıcı yapma
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✅ Ölçüm tamamlandı, sentetik veriler geri alındı.'))
+
+    def veri_uret(self, hareket_sayisi, malzeme_sayisi, depo_sayisi):
+        self.stdout.write(f"🏗️ {hareket_sayisi} sentetik hareket üretiliyor...")
+        rnd = random.Random(42)
+
+        depolar = [Depo.objects.create(isim="BENCH Sanal", is_sanal=True)]
+        depolar += [Depo.objects.create(isim=f"BENCH Depo {i}") for i in range(depo_sayisi - 2)]
+        depolar.append(Depo.objects.create(isim="BENCH Şantiye", is_kullanim_yeri=True))
+
+        malzemeler = Malzeme.objects.bulk_create(
+            [Malzeme(isim=f"BENCH Malzeme {i}") for i in range(malzeme_sayisi)]
+        )
+        tedarikci = Tedarikci.objects.create(firma_unvani="BENCH Tedarikçi")
+        siparisler = []
+        for mal in malzemeler[:50]:
+            teklif = Teklif.objects.create(malzeme=mal, tedarikci=tedarikci, miktar=100, birim_fiyat=10, durum='onaylandi')
+            siparisler.append(SatinAlma.objects.create(teklif=teklif, toplam_miktar=100))
+
+        baslangic = date.today() - timedelta(days=730)
+        hareketler = []
+        for _ in range(hareket_sayisi):
+            hareketler.append(DepoHareket(
+                malzeme=rnd.choice(malzemeler),
+                depo=rnd.choice(depolar),
+                siparis=rnd.choice(siparisler) if rnd.random() < 0.2 else None,
+                islem_turu=rnd.choices(['giris', 'cikis', 'iade'], weights=[5, 4, 1])[0],
+                miktar=Decimal(rnd.randint(1, 100)),
+                tarih=baslangic + timedelta(days=rnd.randint(0, 730)),
+            ))
+        DepoHareket.objects.bulk_create(hareketler, batch_size=5000)
+
+        # Planlayıcı istatistikleri (production'da da periyodik ANALYZE önerilir)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        self.malzeme = malzemeler[0]
+        self.depo = depolar[1]
+        self.siparis = siparisler[0]
+        self.ay_basi = date.today().replace(day=1) - timedelta(days=31)
+
+    def sorgu_sekilleri(self):
+        toplamlar = dict(
+            giris=Sum('miktar', filter=Q(islem_turu='giris')),
+            cikis=Sum('miktar', filter=Q(islem_turu='cikis')),
+            iade=Sum('miktar', filter=Q(islem_turu='iade')),
+        )
+        return [
+            ("Malzeme.depo_stogu (malzeme, depo, islem_turu)",
+             DepoHareket.objects.filter(malzeme=self.malzeme, depo=self.depo)
+             .values('malzeme_id', 'depo_id').annotate(**toplamlar)),
+            ("Malzeme.stok (malzeme, depo__is_kullanim_yeri)",
+             DepoHareket.objects.filter(malzeme=self.malzeme, depo__is_kullanim_yeri=False)
+             .values('malzeme_id').annotate(**toplamlar)),
+            ("SatinAlma.sanal_depoda_bekleyen (siparis, depo__is_sanal, islem_turu)",
+             DepoHareket.objects.filter(siparis=self.siparis, depo__is_sanal=True, islem_turu='giris')
+             .values('siparis_id').annotate(t=Sum('miktar'))),
+            ("stok_hareketleri (malzeme ORDER BY tarih)",
+             DepoHareket.objects.filter(malzeme=self.malzeme).order_by('-tarih', '-id')[:50]),
+            # StockService.tarihteki_bakiyeler: kontrol noktası < tarih <= rapor tarihi
+            ("envanter_raporu_tarihli (tarih aralığı GROUP BY malzeme, depo)",
+             DepoHareket.objects.filter(tarih__gt=self.ay_basi, tarih__lte=date.today(), depo__isnull=False)
+             .values('malzeme_id', 'depo_id').annotate(**toplamlar)),
+            ("depo_dashboard son iadeler (islem_turu ORDER BY tarih)",
+             DepoHareket.objects.filter(islem_turu='iade').order_by('-tarih')[:5]),
+        ]
+
+    def olc(self, tekrar):
+        tam_tarama = []
+        for baslik, qs in self.sorgu_sekilleri():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n▶ {baslik}"))
+            plan = qs.explain()
+            self.stdout.write(plan)
+
+            # SQLite: "SCAN core_depohareket" (indeks üzerinden de olsa) tüm tabloyu dolaşır,
+            # "SEARCH ... USING INDEX" ise indeks aralığı okumadır.
+            for satir in plan.splitlines():
+                if 'SCAN core_depohareket' in satir or 'Seq Scan on core_depohareket' in satir:
+                    tam_tarama.append(baslik)
+
+            sureler = []
+            for _ in range(tekrar):
+                t0 = time.perf_counter()
+                list(qs.all())
+                sureler.append((time.perf_counter() - t0) * 1000)
+            sureler.sort()
+            self.stdout.write(
+                f"   ⏱ medyan {sureler[len(sureler) // 2]:.2f} ms | en iyi {sureler[0]:.2f} ms | en kötü {sureler[-1]:.2f} ms"
+            )
+
+        self.stdout.write("")
+        if tam_tarama:
+            self.stdout.write(self.style.ERROR(f"⛔ Tam tablo taraması kalan sorgular: {', '.join(sorted(set(tam_tarama)))}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"🚀 {connection.vendor}: DepoHareket üzerinde tam tablo taraması yok."))
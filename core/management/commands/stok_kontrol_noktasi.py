@@ -0,0 +1,50 @@
+import calendar
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from core.models import DepoHareket, StokKontrolNoktasi
+from core.services import StockService
+
+
+def ay_sonu(gun):
+    return gun.replace(day=calendar.monthrange(gun.year, gun.month)[1])
+
+
+class Command(BaseCommand):
+    help = 'Tamamlanmış her ay için ay sonu stok kontrol noktalarını (malzeme x depo kapanış bakiyesi) oluşturur.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--yeniden', action='store_true', help='Mevcut tüm kontrol noktalarını silip baştan oluşturur.')
+
+    def handle(self, *args, **options):
+        if options['yeniden']:
+            silinen, _ = StokKontrolNoktasi.objects.all().delete()
+            self.stdout.write(self.style.WARNING(f"🧹 {silinen} kontrol noktası silindi."))
+
+        ilk_tarih = DepoHareket.objects.aggregate(t=Min('tarih'))['t']
+        if not ilk_tarih:
+            self.stdout.write("Hareket kaydı yok, kontrol noktası oluşturulmadı.")
+            return
+
+        # Sadece kapanmış aylar (içinde bulunulan ay hariç)
+        son_kapanis = timezone.localdate().replace(day=1) - timedelta(days=1)
+        mevcutlar = set(StokKontrolNoktasi.objects.values_list('tarih', flat=True).distinct())
+
+        donem = ay_sonu(ilk_tarih)
+        olusan_donem = 0
+        while donem <= son_kapanis:
+            if donem not in mevcutlar:
+                # Önceki ayın kontrol noktası baz alınır; sadece o ayın hareketleri toplanır
+                bakiyeler = StockService.tarihteki_bakiyeler(donem)
+                with transaction.atomic():
+                    StokKontrolNoktasi.objects.bulk_create([
+                        StokKontrolNoktasi(tarih=donem, malzeme_id=m_id, depo_id=d_id, miktar=miktar)
+                        for (m_id, d_id), miktar in bakiyeler.items() if miktar
+                    ], batch_size=1000)
+                olusan_donem += 1
+                self.stdout.write(f"📌 {donem:%m.%Y} kapanışı: {len(bakiyeler)} malzeme x depo bakiyesi")
+            donem = ay_sonu(donem + timedelta(days=1))
+
+        self.stdout.write(self.style.SUCCESS(f"✅ {olusan_donem} dönem için kontrol noktası oluşturuldu."))
@@ -0,0 +1,120 @@
+import threading
+import time
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction, OperationalError
+from core.models import Depo, Malzeme, DepoHareket, StokBakiye
+from core.services import StockService
+
+
+class Command(BaseCommand):
+    help = (
+        'Eş zamanlı stok çıkışı stres testi: Çok sayıda iş parçacığı aynı (malzeme, depo) bakiyesinden aynı anda '
+        'transfer yapar; stoğun hiçbir an eksiye düşmediğini ve defterin bakiyeyle tuttuğunu doğrular, '
+        'saniyedeki işlem sayısını raporlar. Sentetik STRES kayıtları iş bitince silinir.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--is-parcacigi', type=int, default=16, help='Eş zamanlı iş parçacığı sayısı')
+        parser.add_argument('--transfer', type=int, default=400, help='Toplam denenecek transfer sayısı')
+        parser.add_argument('--miktar', type=Decimal, default=Decimal('1'), help='Transfer başına miktar')
+        parser.add_argument('--stok', type=Decimal, default=Decimal('250'), help='Kaynak depodaki başlangıç stoğu')
+
+    def handle(self, *args, **options):
+        vt_adi = str(connection.settings_dict['NAME'])
+        if connection.vendor == 'sqlite' and (vt_adi in ('', ':memory:') or 'mode=memory' in vt_adi):
+            raise CommandError("Bellek içi SQLite iş parçacıkları arasında paylaşılmaz; dosya veritabanı gerekir.")
+
+        kaynak = Depo.objects.create(isim="STRES Kaynak")
+        hedef = Depo.objects.create(isim="STRES Hedef")
+        malzeme = Malzeme.objects.create(isim="STRES Malzeme")
+        try:
+            StockService.hareket_olustur(malzeme=malzeme, depo=kaynak, islem_turu='giris', miktar=options['stok'],
+                                         birim_maliyet=Decimal('1'))
+            sonuc = self.calistir(malzeme, kaynak, hedef, options)
+            self.dogrula(malzeme, kaynak, hedef, options, sonuc)
+        finally:
+            malzeme.delete()
+            kaynak.delete()
+            hedef.delete()
+            self.stdout.write("🧹 STRES kayıtları silindi.")
+
+    def calistir(self, malzeme, kaynak, hedef, options):
+        is_parcacigi, toplam, miktar = options['is_parcacigi'], options['transfer'], options['miktar']
+        sayaclar = {'basarili': 0, 'reddedilen': 0, 'hata': 0}
+        kilit = threading.Lock()
+        baslat = threading.Barrier(is_parcacigi)
+
+        def isci(adet):
+            yerel = {'basarili': 0, 'reddedilen': 0, 'hata': 0}
+            try:
+                baslat.wait()
+                for _ in range(adet):
+                    try:
+                        with transaction.atomic():
+                            StockService.execute_transfer(malzeme, miktar, kaynak, hedef, aciklama="STRES")
+                        yerel['basarili'] += 1
+                    except ValidationError:
+                        yerel['reddedilen'] += 1
+                    except OperationalError:
+                        # Örn. SQLite kilit bekleme süresi aşıldı: işlem yapılmadı, geri alındı
+                        yerel['hata'] += 1
+            finally:
+                connection.close()
+                with kilit:
+                    for anahtar, deger in yerel.items():
+                        sayaclar[anahtar] += deger
+
+        paylar = [toplam // is_parcacigi + (1 if i < toplam % is_parcacigi else 0) for i in range(is_parcacigi)]
+        self.stdout.write(f"🔥 {is_parcacigi} iş parçacığı, {toplam} transfer x {miktar} | Başlangıç stoğu: {options['stok']}")
+
+        t0 = time.perf_counter()
+        threadler = [threading.Thread(target=isci, args=(pay,)) for pay in paylar]
+        for t in threadler:
+            t.start()
+        for t in threadler:
+            t.join()
+        sayaclar['sure'] = time.perf_counter() - t0
+        return sayaclar
+
+    def dogrula(self, malzeme, kaynak, hedef, options, sonuc):
+        bakiyeler = dict(StokBakiye.objects.filter(malzeme=malzeme).values_list('depo_id', 'miktar'))
+        kaynak_bakiye = bakiyeler.get(kaynak.id, Decimal('0'))
+        hedef_bakiye = bakiyeler.get(hedef.id, Decimal('0'))
+
+        # Defter sırasıyla (tarih, id) kaynak deponun yürüyen bakiyesi: hiçbir an eksiye düşmemeli
+        en_dusuk = min(
+            DepoHareket.objects.filter(malzeme=malzeme, depo=kaynak)
+            .annotate(yuruyen=StockService.yuruyen_bakiye_penceresi())
+            .values_list('yuruyen', flat=True)
+        )
+        defter_kaynak = sum(
+            StockService.hareket_etkisi(tur, miktar)
+            for tur, miktar in DepoHareket.objects.filter(malzeme=malzeme, depo=kaynak).values_list('islem_turu', 'miktar')
+        )
+
+        sure = sonuc['sure']
+        denenen = sonuc['basarili'] + sonuc['reddedilen'] + sonuc['hata']
+        self.stdout.write(
+            f"⏱ {sure:.2f} sn | {denenen / sure:.1f} işlem/sn | {sonuc['basarili'] / sure:.1f} başarılı transfer/sn"
+        )
+        self.stdout.write(
+            f"   Başarılı: {sonuc['basarili']} | Stok yetersiz (reddedildi): {sonuc['reddedilen']} | "
+            f"Kilit/DB hatası: {sonuc['hata']}"
+        )
+        self.stdout.write(f"   Kaynak bakiye: {kaynak_bakiye} | Hedef bakiye: {hedef_bakiye} | En düşük yürüyen bakiye: {en_dusuk}")
+
+        hatalar = []
+        if en_dusuk < 0 or kaynak_bakiye < 0:
+            hatalar.append("Kaynak stok eksiye düştü!")
+        if kaynak_bakiye != defter_kaynak:
+            hatalar.append(f"StokBakiye ({kaynak_bakiye}) defterle ({defter_kaynak}) tutmuyor!")
+        if kaynak_bakiye + hedef_bakiye != options['stok']:
+            hatalar.append("Toplam stok korunmadı!")
+        if options['stok'] - kaynak_bakiye != sonuc['basarili'] * options['miktar']:
+            hatalar.append("Başarılı transfer sayısı ile düşülen stok tutmuyor!")
+
+        if hatalar:
+            raise CommandError(' '.join(hatalar))
+        self.stdout.write(self.style.SUCCESS("✅ Stok hiçbir an eksiye düşmedi; defter ve bakiyeler tutarlı."))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.models import Teklif
+from core.services import CariService, FinansService
+
+
+class Command(BaseCommand):
+    help = (
+        'Teklif.toplam_tutar_tl ve toplam_tutar_orijinal kolonlarını mevcut fiyat, miktar, kur ve KDV alanlarından '
+        'yeniden eşitler (ilk doldurma 0012 migration\'ında yapılır; yeni ve düzenlenen teklifler save() ile güncellenir). '
+        'save() dışından (SQL, toplu import) değişen teklifler için çalıştırılır.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--parti', type=int, default=1000, help='Tek seferde okunup yazılacak teklif sayısı.')
+
+    def handle(self, *args, **options):
+        parti = max(options['parti'], 1)
+        son_id, islenen, degisen = 0, 0, 0
+
+        # id üzerinden imleçli okuma: tablo ne kadar büyük olursa olsun bellekte tek parti tutulur
+        while True:
+            teklifler = list(
+                Teklif.objects.filter(id__gt=son_id).order_by('id').only(
+                    'id', 'tedarikci_id', 'miktar', 'birim_fiyat', 'kur_degeri', 'kdv_dahil_mi', 'kdv_orani',
+                    'toplam_tutar_tl', 'toplam_tutar_orijinal',
+                )[:parti]
+            )
+            if not teklifler:
+                break
+
+            guncellenecekler = []
+            for teklif in teklifler:
+                eski = (teklif.toplam_tutar_tl, teklif.toplam_tutar_orijinal)
+                teklif.tutarlari_hesapla()
+                if (teklif.toplam_tutar_tl, teklif.toplam_tutar_orijinal) != eski:
+                    guncellenecekler.append(teklif)
+
+            with transaction.atomic():
+                Teklif.objects.bulk_update(guncellenecekler, ['toplam_tutar_tl', 'toplam_tutar_orijinal'])
+                # bulk_update cari sinyallerini tetiklemez; iptal iadelerinin TL değeri teklif tutarından
+                # hesaplandığı için tutarı değişen tekliflerin tedarikçi carileri yeniden yazılır
+                CariService.cari_bakiyelerini_guncelle({teklif.tedarikci_id for teklif in guncellenecekler})
+
+            islenen += len(teklifler)
+            degisen += len(guncellenecekler)
+            son_id = teklifler[-1].id
+
+        if degisen:
+            # bulk_update sinyal tetiklemez; finans paneli özeti elle geçersiz kılınır
+            FinansService.onbellegi_sil()
+        self.stdout.write(self.style.SUCCESS(f"✅ {islenen} teklif tarandı, {degisen} teklifin tutarı güncellendi."))
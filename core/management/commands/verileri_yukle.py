@@ -2,8 +2,9 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from core.models import (
     Depo, Malzeme, Tedarikci, Kategori, 
-    DepoHareket, IsKalemi, GiderKategorisi
+    DepoHareket, IsKalemi, GiderKategorisi, StokBakiye
 )
+from core.services import StockService
 
 class Command(BaseCommand):
     help = 'Sisteme test verileri yükler (Fabrika Kurulumu - Yeni Yapı)'
@@ -12,6 +13,7 @@ class Command(BaseCommand):
         self.stdout.write('🧹 Temizlik yapılıyor (Çakışma olmaması için)...')
         # Temizle komutunu çağırmak yerine manuel siliyoruz (daha güvenli)
         DepoHareket.objects.all().delete()
+        StokBakiye.objects.all().delete()
         Malzeme.objects.all().delete()
         Depo.objects.all().delete()
         Tedarikci.objects.all().delete()
@@ -73,7 +75,7 @@ class Command(BaseCommand):
         self.stdout.write('📈 Stok Hareketleri (Açılış Stokları)...')
         
         # Örnek 1: Merkeze açılış stoğu (Fiziksel var)
-        DepoHareket.objects.create(
+        StockService.hareket_olustur(
             malzeme=m1, 
             depo=merkez, 
             islem_turu='giris', 
@@ -83,7 +85,7 @@ class Command(BaseCommand):
         )
 
         # Örnek 2: Şantiyeye biraz kablo gönderilmiş olsun
-        DepoHareket.objects.create(
+        StockService.hareket_olustur(
             malzeme=m2, 
             depo=santiye, 
             islem_turu='giris', 
@@ -0,0 +1,34 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from core.services import StockService
+
+
+class Command(BaseCommand):
+    help = (
+        'Kritik stok seviyesindeki/altındaki malzemeler için (açık talepler ve yoldaki siparişler düşülerek) '
+        'taslak malzeme talepleri oluşturur.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--katsayi', type=Decimal, default=Decimal('2'), help='Hedef stok = kritik_stok x katsayı (Varsayılan: 2)')
+        parser.add_argument('--onizle', action='store_true', help='Talep oluşturmadan sadece önerileri listeler.')
+
+    def handle(self, *args, **options):
+        oneriler = StockService.yeniden_siparis_onerileri(options['katsayi'])
+
+        if not oneriler:
+            self.stdout.write(self.style.SUCCESS("✅ Kritik seviyede sipariş gerektiren malzeme yok."))
+            return
+
+        for m in oneriler:
+            self.stdout.write(
+                f"📦 {m.isim}: stok {m.hesaplanan_stok} / kritik {m.kritik_stok} | "
+                f"açık talep {m.acik_talep} | yoldaki {m.yoldaki_siparis} -> öneri {m.oneri_miktari:.2f}"
+            )
+
+        if options['onizle']:
+            self.stdout.write(self.style.WARNING(f"👀 Önizleme: {len(oneriler)} öneri, talep oluşturulmadı."))
+            return
+
+        talepler = StockService.yeniden_siparis_talepleri_olustur(oneriler)
+        self.stdout.write(self.style.SUCCESS(f"✅ {len(talepler)} taslak malzeme talebi oluşturuldu."))
@@ -0,0 +1,54 @@
+# Generated by Django 6.0.1 on 2026-10-17 20:58
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def bakiyeleri_doldur(apps, schema_editor):
+    """Mevcut DepoHareket geçmişinden (malzeme x depo) açılış bakiyelerini üretir."""
+    DepoHareket = apps.get_model('core', 'DepoHareket')
+    StokBakiye = apps.get_model('core', 'StokBakiye')
+    Sum = models.Sum
+    Q = models.Q
+
+    satirlar = DepoHareket.objects.filter(depo__isnull=False).values('malzeme_id', 'depo_id').annotate(
+        giris=Sum('miktar', filter=Q(islem_turu='giris')),
+        cikis=Sum('miktar', filter=Q(islem_turu='cikis')),
+        iade=Sum('miktar', filter=Q(islem_turu='iade')),
+    )
+
+    StokBakiye.objects.bulk_create([
+        StokBakiye(
+            malzeme_id=s['malzeme_id'],
+            depo_id=s['depo_id'],
+            miktar=(s['giris'] or Decimal('0')) - (s['cikis'] or Decimal('0')) - (s['iade'] or Decimal('0')),
+        )
+        for s in satirlar
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_depo_is_kullanim_yeri'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StokBakiye',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('miktar', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Bakiye')),
+                ('guncelleme_tarihi', models.DateTimeField(auto_now=True)),
+                ('depo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bakiyeler', to='core.depo')),
+                ('malzeme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bakiyeler', to='core.malzeme')),
+            ],
+            options={
+                'verbose_name': 'Stok Bakiyesi',
+                'verbose_name_plural': 'Stok Bakiyeleri',
+                'unique_together': {('malzeme', 'depo')},
+            },
+        ),
+        migrations.RunPython(bakiyeleri_doldur, migrations.RunPython.noop),
+    ]
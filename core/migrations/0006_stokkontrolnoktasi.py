@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-17 20:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_stokbakiye'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StokKontrolNoktasi',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tarih', models.DateField(db_index=True, verbose_name='Dönem Sonu')),
+                ('miktar', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Kapanış Bakiyesi')),
+                ('depo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kontrol_noktalari', to='core.depo')),
+                ('malzeme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kontrol_noktalari', to='core.malzeme')),
+            ],
+            options={
+                'verbose_name': 'Stok Kontrol Noktası',
+                'verbose_name_plural': 'Stok Kontrol Noktaları',
+                'unique_together': {('tarih', 'malzeme', 'depo')},
+            },
+        ),
+    ]
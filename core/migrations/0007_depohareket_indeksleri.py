@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-17 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_stokkontrolnoktasi'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='depohareket',
+            index=models.Index(fields=['malzeme', 'depo', 'islem_turu'], name='dh_malzeme_depo_islem_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='depohareket',
+            index=models.Index(fields=['siparis', 'islem_turu', 'depo'], name='dh_siparis_islem_depo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='depohareket',
+            index=models.Index(fields=['malzeme', 'tarih', 'id'], name='dh_malzeme_tarih_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='depohareket',
+            index=models.Index(fields=['tarih', 'malzeme', 'depo'], name='dh_tarih_malzeme_depo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='depohareket',
+            index=models.Index(fields=['islem_turu', 'tarih'], name='dh_islem_tarih_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0.1 on 2026-10-17 21:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_depohareket_indeksleri'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SevkIrsaliyesi',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('irsaliye_no', models.CharField(blank=True, max_length=50, verbose_name='İrsaliye No')),
+                ('tarih', models.DateField(default=django.utils.timezone.now)),
+                ('aciklama', models.CharField(blank=True, max_length=200, verbose_name='Sevkiyat Notu (Plaka vb.)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('hedef_depo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='giris_irsaliyeleri', to='core.depo', verbose_name='Hedef Depo (Nereye?)')),
+                ('kaynak_depo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cikis_irsaliyeleri', to='core.depo', verbose_name='Kaynak Depo (Nereden?)')),
+            ],
+            options={
+                'verbose_name': '8. Sevk İrsaliyesi (Çok Kalemli)',
+                'verbose_name_plural': '8. Sevk İrsaliyeleri (Çok Kalemli)',
+            },
+        ),
+        migrations.AddField(
+            model_name='depotransfer',
+            name='irsaliye',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='kalemler', to='core.sevkirsaliyesi', verbose_name='Bağlı İrsaliye'),
+        ),
+    ]
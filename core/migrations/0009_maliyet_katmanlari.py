@@ -0,0 +1,42 @@
+# Generated by Django 6.0.1 on 2026-10-17 21:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_sevkirsaliyesi'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='depohareket',
+            name='birim_maliyet',
+            field=models.DecimalField(blank=True, decimal_places=4, editable=False, max_digits=18, null=True, verbose_name='Birim Maliyet (TL)'),
+        ),
+        migrations.AddField(
+            model_name='stokbakiye',
+            name='maliyet_tutari',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Stok Değeri (TL)'),
+        ),
+        migrations.CreateModel(
+            name='MaliyetKatmani',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tarih', models.DateField()),
+                ('birim_maliyet', models.DecimalField(decimal_places=4, max_digits=18, verbose_name='Birim Maliyet (TL)')),
+                ('giris_miktari', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('kalan_miktar', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('depo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='maliyet_katmanlari', to='core.depo')),
+                ('hareket', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='maliyet_katmani', to='core.depohareket')),
+                ('malzeme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='maliyet_katmanlari', to='core.malzeme')),
+            ],
+            options={
+                'verbose_name': 'Maliyet Katmanı',
+                'verbose_name_plural': 'Maliyet Katmanları',
+                'indexes': [models.Index(fields=['malzeme', 'depo', 'tarih', 'id'], name='mk_malzeme_depo_tarih_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 6.0.1 on 2026-10-17 21:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_maliyet_katmanlari'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='depohareket',
+            name='islem_turu',
+            field=models.CharField(choices=[('giris', '📥 Depo Girişi (Satınalma/Transfer)'), ('cikis', '📤 Depo Çıkışı (Kullanım/Transfer)'), ('iade', '↩️ İade / Red (Kusurlu Mal)'), ('devir', '📋 Devir (Açılış Bakiyesi)')], max_length=10),
+        ),
+        migrations.CreateModel(
+            name='ArsivDepoHareket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orijinal_id', models.BigIntegerField(verbose_name='Orijinal Hareket ID')),
+                ('kapanis_tarihi', models.DateField(verbose_name='Arşiv Kapanış Tarihi')),
+                ('tarih', models.DateField()),
+                ('islem_turu', models.CharField(choices=[('giris', '📥 Depo Girişi (Satınalma/Transfer)'), ('cikis', '📤 Depo Çıkışı (Kullanım/Transfer)'), ('iade', '↩️ İade / Red (Kusurlu Mal)'), ('devir', '📋 Devir (Açılış Bakiyesi)')], max_length=10)),
+                ('miktar', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Miktar')),
+                ('irsaliye_no', models.CharField(blank=True, max_length=50, verbose_name='İrsaliye No')),
+                ('aciklama', models.CharField(blank=True, max_length=300, verbose_name='Açıklama / Kullanılan Yer')),
+                ('iade_sebebi', models.CharField(blank=True, max_length=200, verbose_name='Red Sebebi')),
+                ('iade_aksiyonu', models.CharField(choices=[('yok', '-'), ('degisim', '🔄 Yenisi Gelecek (Borç Düşme)'), ('iptal', '⛔ İptal Et / Faturadan Düş (Borç Düş)')], default='yok', max_length=20, verbose_name='İade Sonucu')),
+                ('kanit_gorseli', models.ImageField(blank=True, null=True, upload_to='depo_kanit/', verbose_name='Hasar/Kanıt Fotoğrafı')),
+                ('birim_maliyet', models.DecimalField(blank=True, decimal_places=4, max_digits=18, null=True, verbose_name='Birim Maliyet (TL)')),
+                ('depo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.depo', verbose_name='İlgili Depo')),
+                ('malzeme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='arsiv_hareketleri', to='core.malzeme')),
+                ('siparis', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.satinalma', verbose_name='Bağlı Sipariş')),
+                ('tedarikci', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.tedarikci', verbose_name='Tedarikçi (Giriş ise)')),
+            ],
+            options={
+                'verbose_name': 'Arşiv Hareket',
+                'verbose_name_plural': 'Arşiv Hareketler',
+                'indexes': [models.Index(fields=['malzeme', 'tarih', 'orijinal_id'], name='adh_malzeme_tarih_idx'), models.Index(fields=['tarih', 'malzeme', 'depo'], name='adh_tarih_malzeme_depo_idx')],
+            },
+        ),
+    ]
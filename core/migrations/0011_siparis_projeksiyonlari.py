@@ -0,0 +1,55 @@
+# Generated by Django 6.0.1 on 2026-10-17 21:32
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def projeksiyonlari_doldur(apps, schema_editor):
+    """Mevcut siparişlerin sanal_bekleyen ve acik_mi kolonlarını defterden hesaplar."""
+    DepoHareket = apps.get_model('core', 'DepoHareket')
+    SatinAlma = apps.get_model('core', 'SatinAlma')
+    Q = models.Q
+    Sum = models.Sum
+
+    bekleyenler = {
+        s['siparis_id']: (s['giris'] or Decimal('0')) - (s['cikis'] or Decimal('0'))
+        for s in DepoHareket.objects.filter(siparis__isnull=False, depo__is_sanal=True).values('siparis_id').annotate(
+            giris=Sum('miktar', filter=Q(islem_turu='giris')),
+            cikis=Sum('miktar', filter=Q(islem_turu='cikis')),
+        )
+    }
+
+    siparisler = list(SatinAlma.objects.only('id', 'toplam_miktar', 'faturalanan_miktar'))
+    for siparis in siparisler:
+        siparis.sanal_bekleyen = bekleyenler.get(siparis.id, Decimal('0'))
+        siparis.acik_mi = siparis.sanal_bekleyen > 0 or siparis.toplam_miktar > siparis.faturalanan_miktar
+    SatinAlma.objects.bulk_update(siparisler, ['sanal_bekleyen', 'acik_mi'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_hareket_arsivi'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='satinalma',
+            name='acik_mi',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Açık (Sevk / Fatura Bekliyor)'),
+        ),
+        migrations.AddField(
+            model_name='satinalma',
+            name='sanal_bekleyen',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Sanal Depoda Bekleyen'),
+        ),
+        migrations.AddIndex(
+            model_name='satinalma',
+            index=models.Index(fields=['acik_mi', 'created_at', 'id'], name='sa_acik_tarih_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='satinalma',
+            index=models.Index(fields=['sanal_bekleyen'], name='sa_sanal_bekleyen_idx'),
+        ),
+        migrations.RunPython(projeksiyonlari_doldur, migrations.RunPython.noop),
+    ]
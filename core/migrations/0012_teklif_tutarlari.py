@@ -0,0 +1,59 @@
+# Generated by Django 6.0.1 on 2026-10-17 21:34
+
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import migrations, models
+
+
+def teklif_tutarlarini_doldur(apps, schema_editor):
+    """
+    Mevcut tekliflerin toplam tutar kolonlarını Teklif.tutarlari_hesapla ile aynı formülle doldurur
+    (geçmiş modelde metotlar olmadığı için formül burada tekrarlanır). id imleciyle parti parti işlenir.
+    """
+    Teklif = apps.get_model('core', 'Teklif')
+    kurus = Decimal('0.01')
+    son_id = 0
+    while True:
+        teklifler = list(Teklif.objects.filter(id__gt=son_id).order_by('id').only(
+            'id', 'miktar', 'birim_fiyat', 'kur_degeri', 'kdv_dahil_mi', 'kdv_orani'
+        )[:1000])
+        if not teklifler:
+            break
+        for teklif in teklifler:
+            kdv_carpani = Decimal('1') + (Decimal('0') if teklif.kdv_orani == -1 else Decimal(str(teklif.kdv_orani))) / Decimal('100')
+            ham_tutar = Decimal(str(teklif.birim_fiyat)) * Decimal(str(teklif.miktar))
+            tutar_tl = ham_tutar * Decimal(str(teklif.kur_degeri))
+            if not teklif.kdv_dahil_mi:
+                ham_tutar, tutar_tl = ham_tutar * kdv_carpani, tutar_tl * kdv_carpani
+            teklif.toplam_tutar_tl = tutar_tl.quantize(kurus, rounding=ROUND_HALF_UP)
+            teklif.toplam_tutar_orijinal = ham_tutar.quantize(kurus, rounding=ROUND_HALF_UP)
+        Teklif.objects.bulk_update(teklifler, ['toplam_tutar_tl', 'toplam_tutar_orijinal'])
+        son_id = teklifler[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_siparis_projeksiyonlari'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teklif',
+            name='toplam_tutar_orijinal',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=18, verbose_name='Toplam Tutar (Döviz, KDV Dahil)'),
+        ),
+        migrations.AddField(
+            model_name='teklif',
+            name='toplam_tutar_tl',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=18, verbose_name='Toplam Tutar (TL, KDV Dahil)'),
+        ),
+        migrations.AddIndex(
+            model_name='teklif',
+            index=models.Index(fields=['talep', 'durum', 'toplam_tutar_tl'], name='tk_talep_durum_tutar_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teklif',
+            index=models.Index(fields=['is_kalemi', 'durum', 'toplam_tutar_tl'], name='tk_kalem_durum_tutar_idx'),
+        ),
+        migrations.RunPython(teklif_tutarlarini_doldur, migrations.RunPython.noop),
+    ]
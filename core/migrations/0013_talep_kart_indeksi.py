@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-17 21:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_teklif_tutarlari'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='malzemetalep',
+            index=models.Index(fields=['durum', 'tarih', 'id'], name='mt_durum_tarih_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-17 21:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_talep_kart_indeksi'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DovizKuru',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('para_birimi', models.CharField(choices=[('TRY', 'Türk Lirası (₺)'), ('USD', 'Amerikan Doları ($)'), ('EUR', 'Euro (€)'), ('GBP', 'İngiliz Sterlini (£)')], max_length=3, verbose_name='Para Birimi')),
+                ('tarih', models.DateField(verbose_name='Bülten Tarihi')),
+                ('kur', models.DecimalField(decimal_places=4, max_digits=12, verbose_name='Kur (TL)')),
+                ('doviz_satis', models.DecimalField(blank=True, decimal_places=4, max_digits=12, null=True, verbose_name='Döviz Satış')),
+                ('efektif_satis', models.DecimalField(blank=True, decimal_places=4, max_digits=12, null=True, verbose_name='Efektif Satış')),
+                ('guncelleme_tarihi', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Döviz Kuru',
+                'verbose_name_plural': 'Döviz Kurları',
+                'ordering': ['-tarih', 'para_birimi'],
+                'unique_together': {('para_birimi', 'tarih')},
+            },
+        ),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 6.0.1 on 2026-10-17 21:46
+
+import django.db.models.deletion
+from bisect import bisect_right
+from datetime import timedelta
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models.functions import Round
+
+
+def cari_bakiyeleri_doldur(apps, schema_editor):
+    """
+    Mevcut tedarikçilerin cari bakiyelerini defterden kurar (CariService ile aynı formül):
+      Borç = Faturalar + Onaylı hakedişler, Alacak = Ödemeler + Faturadan düşülen (iptal) iadeler
+    Dövizli ödemeler ödeme tarihindeki (yoksa 10 güne kadar önceki) bültenle, bülten yoksa son kurla TL'ye çevrilir.
+    """
+    Tedarikci = apps.get_model('core', 'Tedarikci')
+    CariBakiye = apps.get_model('core', 'CariBakiye')
+    F, Max, Sum = models.F, models.Max, models.Sum
+    iade_tutari = Round(
+        F('miktar') * F('siparis__teklif__toplam_tutar_tl') / F('siparis__teklif__miktar'), 2,
+        output_field=models.DecimalField(max_digits=18, decimal_places=2),
+    )
+    iadeler = {'islem_turu': 'iade', 'iade_aksiyonu': 'iptal', 'siparis__isnull': False, 'siparis__teklif__miktar__gt': 0}
+    kaynaklar = [
+        ('borc', 'satinalma__teklif__tedarikci_id', apps.get_model('core', 'Fatura').objects.all(), F('tutar')),
+        ('borc', 'satinalma__teklif__tedarikci_id',
+         apps.get_model('core', 'Hakedis').objects.filter(onay_durumu=True), F('odenecek_net_tutar')),
+        ('alacak', 'tedarikci_id', apps.get_model('core', 'Odeme').objects.filter(para_birimi='TRY'), F('tutar')),
+        ('alacak', 'siparis__teklif__tedarikci_id',
+         apps.get_model('core', 'DepoHareket').objects.filter(**iadeler), iade_tutari),
+        ('alacak', 'siparis__teklif__tedarikci_id',
+         apps.get_model('core', 'ArsivDepoHareket').objects.filter(**iadeler), iade_tutari),
+    ]
+
+    toplamlar = {
+        t_id: {'borc': Decimal('0'), 'alacak': Decimal('0'), 'son': None}
+        for t_id in Tedarikci.objects.values_list('id', flat=True)
+    }
+    def ekle(t_id, yon, toplam, son_tarih):
+        satir = toplamlar[t_id]
+        satir[yon] += toplam or Decimal('0')
+        if son_tarih and (satir['son'] is None or son_tarih > satir['son']):
+            satir['son'] = son_tarih
+
+    for yon, alan, sorgu, tutar in kaynaklar:
+        for t_id, toplam, son_tarih in sorgu.order_by().values(alan).annotate(
+            t=Sum(tutar), s=Max('tarih')
+        ).values_list(alan, 't', 's'):
+            ekle(t_id, yon, toplam, son_tarih)
+
+    seriler = {}
+    for kod, tarih, kur in apps.get_model('core', 'DovizKuru').objects.order_by('para_birimi', 'tarih').values_list(
+        'para_birimi', 'tarih', 'kur'
+    ):
+        tarihler, kurlar = seriler.setdefault(kod, ([], []))
+        tarihler.append(tarih)
+        kurlar.append(kur)
+    for t_id, kod, tarih, tutar in apps.get_model('core', 'Odeme').objects.exclude(para_birimi='TRY').values_list(
+        'tedarikci_id', 'para_birimi', 'tarih', 'tutar'
+    ):
+        tarihler, kurlar = seriler.get(kod, ([], []))
+        sira = bisect_right(tarihler, tarih) - 1
+        if sira >= 0 and tarih - tarihler[sira] <= timedelta(days=10):
+            kur = kurlar[sira]
+        else:
+            kur = kurlar[-1] if kurlar else Decimal('1')
+        ekle(t_id, 'alacak', (tutar * kur).quantize(Decimal('0.01')), tarih)
+
+    CariBakiye.objects.bulk_create([
+        CariBakiye(
+            tedarikci_id=t_id, borc=satir['borc'], alacak=satir['alacak'],
+            bakiye=satir['borc'] - satir['alacak'], son_hareket_tarihi=satir['son'],
+        )
+        for t_id, satir in toplamlar.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_doviz_kuru'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CariBakiye',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('borc', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Borç (TL)')),
+                ('alacak', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Alacak (TL)')),
+                ('bakiye', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Bakiye (TL)')),
+                ('son_hareket_tarihi', models.DateField(blank=True, null=True, verbose_name='Son Hareket')),
+                ('guncelleme_tarihi', models.DateTimeField(auto_now=True)),
+                ('tedarikci', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cari', to='core.tedarikci', verbose_name='Tedarikçi')),
+            ],
+            options={
+                'verbose_name': 'Cari Bakiye',
+                'verbose_name_plural': 'Cari Bakiyeler',
+                'indexes': [models.Index(fields=['bakiye', 'tedarikci'], name='cari_bakiye_idx')],
+            },
+        ),
+        migrations.RunPython(cari_bakiyeleri_doldur, migrations.RunPython.noop),
+    ]
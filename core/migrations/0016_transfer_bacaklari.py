@@ -0,0 +1,46 @@
+# Generated by Django 6.0.1 on 2026-10-17 21:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def transfer_bacaklarini_bagla(apps, schema_editor):
+    """
+    Mevcut transfer girişlerini çıkış bacaklarına bağlar. Eski kayıtlarda bağ tutulmadığından bir kez,
+    transfer yollarının yazdığı şekle göre eşlenir: ardışık id, 'ÇIKIŞ:' -> 'GİRİŞ:', aynı malzeme /
+    miktar / tarih, farklı depo. Bundan sonraki kayıtlar bağı kendisi yazar.
+    """
+    DepoHareket = apps.get_model('core', 'DepoHareket')
+    girisler = {
+        h.id: h for h in DepoHareket.objects.filter(islem_turu='giris', aciklama__startswith='GİRİŞ:').only(
+            'id', 'malzeme_id', 'depo_id', 'miktar', 'tarih'
+        )
+    }
+    cikislar = DepoHareket.objects.filter(
+        islem_turu='cikis', aciklama__startswith='ÇIKIŞ:', id__in=[g_id - 1 for g_id in girisler]
+    ).only('id', 'malzeme_id', 'depo_id', 'miktar', 'tarih')
+
+    bagli = []
+    for cikis in cikislar:
+        giris = girisler[cikis.id + 1]
+        if (cikis.malzeme_id, cikis.miktar, cikis.tarih) == (giris.malzeme_id, giris.miktar, giris.tarih) \
+                and cikis.depo_id != giris.depo_id:
+            giris.transfer_cikisi_id = cikis.id
+            bagli.append(giris)
+    DepoHareket.objects.bulk_update(bagli, ['transfer_cikisi'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_cari_bakiye'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='depohareket',
+            name='transfer_cikisi',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transfer_girisi', to='core.depohareket', verbose_name='Transfer Çıkış Bacağı'),
+        ),
+        migrations.RunPython(transfer_bacaklarini_bagla, migrations.RunPython.noop),
+    ]
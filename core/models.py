@@ -124,33 +124,17 @@ class Malzeme(models.Model):
     
     @property
     def stok(self):
-        # Tüm hareketleri depo türüne göre analiz et
-        veriler = self.hareketler.aggregate(
-            # Sadece gerçek depolardaki (Sanal ve Fiziksel) girişler
-            toplam_giris=Sum('miktar', filter=Q(islem_turu='giris', depo__is_kullanim_yeri=False)),
-            # Sadece gerçek depolardan yapılan çıkışlar (Kullanım yerine transfer bir çıkıştır)
-            toplam_cikis=Sum('miktar', filter=Q(islem_turu='cikis', depo__is_kullanim_yeri=False)),
-            # İadeler her zaman stoktan düşer
-            toplam_iade=Sum('miktar', filter=Q(islem_turu='iade'))
-        )
-        
-        giris = veriler['toplam_giris'] or Decimal('0')
-        cikis = veriler['toplam_cikis'] or Decimal('0')
-        iade = veriler['toplam_iade'] or Decimal('0')
-        
-        # Formül: Aktif depolardaki net bakiye
-        return giris - cikis - iade
+        # Kullanılabilir stok ortak sorgu katmanından okunur (bkz. core/stok_sorgulari.py).
+        # Sorgu stoklu_malzemeler() ile işaretlenmişse ek sorgu atılmaz.
+        if hasattr(self, 'hesaplanan_stok'):
+            return self.hesaplanan_stok
+        from core import stok_sorgulari
+        return stok_sorgulari.malzeme_stogu(self.id)
 
     def depo_stogu(self, depo_id):
-        # Aynı mantığı depo bazlı hesaplama için de uygula
-        veriler = self.hareketler.filter(depo_id=depo_id).aggregate(
-            t_giris=Sum('miktar', filter=models.Q(islem_turu='giris')),
-            t_cikis=Sum('miktar', filter=models.Q(islem_turu='cikis')),
-            t_iade=Sum('miktar', filter=models.Q(islem_turu='iade'))
-        )
-        return (veriler['t_giris'] or Decimal('0')) - \
-            (veriler['t_cikis'] or Decimal('0')) - \
-            (veriler['t_iade'] or Decimal('0'))
+        # Depo bazlı stok: (malzeme, depo) bakiye satırı (istek boyunca önbellekli)
+        from core import stok_sorgulari
+        return stok_sorgulari.depo_stogu(self.id, depo_id)
 
     def __str__(self):
         return f"{self.isim} ({self.marka})" if self.marka else self.isim
@@ -210,6 +194,10 @@ class MalzemeTalep(models.Model):
     class Meta:
         verbose_name_plural = "Malzeme ve Hizmet Talepleri"
         ordering = ['-tarih']
+        indexes = [
+            # İcmal / arşiv kartları: durum filtresi + (tarih, id) imleçli sayfalama
+            models.Index(fields=['durum', 'tarih', 'id'], name='mt_durum_tarih_idx'),
+        ]
 
 # ==========================================
 # 5. TEKLİFLER (FİYAT TOPLAMA)
@@ -240,6 +228,12 @@ class Teklif(models.Model):
     
     teklif_dosyasi = models.FileField(upload_to='teklifler/', blank=True, null=True, verbose_name="Teklif PDF/Resim")
     durum = models.CharField(max_length=20, choices=DURUMLAR, default='beklemede')
+
+    # Saklanan tutarlar (KDV dahil): save() sırasında toplam_fiyat_tl / toplam_fiyat_orijinal'den yazılır.
+    # Raporlar bu kolonlarla veritabanında Sum / Min yapar (mevcut kayıtlar 0012 migration'ında doldurulur;
+    # sonradan yeniden eşitleme: teklif_tutarlarini_doldur komutu).
+    toplam_tutar_tl = models.DecimalField(max_digits=18, decimal_places=2, default=0, editable=False, verbose_name="Toplam Tutar (TL, KDV Dahil)")
+    toplam_tutar_orijinal = models.DecimalField(max_digits=18, decimal_places=2, default=0, editable=False, verbose_name="Toplam Tutar (Döviz, KDV Dahil)")
     
     olusturulma_tarihi = models.DateTimeField(auto_now_add=True)
     
@@ -249,9 +243,23 @@ class Teklif(models.Model):
         if self.is_kalemi and self.malzeme:
             raise ValidationError("Aynı anda hem İş Kalemi hem Malzeme seçemezsiniz.")
 
+    def tutarlari_hesapla(self):
+        """Saklanan toplam tutar kolonlarını fiyat, miktar, kur ve KDV alanlarından yeniden hesaplar."""
+        self.toplam_tutar_tl = self.toplam_fiyat_tl
+        self.toplam_tutar_orijinal = self.toplam_fiyat_orijinal
+
     def save(self, *args, **kwargs):
+        self.tutarlari_hesapla()
         super(Teklif, self).save(*args, **kwargs)
 
+    @property
+    def birim_maliyet_tl(self):
+        """Stok maliyetine esas TL birim fiyat (KDV hariç; KDV indirilebilir olduğu için maliyete girmez)."""
+        birim = Decimal(str(self.birim_fiyat)) * Decimal(str(self.kur_degeri))
+        if self.kdv_dahil_mi and self.kdv_orani not in (-1, 0):
+            birim = birim / (Decimal('1') + Decimal(str(self.kdv_orani)) / Decimal('100'))
+        return birim.quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
+
     @property
     def toplam_fiyat_tl(self):
         # 1. KDV oranını güvenli şekilde al
@@ -299,6 +307,11 @@ class Teklif(models.Model):
     class Meta:
         verbose_name = "3. Teklifler (Fiyat Toplama)"
         verbose_name_plural = "3. Teklifler (Fiyat Toplama)"
+        indexes = [
+            # İcmal / finans: talep ve iş kalemi bazında durum + en düşük tutar
+            models.Index(fields=['talep', 'durum', 'toplam_tutar_tl'], name='tk_talep_durum_tutar_idx'),
+            models.Index(fields=['is_kalemi', 'durum', 'toplam_tutar_tl'], name='tk_kalem_durum_tutar_idx'),
+        ]
 
 
 # ==========================================
@@ -322,19 +335,40 @@ class SatinAlma(models.Model):
     teslim_edilen = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Depoya Giren (Fiziksel)")
     faturalanan_miktar = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Faturası Gelen (Finansal)")
     fiili_odenen_tutar = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Şu Ana Kadar Ödenen")
+
+    # Projeksiyon alanları: Defter ve fatura değiştikçe StockService.siparis_ozetlerini_guncelle ile yazılır.
+    # Listeler bunlar üzerinden SQL'de süzülür/sıralanır (sipariş başına aggregate sorgusu yapılmaz).
+    sanal_bekleyen = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False, verbose_name="Sanal Depoda Bekleyen")
+    acik_mi = models.BooleanField(default=True, editable=False, verbose_name="Açık (Sevk / Fatura Bekliyor)")
     
     aciklama = models.TextField(blank=True, verbose_name="Notlar")
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def save(self, *args, **kwargs):
+    def teslimat_durumunu_hesapla(self):
+        """Teslim edilen miktara göre durumu belirler (save() ve toplu düzeltmeler ortak kullanır)."""
         if self.teslim_edilen == 0:
             self.teslimat_durumu = 'bekliyor'
         elif 0 < self.teslim_edilen < self.toplam_miktar:
             self.teslimat_durumu = 'kismi'
         elif self.teslim_edilen >= self.toplam_miktar:
             self.teslimat_durumu = 'tamamlandi'
-            
+        return self.teslimat_durumu
+
+    # Projeksiyonu (acik_mi) etkileyen sayaçlar; sanal_bekleyen defter yazımında ayrıca güncellenir
+    OZET_ALANLARI = frozenset({'toplam_miktar', 'faturalanan_miktar', 'teslim_edilen'})
+
+    def save(self, *args, **kwargs):
+        from core.services import StockService
+
+        self.teslimat_durumunu_hesapla()
         super(SatinAlma, self).save(*args, **kwargs)
+        # Sadece ilgisiz kolonlar yazıldıysa (ör. sinyaldeki teslimat_durumu) projeksiyon değişmez
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not self.OZET_ALANLARI.intersection(update_fields):
+            return
+        # Bellekteki projeksiyon bayat olabilir; defterden yeniden yazılır ve geri okunur
+        StockService.siparis_ozetlerini_guncelle([self.pk])
+        self.refresh_from_db(fields=['sanal_bekleyen', 'acik_mi'])
 
     @property
     def kalan_miktar(self):
@@ -352,9 +386,8 @@ class SatinAlma(models.Model):
 
     @property
     def sanal_depoda_bekleyen(self):
-        girisler = self.depo_hareketleri.filter(depo__is_sanal=True, islem_turu='giris').aggregate(Sum('miktar'))['miktar__sum'] or Decimal('0')
-        cikislar = self.depo_hareketleri.filter(depo__is_sanal=True, islem_turu='cikis').aggregate(Sum('miktar'))['miktar__sum'] or Decimal('0')
-        return max(girisler - cikislar, Decimal('0'))
+        # Projeksiyon kolonundan okunur (bkz. sanal_bekleyen); sorgu çalıştırmaz
+        return max(self.sanal_bekleyen, Decimal('0'))
 
     def __str__(self):
         return f"{self.teklif.tedarikci} - {self.teklif.malzeme.isim if self.teklif.malzeme else self.teklif.is_kalemi.isim} (Kalan: {self.kalan_miktar})"
@@ -362,6 +395,12 @@ class SatinAlma(models.Model):
     class Meta:
         verbose_name = "4. Satınalma & Siparişler"
         verbose_name_plural = "4. Satınalma & Siparişler"
+        indexes = [
+            # siparis_listesi: açık / kapalı ayrımı + tarih sıralaması (imleçli sayfalama)
+            models.Index(fields=['acik_mi', 'created_at', 'id'], name='sa_acik_tarih_idx'),
+            # mal_kabul: sanal depoda malı bekleyenler
+            models.Index(fields=['sanal_bekleyen'], name='sa_sanal_bekleyen_idx'),
+        ]
 
 
 # ==========================================
@@ -409,6 +448,34 @@ class Harcama(models.Model):
         ordering = ['-tarih']
 
 
+# ==========================================
+# 8. DÖVİZ KURLARI (TCMB)
+# ==========================================
+
+class DovizKuru(models.Model):
+    """
+    TCMB gösterge niteliğindeki kurların yerel kopyası (bülten tarihi x para birimi).
+    'kur_guncelle' komutu doldurur; ekranlar ağa çıkmadan bu tablodan okur
+    (bkz. core/services.py -> KurService).
+    kur = Efektif satış, yoksa döviz satış (1 birim döviz için TL)
+    """
+    para_birimi = models.CharField(max_length=3, choices=PARA_BIRIMI_CHOICES, verbose_name="Para Birimi")
+    tarih = models.DateField(verbose_name="Bülten Tarihi")
+    kur = models.DecimalField(max_digits=12, decimal_places=4, verbose_name="Kur (TL)")
+    doviz_satis = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True, verbose_name="Döviz Satış")
+    efektif_satis = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True, verbose_name="Efektif Satış")
+    guncelleme_tarihi = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.para_birimi} {self.tarih:%d.%m.%Y}: {self.kur}"
+
+    class Meta:
+        verbose_name = "Döviz Kuru"
+        verbose_name_plural = "Döviz Kurları"
+        ordering = ['-tarih', 'para_birimi']
+        unique_together = ('para_birimi', 'tarih')
+
+
 # ==========================================
 # 9. HAREKET GEÇMİŞİ & SEVKİYAT
 # ==========================================
@@ -418,6 +485,7 @@ class DepoHareket(models.Model):
         ('giris', '📥 Depo Girişi (Satınalma/Transfer)'),
         ('cikis', '📤 Depo Çıkışı (Kullanım/Transfer)'),
         ('iade', '↩️ İade / Red (Kusurlu Mal)'),
+        ('devir', '📋 Devir (Açılış Bakiyesi)'),
     ]
     
     IADE_AKSIYONLARI = [
@@ -443,15 +511,177 @@ class DepoHareket(models.Model):
     iade_aksiyonu = models.CharField(max_length=20, choices=IADE_AKSIYONLARI, default='yok', verbose_name="İade Sonucu")
     kanit_gorseli = models.ImageField(upload_to='depo_kanit/', blank=True, null=True, verbose_name="Hasar/Kanıt Fotoğrafı")
 
+    # Kayıt anındaki TL birim maliyet (Giriş: katman maliyeti, Çıkış/İade: tüketilen maliyet). bkz. MaliyetService
+    birim_maliyet = models.DecimalField(max_digits=18, decimal_places=4, null=True, blank=True, editable=False, verbose_name="Birim Maliyet (TL)")
+    # Transfer GİRİŞ bacağının maliyetini devraldığı ÇIKIŞ bacağı (StockService transfer yolları yazar)
+    transfer_cikisi = models.OneToOneField(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+        related_name='transfer_girisi', verbose_name="Transfer Çıkış Bacağı"
+    )
+
     def __str__(self):
         return f"{self.get_islem_turu_display()} - {self.malzeme.isim}"
 
     class Meta:
         verbose_name = "Hareket Geçmişi (Log)"
         verbose_name_plural = "Hareket Geçmişi (Log)"
+        # Stok sorgularının gerçek şekillerine göre bileşik indeksler
+        # (Kontrol: python manage.py stok_benchmark)
+        indexes = [
+            # Malzeme.stok / depo_stogu / bakiye yeniden hesaplama: (malzeme, depo, islem_turu)
+            models.Index(fields=['malzeme', 'depo', 'islem_turu'], name='dh_malzeme_depo_islem_idx'),
+            # SatinAlma.sanal_depoda_bekleyen: (siparis, islem_turu) + depo__is_sanal
+            models.Index(fields=['siparis', 'islem_turu', 'depo'], name='dh_siparis_islem_depo_idx'),
+            # stok_hareketleri: malzeme filtresi + tarih sıralaması
+            models.Index(fields=['malzeme', 'tarih', 'id'], name='dh_malzeme_tarih_idx'),
+            # Tarihli envanter (kontrol noktasından sonraki hareketler): tarih aralığı
+            models.Index(fields=['tarih', 'malzeme', 'depo'], name='dh_tarih_malzeme_depo_idx'),
+            # depo_dashboard son iadeler: islem_turu + tarih sıralaması
+            models.Index(fields=['islem_turu', 'tarih'], name='dh_islem_tarih_idx'),
+        ]
+
+
+class ArsivDepoHareket(models.Model):
+    """
+    Kapanış tarihinden eski, arşivlenmiş DepoHareket kayıtları (python manage.py hareket_arsivle).
+    Canlı defterde bunların yerini malzeme x depo başına tek bir 'devir' (açılış bakiyesi) satırı alır;
+    stok sorguları bu tabloya girmez, sadece geçmiş ekranları ve tarihli envanter okur.
+    """
+    orijinal_id = models.BigIntegerField(verbose_name="Orijinal Hareket ID")
+    kapanis_tarihi = models.DateField(verbose_name="Arşiv Kapanış Tarihi")
+
+    malzeme = models.ForeignKey(Malzeme, on_delete=models.CASCADE, related_name='arsiv_hareketleri')
+    depo = models.ForeignKey(Depo, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="İlgili Depo")
+    siparis = models.ForeignKey('SatinAlma', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Bağlı Sipariş")
+
+    tarih = models.DateField()
+    islem_turu = models.CharField(max_length=10, choices=DepoHareket.ISLEM_TURLERI)
+    miktar = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Miktar")
+
+    tedarikci = models.ForeignKey(Tedarikci, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Tedarikçi (Giriş ise)")
+    irsaliye_no = models.CharField(max_length=50, blank=True, verbose_name="İrsaliye No")
+    aciklama = models.CharField(max_length=300, blank=True, verbose_name="Açıklama / Kullanılan Yer")
+
+    iade_sebebi = models.CharField(max_length=200, blank=True, verbose_name="Red Sebebi")
+    iade_aksiyonu = models.CharField(max_length=20, choices=DepoHareket.IADE_AKSIYONLARI, default='yok', verbose_name="İade Sonucu")
+    kanit_gorseli = models.ImageField(upload_to='depo_kanit/', blank=True, null=True, verbose_name="Hasar/Kanıt Fotoğrafı")
+    birim_maliyet = models.DecimalField(max_digits=18, decimal_places=4, null=True, blank=True, verbose_name="Birim Maliyet (TL)")
+
+    def __str__(self):
+        return f"[Arşiv] {self.get_islem_turu_display()} - {self.malzeme.isim}"
+
+    class Meta:
+        verbose_name = "Arşiv Hareket"
+        verbose_name_plural = "Arşiv Hareketler"
+        indexes = [
+            # stok_hareketleri (arşiv modu): malzeme filtresi + tarih sıralaması
+            models.Index(fields=['malzeme', 'tarih', 'orijinal_id'], name='adh_malzeme_tarih_idx'),
+            # Tarihli envanter: tarih aralığı
+            models.Index(fields=['tarih', 'malzeme', 'depo'], name='adh_tarih_malzeme_depo_idx'),
+        ]
+
+
+class StokBakiye(models.Model):
+    """
+    Malzeme x Depo bazında anlık stok bakiyesi (Materialized).
+    DepoHareket yazan her işlem bu tabloyu aynı transaction içinde günceller
+    (bkz. core/services.py -> StockService).
+    Bakiye = Giriş - Çıkış - İade
+    """
+    malzeme = models.ForeignKey(Malzeme, on_delete=models.CASCADE, related_name='bakiyeler')
+    depo = models.ForeignKey(Depo, on_delete=models.CASCADE, related_name='bakiyeler')
+    miktar = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Bakiye")
+    # Stok değeri (TL). Yöntem settings.STOK_MALIYET_YONTEMI: FIFO veya AGIRLIKLI_ORTALAMA
+    maliyet_tutari = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name="Stok Değeri (TL)")
+    guncelleme_tarihi = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.malzeme.isim} @ {self.depo.isim}: {self.miktar}"
+
+    @property
+    def ortalama_maliyet(self):
+        if self.miktar <= 0:
+            return Decimal('0')
+        return (self.maliyet_tutari / self.miktar).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
+
+    class Meta:
+        verbose_name = "Stok Bakiyesi"
+        verbose_name_plural = "Stok Bakiyeleri"
+        unique_together = ('malzeme', 'depo')
+
+
+class MaliyetKatmani(models.Model):
+    """
+    Stok maliyet katmanı: her GİRİŞ hareketi bir katman açar (Miktar x TL birim maliyet).
+    Çıkış/İade hareketleri katmanları en eskiden başlayarak (FIFO) tüketir.
+    Katmanlar hareket yazılırken güncellenir (bkz. core/services.py -> MaliyetService).
+    """
+    hareket = models.OneToOneField(DepoHareket, on_delete=models.CASCADE, related_name='maliyet_katmani')
+    malzeme = models.ForeignKey(Malzeme, on_delete=models.CASCADE, related_name='maliyet_katmanlari')
+    depo = models.ForeignKey(Depo, on_delete=models.CASCADE, related_name='maliyet_katmanlari')
+    tarih = models.DateField()
+    birim_maliyet = models.DecimalField(max_digits=18, decimal_places=4, verbose_name="Birim Maliyet (TL)")
+    giris_miktari = models.DecimalField(max_digits=15, decimal_places=2)
+    kalan_miktar = models.DecimalField(max_digits=15, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.malzeme.isim} @ {self.depo.isim}: {self.kalan_miktar} x {self.birim_maliyet}"
+
+    class Meta:
+        verbose_name = "Maliyet Katmanı"
+        verbose_name_plural = "Maliyet Katmanları"
+        indexes = [
+            # Çıkışta (malzeme, depo) açık katmanları FIFO sırasıyla okuma
+            models.Index(fields=['malzeme', 'depo', 'tarih', 'id'], name='mk_malzeme_depo_tarih_idx'),
+        ]
+
+
+class StokKontrolNoktasi(models.Model):
+    """
+    Ay sonu kapanış bakiyesi (Malzeme x Depo).
+    'Şu tarihteki stok' sorguları en yakın kontrol noktasından başlar ve
+    sadece sonrasındaki hareketleri toplar (bkz. StockService.tarihteki_bakiyeler).
+    Oluşturma: python manage.py stok_kontrol_noktasi
+    """
+    tarih = models.DateField(db_index=True, verbose_name="Dönem Sonu")
+    malzeme = models.ForeignKey(Malzeme, on_delete=models.CASCADE, related_name='kontrol_noktalari')
+    depo = models.ForeignKey(Depo, on_delete=models.CASCADE, related_name='kontrol_noktalari')
+    miktar = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Kapanış Bakiyesi")
+
+    def __str__(self):
+        return f"{self.tarih} | {self.malzeme.isim} @ {self.depo.isim}: {self.miktar}"
+
+    class Meta:
+        verbose_name = "Stok Kontrol Noktası"
+        verbose_name_plural = "Stok Kontrol Noktaları"
+        unique_together = ('tarih', 'malzeme', 'depo')
+
+
+class SevkIrsaliyesi(models.Model):
+    """
+    Çok kalemli sevkiyat belgesi (Tek kamyon = Tek irsaliye).
+    Kalemleri DepoTransfer kayıtlarıdır (irsaliye.kalemler) ve
+    StockService.execute_bulk_transfer ile toplu olarak yazılır.
+    """
+    irsaliye_no = models.CharField(max_length=50, blank=True, verbose_name="İrsaliye No")
+    kaynak_depo = models.ForeignKey(Depo, on_delete=models.CASCADE, related_name='cikis_irsaliyeleri', verbose_name="Kaynak Depo (Nereden?)")
+    hedef_depo = models.ForeignKey(Depo, on_delete=models.CASCADE, related_name='giris_irsaliyeleri', verbose_name="Hedef Depo (Nereye?)")
+
+    tarih = models.DateField(default=timezone.now)
+    aciklama = models.CharField(max_length=200, blank=True, verbose_name="Sevkiyat Notu (Plaka vb.)")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"İrsaliye #{self.irsaliye_no or self.id} ({self.kaynak_depo.isim} → {self.hedef_depo.isim})"
+
+    class Meta:
+        verbose_name = "8. Sevk İrsaliyesi (Çok Kalemli)"
+        verbose_name_plural = "8. Sevk İrsaliyeleri (Çok Kalemli)"
 
 
 class DepoTransfer(models.Model):
+    irsaliye = models.ForeignKey(SevkIrsaliyesi, on_delete=models.CASCADE, related_name='kalemler', null=True, blank=True, verbose_name="Bağlı İrsaliye")
     kaynak_depo = models.ForeignKey(Depo, on_delete=models.CASCADE, related_name='cikis_transferleri', verbose_name="Kaynak Depo (Nereden?)")
     hedef_depo = models.ForeignKey(Depo, on_delete=models.CASCADE, related_name='giris_transferleri', verbose_name="Hedef Depo (Nereye?)")
     bagli_siparis = models.ForeignKey('SatinAlma', related_name='transferler', on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Bağlı Sipariş")
@@ -606,12 +836,18 @@ class Fatura(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def save(self, *args, **kwargs):
+        from core.services import StockService
+
         is_new = self.pk is None
         super(Fatura, self).save(*args, **kwargs)
         
         if is_new:
-            self.satinalma.faturalanan_miktar += self.miktar
-            self.satinalma.save()
+            # Faturalanan miktarın TEK artırıldığı yer burasıdır; F() ile yarış durumunda kayıp olmaz
+            SatinAlma.objects.filter(pk=self.satinalma_id).update(
+                faturalanan_miktar=models.F('faturalanan_miktar') + self.miktar
+            )
+            StockService.siparis_ozetlerini_guncelle([self.satinalma_id])
+            self.satinalma.refresh_from_db(fields=['faturalanan_miktar', 'sanal_bekleyen', 'acik_mi'])
 
     def __str__(self):
         try:
@@ -658,4 +894,31 @@ class Odeme(models.Model):
     class Meta:
         verbose_name = "7. Ödeme & Çek Çıkışı"
         verbose_name_plural = "7. Ödeme & Çek Çıkışı"
-        ordering = ['-tarih']
\ No newline at end of file
+        ordering = ['-tarih']
+
+class CariBakiye(models.Model):
+    """
+    Tedarikçi başına cari hesap özeti (Materialized).
+    Fatura, Hakediş, Ödeme ve iade kayıtları değiştiğinde ilgili tedarikçi için aynı transaction
+    içinde defterden yeniden yazılır (bkz. core/services.py -> CariService).
+    Borç   = Faturalar + Onaylı hakedişler (ödenecek net)
+    Alacak = Ödemeler + Faturadan düşülen iadeler (iade_aksiyonu='iptal')
+    """
+    tedarikci = models.OneToOneField(Tedarikci, on_delete=models.CASCADE, related_name='cari', verbose_name="Tedarikçi")
+    borc = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name="Borç (TL)")
+    alacak = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name="Alacak (TL)")
+    # Sıralama/filtre için saklanır (borc - alacak)
+    bakiye = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name="Bakiye (TL)")
+    son_hareket_tarihi = models.DateField(null=True, blank=True, verbose_name="Son Hareket")
+    guncelleme_tarihi = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.tedarikci.firma_unvani}: {self.bakiye}"
+
+    class Meta:
+        verbose_name = "Cari Bakiye"
+        verbose_name_plural = "Cari Bakiyeler"
+        indexes = [
+            # finans_ozeti: bakiyeye göre sıralı / filtreli imleçli sayfalama
+            models.Index(fields=['bakiye', 'tedarikci'], name='cari_bakiye_idx'),
+        ]
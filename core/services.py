@@ -1,8 +1,537 @@
 # core/services.py
-from django.db import transaction
-from core.models import DepoHareket
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum, Max, Count, Case, When, Value, Window, BooleanField, DecimalField, OuterRef, Subquery
+from django.db.models.lookups import GreaterThan
+from django.db.models.functions import Coalesce, Round, TruncDay, TruncWeek, TruncMonth
+from django.utils import timezone
+from core import stok_sorgulari
+from core.models import (
+    PARA_BIRIMI_CHOICES, ArsivDepoHareket, CariBakiye, DepoHareket, DepoTransfer, DovizKuru, Fatura, Hakedis, Harcama,
+    IsKalemi, MaliyetKatmani, Malzeme, MalzemeTalep, Odeme, SatinAlma, StokBakiye, StokKontrolNoktasi, Tedarikci, Teklif
+)
+
+# Otomatik yeniden sipariş taleplerinin açıklaması (Tekrar çalıştırmada tanımak için)
+OTO_TALEP_NOTU = "Otomatik yeniden sipariş önerisi (Kritik stok altı)"
+
+# Hareket türünün bakiyeye etkisi (Giriş ve Devir artırır, Çıkış ve İade düşürür)
+ISLEM_YONU = {
+    'giris': Decimal('1'),
+    'cikis': Decimal('-1'),
+    'iade': Decimal('-1'),
+    'devir': Decimal('1'),
+}
+
+# Maliyet katmanı açan hareket türleri (Devir: arşivlenen dönemin açılış bakiyesi)
+GIRIS_TURLERI = ('giris', 'devir')
+
+# Arşivleme sırasında DepoHareket'ten ArsivDepoHareket'e taşınan alanlar
+ARSIV_ALANLARI = (
+    'malzeme_id', 'depo_id', 'siparis_id', 'tarih', 'islem_turu', 'miktar', 'tedarikci_id', 'irsaliye_no',
+    'aciklama', 'iade_sebebi', 'iade_aksiyonu', 'kanit_gorseli', 'birim_maliyet',
+)
 
 class StockService:
+    @staticmethod
+    def hareket_etkisi(islem_turu, miktar):
+        """Bir hareketin (malzeme, depo) bakiyesine işaretli etkisi."""
+        return ISLEM_YONU.get(islem_turu, Decimal('0')) * Decimal(str(miktar or 0))
+
+    @staticmethod
+    def bakiye_guncelle(malzeme_id, depo_id, fark, maliyet_farki=Decimal('0')):
+        """
+        StokBakiye satırını (miktar ve TL değer) F() ile günceller, satır yoksa oluşturur.
+        Depo'suz hareketler (depo silinmiş vb.) bakiyeye yansımaz.
+        """
+        if not depo_id or not (fark or maliyet_farki):
+            return
+        stok_sorgulari.onbellegi_temizle()
+
+        def guncelle():
+            return StokBakiye.objects.filter(
+                malzeme_id=malzeme_id, depo_id=depo_id
+            ).update(
+                miktar=F('miktar') + fark,
+                maliyet_tutari=F('maliyet_tutari') + maliyet_farki,
+                guncelleme_tarihi=timezone.now(),  # update() auto_now'ı tetiklemez
+            )
+
+        if guncelle():
+            return
+        try:
+            with transaction.atomic():
+                StokBakiye.objects.create(malzeme_id=malzeme_id, depo_id=depo_id, miktar=fark, maliyet_tutari=maliyet_farki)
+        except IntegrityError:
+            # Eş zamanlı başka bir işlem aynı satırı önce oluşturdu: fark artımlı UPDATE ile eklenir
+            guncelle()
+
+    @staticmethod
+    def bakiyeleri_toplu_guncelle(farklar, maliyet_farklari=None):
+        """
+        {(malzeme_id, depo_id): fark} sözlüğündeki tüm bakiye değişikliklerini tek okuma,
+        bir bulk_update ve bir bulk_create ile uygular. Transaction içinde çağrılmalıdır.
+        maliyet_farklari: aynı anahtarlarla TL değer değişimleri (opsiyonel)
+        """
+        maliyet_farklari = maliyet_farklari or {}
+        farklar = {
+            anahtar: fark for anahtar, fark in farklar.items()
+            if anahtar[1] and (fark or maliyet_farklari.get(anahtar))
+        }
+        if not farklar:
+            return
+        stok_sorgulari.onbellegi_temizle()
+
+        mevcutlar = {
+            (b.malzeme_id, b.depo_id): b
+            for b in StokBakiye.objects.select_for_update().filter(
+                malzeme_id__in={m for m, _ in farklar}, depo_id__in={d for _, d in farklar}
+            )
+        }
+
+        simdi = timezone.now()
+        guncellenecekler, yeniler = [], []
+        for (malzeme_id, depo_id), fark in farklar.items():
+            bakiye = mevcutlar.get((malzeme_id, depo_id))
+            maliyet_farki = maliyet_farklari.get((malzeme_id, depo_id), Decimal('0'))
+            if bakiye:
+                bakiye.miktar += fark
+                bakiye.maliyet_tutari += maliyet_farki
+                bakiye.guncelleme_tarihi = simdi
+                guncellenecekler.append(bakiye)
+            else:
+                yeniler.append(StokBakiye(malzeme_id=malzeme_id, depo_id=depo_id, miktar=fark, maliyet_tutari=maliyet_farki))
+
+        StokBakiye.objects.bulk_update(guncellenecekler, ['miktar', 'maliyet_tutari', 'guncelleme_tarihi'], batch_size=500)
+        try:
+            with transaction.atomic():
+                StokBakiye.objects.bulk_create(yeniler, batch_size=500)
+        except IntegrityError:
+            # Satırlardan biri eş zamanlı oluşturuldu: yeniler tek tek (UPDATE, yoksa INSERT) yazılır
+            for bakiye in yeniler:
+                StockService.bakiye_guncelle(bakiye.malzeme_id, bakiye.depo_id, bakiye.miktar, bakiye.maliyet_tutari)
+
+    @staticmethod
+    def yeniden_siparis_onerileri(hedef_katsayi=Decimal('2')):
+        """
+        Kritik stok seviyesinde/altında olan malzemeler için sipariş önerileri (TEK sorgu).
+        Öneri = kritik_stok x hedef_katsayi - (stok + açık talepler + yoldaki siparişler)
+        - Açık talep: henüz siparişe dönmemiş (bekliyor / islemde) MalzemeTalep miktarı
+        - Yoldaki sipariş: tamamlanmamış SatinAlma'ların teslim edilmemiş kısmı
+        """
+        ondalik = DecimalField(max_digits=15, decimal_places=2)
+        sifir = Value(Decimal('0'))
+
+        acik_talep = MalzemeTalep.objects.filter(
+            malzeme=OuterRef('pk'), durum__in=['bekliyor', 'islemde']
+        ).values('malzeme').annotate(t=Sum('miktar')).values('t')
+
+        yoldaki = SatinAlma.objects.filter(
+            teklif__malzeme=OuterRef('pk')
+        ).exclude(teslimat_durumu='tamamlandi').values('teklif__malzeme').annotate(
+            t=Sum(F('toplam_miktar') - F('teslim_edilen'))
+        ).values('t')
+
+        return list(
+            Malzeme.objects.annotate(
+                hesaplanan_stok=stok_sorgulari.stok_ifadesi(),
+                acik_talep=Coalesce(Subquery(acik_talep, output_field=ondalik), sifir, output_field=ondalik),
+                yoldaki_siparis=Coalesce(Subquery(yoldaki, output_field=ondalik), sifir, output_field=ondalik),
+            ).annotate(
+                oneri_miktari=F('kritik_stok') * Value(Decimal(str(hedef_katsayi)))
+                - F('hesaplanan_stok') - F('acik_talep') - F('yoldaki_siparis'),
+            ).filter(
+                hesaplanan_stok__lte=F('kritik_stok'), oneri_miktari__gt=0
+            ).order_by('isim', 'id')
+        )
+
+    @staticmethod
+    @transaction.atomic
+    def yeniden_siparis_talepleri_olustur(oneriler, talep_eden=None):
+        """Öneri listesinden 'bekliyor' durumunda taslak MalzemeTalep kayıtlarını toplu oluşturur."""
+        return MalzemeTalep.objects.bulk_create([
+            MalzemeTalep(
+                malzeme=malzeme,
+                miktar=malzeme.oneri_miktari.quantize(Decimal('0.01')),
+                oncelik='acil' if malzeme.hesaplanan_stok <= 0 else 'normal',
+                durum='bekliyor',
+                talep_eden=talep_eden,
+                aciklama=OTO_TALEP_NOTU,
+            )
+            for malzeme in oneriler
+        ], batch_size=500)
+
+    @staticmethod
+    def bakiye_sorgusu(ciftler=None, depo_id=None):
+        """
+        Toplu stok sorgusu için StokBakiye queryset'i.
+        ciftler: [(malzeme_id, depo_id), ...] -> sadece bu çiftler (IN ile tek sorgu, çiftler Python'da süzülür)
+        depo_id: verilirse o depodaki tüm malzemeler
+        """
+        bakiyeler = StokBakiye.objects.all()
+        if depo_id is not None:
+            bakiyeler = bakiyeler.filter(depo_id=depo_id)
+        if ciftler is not None:
+            bakiyeler = bakiyeler.filter(
+                malzeme_id__in={m for m, _ in ciftler}, depo_id__in={d for _, d in ciftler}
+            )
+        return bakiyeler
+
+    @staticmethod
+    def stok_kilitle(istenen, isimler=None):
+        """
+        Stok düşen işlemlerin kilit kapısı. istenen: {(malzeme_id, depo_id): düşülecek miktar}.
+        İlgili StokBakiye satırları SELECT ... FOR UPDATE ile (kilitlenme/deadlock olmasın diye hep aynı
+        sırada) kilitlenir ve miktarlar kilit altında yeniden okunur; yetmeyen varsa ValidationError.
+        Böylece aynı (malzeme, depo) için stok kontrolü + düşüm, transaction sonuna kadar sıraya girer.
+        SQLite'ta satır kilidi yoktur; settings'teki transaction_mode=IMMEDIATE yazma kilidini BEGIN'de alır.
+        Transaction içinde çağrılmalıdır. {(malzeme_id, depo_id): mevcut miktar} döner.
+        """
+        if not istenen:
+            # Boş Q() filtresi tüm tabloyu kilitlerdi
+            return {}
+        kosul = Q()
+        for malzeme_id, depo_id in istenen:
+            kosul |= Q(malzeme_id=malzeme_id, depo_id=depo_id)
+        mevcut = {
+            (m_id, d_id): miktar
+            for m_id, d_id, miktar in StokBakiye.objects.select_for_update().filter(kosul)
+            .order_by('malzeme_id', 'depo_id').values_list('malzeme_id', 'depo_id', 'miktar')
+        }
+
+        isimler = isimler or {}
+        eksikler = [
+            f"{isimler.get(cift, cift[0])}: istenen {miktar}, mevcut {mevcut.get(cift, Decimal('0'))}"
+            for cift, miktar in istenen.items() if miktar > mevcut.get(cift, Decimal('0'))
+        ]
+        if eksikler:
+            raise ValidationError([f"Kaynak depoda yeterli stok yok! {e}" for e in eksikler])
+        return mevcut
+
+    @staticmethod
+    def kontrol_noktalarini_gecersiz_kil(tarih):
+        """
+        Geriye tarihli bir hareket yazıldığında o tarihten sonraki ay sonu kontrol
+        noktaları artık doğru değildir; silinir (komut tekrar çalıştırıldığında yeniden üretilir).
+        """
+        if tarih:
+            StokKontrolNoktasi.objects.filter(tarih__gte=tarih).delete()
+
+    @staticmethod
+    def tarihteki_bakiyeler(tarih, depo_ids=None, malzeme_ids=None):
+        """
+        Verilen tarih itibarıyla (o gün dahil) {(malzeme_id, depo_id): miktar} sözlüğü döner.
+        En yakın ay sonu kontrol noktası baz alınır; sadece sonrasındaki hareketler toplanır.
+
+        Devir satırları yerine arşivdeki asıl hareketler sayılır (arşiv + canlı defter = tüm geçmiş);
+        arşivleme kapanışta kontrol noktası bıraktığı için güncel tarihlerde arşiv aralığı boş kalır.
+        """
+        baz_tarih = StokKontrolNoktasi.objects.filter(tarih__lte=tarih).aggregate(t=Max('tarih'))['t']
+
+        noktalar = StokKontrolNoktasi.objects.filter(tarih=baz_tarih)
+        hareket_sorgulari = [
+            DepoHareket.objects.exclude(islem_turu='devir'),
+            ArsivDepoHareket.objects.all(),
+        ]
+        for i, hareketler in enumerate(hareket_sorgulari):
+            hareketler = hareketler.filter(tarih__lte=tarih, depo__isnull=False)
+            if baz_tarih:
+                hareketler = hareketler.filter(tarih__gt=baz_tarih)
+            if depo_ids is not None:
+                hareketler = hareketler.filter(depo_id__in=depo_ids)
+            if malzeme_ids is not None:
+                hareketler = hareketler.filter(malzeme_id__in=malzeme_ids)
+            hareket_sorgulari[i] = hareketler
+        if depo_ids is not None:
+            noktalar = noktalar.filter(depo_id__in=depo_ids)
+        if malzeme_ids is not None:
+            noktalar = noktalar.filter(malzeme_id__in=malzeme_ids)
+
+        bakiyeler = defaultdict(Decimal)
+        if baz_tarih:
+            for malzeme_id, depo_id, miktar in noktalar.values_list('malzeme_id', 'depo_id', 'miktar'):
+                bakiyeler[(malzeme_id, depo_id)] += miktar
+
+        for hareketler in hareket_sorgulari:
+            for malzeme_id, depo_id, toplam in hareketler.values('malzeme_id', 'depo_id').annotate(
+                t=Sum(StockService.imzali_miktar())
+            ).values_list('malzeme_id', 'depo_id', 't'):
+                bakiyeler[(malzeme_id, depo_id)] += toplam or Decimal('0')
+        return dict(bakiyeler)
+
+    @staticmethod
+    def imzali_miktar():
+        """ISLEM_YONU kuralının SQL karşılığı: Giriş +miktar, Çıkış/İade -miktar."""
+        return Case(
+            *[When(islem_turu=tur, then=F('miktar') * Value(yon)) for tur, yon in ISLEM_YONU.items()],
+            default=Value(Decimal('0')),
+            output_field=DecimalField(max_digits=15, decimal_places=2),
+        )
+
+    @staticmethod
+    def yuruyen_bakiye_penceresi(sira_alani='id'):
+        """SUM(imzalı miktar) OVER (PARTITION BY depo ORDER BY tarih, id) -> depo bazında yürüyen bakiye."""
+        return Window(
+            Sum(StockService.imzali_miktar()),
+            partition_by=F('depo_id'),
+            order_by=[F('tarih').asc(), F(sira_alani).asc()],
+        )
+
+    @staticmethod
+    def sanal_bekleyen_ifadesi():
+        """
+        SatinAlma.sanal_depoda_bekleyen'in SQL karşılığı (Sanal depo girişleri - çıkışları).
+        İlişkili alt sorgu olduğu için dış sorguda GROUP BY oluşmaz, select_for_update ile kullanılabilir.
+        """
+        alt_sorgu = DepoHareket.objects.filter(
+            siparis=OuterRef('pk'), depo__is_sanal=True, islem_turu__in=['giris', 'cikis']
+        ).values('siparis').annotate(t=Sum(StockService.imzali_miktar())).values('t')
+        return Coalesce(
+            Subquery(alt_sorgu, output_field=DecimalField(max_digits=15, decimal_places=2)),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=15, decimal_places=2),
+        )
+
+    @staticmethod
+    def siparis_ozetlerini_guncelle(siparis_ids):
+        """
+        SatinAlma projeksiyonlarını (sanal_bekleyen, acik_mi) defterden tek UPDATE ile yeniden yazar.
+        Defter (sanal depo hareketleri) ya da fatura/sipariş sayaçları değiştiğinde ilgili siparişler için çağrılır.
+        Açık: Sanal depoda malı bekleyen VEYA faturası tamamlanmamış sipariş.
+        """
+        siparis_ids = {s_id for s_id in siparis_ids if s_id}
+        if not siparis_ids:
+            return
+        bekleyen = StockService.sanal_bekleyen_ifadesi()
+        SatinAlma.objects.filter(id__in=siparis_ids).update(
+            sanal_bekleyen=bekleyen,
+            acik_mi=Case(
+                When(GreaterThan(bekleyen, Value(Decimal('0'))), then=Value(True)),
+                When(toplam_miktar__gt=F('faturalanan_miktar'), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+        )
+
+    @staticmethod
+    def fifo_siparis_bul(malzeme_id):
+        """
+        Sanal depoda bekleyen miktarı olan EN ESKİ açık siparişi döner (yoksa None).
+        Transaction içinde çağrılmalıdır: malzemenin açık siparişleri önce kilitlenir, böylece
+        eş zamanlı iki mal kabul aynı kalan miktarı eşleştiremez; seçim sonra tek sorguda yapılır.
+        """
+        acik_siparisler = SatinAlma.objects.filter(teklif__malzeme_id=malzeme_id).exclude(teslimat_durumu='tamamlandi')
+        list(acik_siparisler.select_for_update().values_list('id', flat=True))
+
+        return (
+            acik_siparisler
+            .annotate(bekleyen=StockService.sanal_bekleyen_ifadesi())
+            .filter(bekleyen__gt=0)
+            .order_by('created_at', 'id')
+            .first()
+        )
+
+    @staticmethod
+    def yuruyen_bakiyeler(hareketler, model=DepoHareket, sira_alani='id'):
+        """
+        Tek malzemeye ait bir sayfa hareket için {hareket_id: depo yürüyen bakiyesi} döner.
+        - Pencere (window) sadece sayfadaki satırlar üzerinde çalışır,
+        - Sayfa öncesi açılış bakiyeleri TEK gruplu sorgu ile depo bazında eklenir.
+        Böylece her sayfa, geçmişin tamamı satır satır okunmadan hesaplanır.
+        Arşiv sayfaları için model=ArsivDepoHareket, sira_alani='orijinal_id' verilir.
+        """
+        hareketler = [h for h in hareketler if h.depo_id]
+        if not hareketler:
+            return {}
+
+        en_eski = min(hareketler, key=lambda h: (h.tarih, getattr(h, sira_alani)))
+        acilislar = dict(
+            model.objects.filter(
+                Q(tarih__lt=en_eski.tarih) | Q(tarih=en_eski.tarih, **{f'{sira_alani}__lt': getattr(en_eski, sira_alani)}),
+                malzeme_id=en_eski.malzeme_id,
+                depo_id__in={h.depo_id for h in hareketler},
+                tarih__lte=en_eski.tarih,
+            ).values('depo_id').annotate(t=Sum(StockService.imzali_miktar())).values_list('depo_id', 't')
+        )
+
+        pencere = model.objects.filter(id__in=[h.id for h in hareketler]).annotate(
+            yuruyen=StockService.yuruyen_bakiye_penceresi(sira_alani)
+        ).values_list('id', 'depo_id', 'yuruyen')
+
+        return {
+            h_id: (acilislar.get(depo_id) or Decimal('0')) + yuruyen
+            for h_id, depo_id, yuruyen in pencere
+        }
+
+    @staticmethod
+    @transaction.atomic
+    def hareket_olustur(**alanlar):
+        """
+        DepoHareket kaydı oluşturur ve bakiyeyi aynı transaction içinde günceller.
+        Sistemde DepoHareket yazan herkes bu metodu kullanmalıdır.
+        """
+        return StockService._yeni_hareketi_uygula(DepoHareket.objects.create(**alanlar))
+
+    @staticmethod
+    def _yeni_hareketi_uygula(hareket):
+        """Yeni kaydedilmiş hareketin kontrol noktası, maliyet ve bakiye etkilerini uygular."""
+        StockService.kontrol_noktalarini_gecersiz_kil(hareket.tarih)
+        # Maliyet, bakiye güncellenmeden ÖNCE işlenir (ağırlıklı ortalama mevcut bakiyeden hesaplanır)
+        maliyet_farki = MaliyetService.hareket_isle(hareket)
+        StockService.bakiye_guncelle(
+            hareket.malzeme_id, hareket.depo_id,
+            StockService.hareket_etkisi(hareket.islem_turu, hareket.miktar),
+            maliyet_farki,
+        )
+        StockService.siparis_ozetlerini_guncelle([hareket.siparis_id])
+        CariService.iade_etkisi([StockService._iade_alanlari(hareket)])
+        return hareket
+
+    @staticmethod
+    def _iade_alanlari(hareket):
+        return {'siparis_id': hareket.siparis_id, 'islem_turu': hareket.islem_turu, 'iade_aksiyonu': hareket.iade_aksiyonu}
+
+    @staticmethod
+    @transaction.atomic
+    def hareket_kaydet(hareket):
+        """
+        Var olan bir hareketin düzenlenmesi (Admin vb.): eski etki geri alınır, yenisi uygulanır.
+        Geçmiş değiştiği için etkilenen (malzeme, depo) maliyet katmanları yeniden kurulur.
+        """
+        if not hareket.pk:
+            # Yeni kayıt (Admin ekleme formu): nesnenin kendisi kaydedilir
+            hareket.save()
+            return StockService._yeni_hareketi_uygula(hareket)
+
+        eski = DepoHareket.objects.filter(pk=hareket.pk).values(
+            'malzeme_id', 'depo_id', 'islem_turu', 'miktar', 'tarih', 'siparis_id', 'iade_aksiyonu'
+        ).first()
+        if eski:
+            StockService.kontrol_noktalarini_gecersiz_kil(eski['tarih'])
+            StockService.bakiye_guncelle(
+                eski['malzeme_id'], eski['depo_id'],
+                -StockService.hareket_etkisi(eski['islem_turu'], eski['miktar'])
+            )
+
+        hareket.save()
+        StockService.kontrol_noktalarini_gecersiz_kil(hareket.tarih)
+        StockService.bakiye_guncelle(
+            hareket.malzeme_id, hareket.depo_id,
+            StockService.hareket_etkisi(hareket.islem_turu, hareket.miktar)
+        )
+
+        ciftler = {(hareket.malzeme_id, hareket.depo_id)}
+        if eski:
+            ciftler.add((eski['malzeme_id'], eski['depo_id']))
+        MaliyetService.yeniden_kur(ciftler)
+        StockService.siparis_ozetlerini_guncelle([hareket.siparis_id, eski['siparis_id'] if eski else None])
+        CariService.iade_etkisi([StockService._iade_alanlari(hareket)] + ([eski] if eski else []))
+        return hareket
+
+    @staticmethod
+    @transaction.atomic
+    def hareketleri_sil(hareketler):
+        """
+        Hareketleri siler ve bakiyeden etkilerini düşer.
+        Tek bir DepoHareket nesnesi ya da queryset kabul eder.
+        """
+        if isinstance(hareketler, DepoHareket):
+            hareketler = DepoHareket.objects.filter(pk=hareketler.pk)
+
+        silinecekler = list(hareketler.values(
+            'id', 'malzeme_id', 'depo_id', 'islem_turu', 'miktar', 'tarih', 'siparis_id', 'iade_aksiyonu'
+        ))
+        if silinecekler:
+            StockService.kontrol_noktalarini_gecersiz_kil(min(h['tarih'] for h in silinecekler))
+        for h in silinecekler:
+            StockService.bakiye_guncelle(
+                h['malzeme_id'], h['depo_id'],
+                -StockService.hareket_etkisi(h['islem_turu'], h['miktar'])
+            )
+
+        DepoHareket.objects.filter(id__in=[h['id'] for h in silinecekler]).delete()
+        MaliyetService.yeniden_kur({(h['malzeme_id'], h['depo_id']) for h in silinecekler})
+        StockService.siparis_ozetlerini_guncelle(h['siparis_id'] for h in silinecekler)
+        CariService.iade_etkisi(silinecekler)
+        return len(silinecekler)
+
+    @staticmethod
+    @transaction.atomic
+    def hareketleri_arsivle(kapanis_tarihi, parti=2000):
+        """
+        kapanis_tarihi'nden ESKİ hareketleri ArsivDepoHareket'e taşır ve yerlerine malzeme x depo başına
+        tek bir 'devir' satırı (kapanış bakiyesi, ortalama birim maliyetle) yazar. (arşivlenen, devir) sayısı döner.
+
+        - Açık siparişlere (teslimatı bitmemiş, sanal depoda malı bekleyen ya da kapanıştan sonra hareketi olan)
+          bağlı hareketler canlı kalır; sipariş bazlı hesaplar (FIFO eşleştirme, sanal bekleyen) bölünmez.
+        - Önceki arşivlemenin devir satırları arşive yazılmaz (içerikleri zaten arşivde), yeni devre katılır.
+        - StokBakiye miktarları değişmez; maliyet katmanları (kısalmış) defterden yeniden kurulur.
+        """
+        devir_tarihi = kapanis_tarihi - timedelta(days=1)
+
+        # Açık sipariş listesi başta sabitlenir (silme sırasında sanal bekleyen değişse de kapsam değişmez)
+        acik_siparisler = set(SatinAlma.objects.annotate(
+            bekleyen=StockService.sanal_bekleyen_ifadesi()
+        ).filter(~Q(teslimat_durumu='tamamlandi') | ~Q(bekleyen=0)).values_list('id', flat=True))
+        acik_siparisler |= set(DepoHareket.objects.filter(
+            tarih__gte=kapanis_tarihi, siparis__isnull=False
+        ).values_list('siparis_id', flat=True).distinct())
+        kapsam = DepoHareket.objects.filter(tarih__lt=kapanis_tarihi).exclude(siparis_id__in=acik_siparisler)
+
+        # 1. Kapanış bakiyeleri ve değerleri (TEK gruplu sorgu). Hareketlerin kayıtlı birim maliyetleri kullanılır.
+        devirler = list(
+            kapsam.filter(depo__isnull=False).values('malzeme_id', 'depo_id').annotate(
+                kapanis_miktari=Sum(StockService.imzali_miktar()),
+                kapanis_tutari=Sum(
+                    StockService.imzali_miktar() * Coalesce(F('birim_maliyet'), Value(Decimal('0'))),
+                    output_field=DecimalField(max_digits=24, decimal_places=6),
+                ),
+            ).values_list('malzeme_id', 'depo_id', 'kapanis_miktari', 'kapanis_tutari')
+        )
+
+        # 2. Hareketleri parti parti arşive kopyala ve canlı defterden sil (bellekte tek parti tutulur)
+        arsivlenen = 0
+        while True:
+            satirlar = list(kapsam.order_by('id').values('id', *ARSIV_ALANLARI)[:parti])
+            if not satirlar:
+                break
+            ids = [satir.pop('id') for satir in satirlar]
+            arsiv = [
+                ArsivDepoHareket(orijinal_id=h_id, kapanis_tarihi=kapanis_tarihi, **satir)
+                for h_id, satir in zip(ids, satirlar) if satir['islem_turu'] != 'devir'
+            ]
+            ArsivDepoHareket.objects.bulk_create(arsiv)
+            arsivlenen += len(arsiv)
+            MaliyetKatmani.objects.filter(hareket_id__in=ids).delete()
+            DepoHareket.objects.filter(id__in=ids).delete()
+
+        # 3. Devir (açılış bakiyesi) satırları
+        DepoHareket.objects.bulk_create([
+            DepoHareket(
+                malzeme_id=malzeme_id, depo_id=depo_id, tarih=devir_tarihi, islem_turu='devir', miktar=miktar,
+                birim_maliyet=(tutar / miktar).quantize(Decimal('0.0001')) if miktar > 0 else Decimal('0'),
+                aciklama=f"DEVİR: {kapanis_tarihi:%d.%m.%Y} öncesi kapanış bakiyesi",
+            )
+            for malzeme_id, depo_id, miktar, tutar in devirler if miktar
+        ], batch_size=1000)
+
+        # 4. Kapanışa kontrol noktası: Güncel tarihli envanter sorguları arşive inmez
+        StokKontrolNoktasi.objects.filter(tarih=devir_tarihi).delete()
+        StokKontrolNoktasi.objects.bulk_create([
+            StokKontrolNoktasi(tarih=devir_tarihi, malzeme_id=m_id, depo_id=d_id, miktar=miktar)
+            for (m_id, d_id), miktar in StockService.tarihteki_bakiyeler(devir_tarihi).items() if miktar
+        ], batch_size=1000)
+
+        # Devir maliyetleri sonraki transfer bacaklarına da yansısın diye TAM kurulum (seyrek çalışan işlem)
+        MaliyetService.yeniden_kur()
+        return arsivlenen, sum(1 for _, _, miktar, _ in devirler if miktar)
+
     @staticmethod
     @transaction.atomic
     def execute_transfer(malzeme, miktar, kaynak_depo, hedef_depo, siparis=None, aciklama="", tarih=None):
@@ -12,8 +541,14 @@ class StockService:
         from django.utils import timezone
         islem_tarihi = tarih or timezone.now().date()
 
+        # 0. Kaynak bakiye satırı kilitlenir ve stok kilit altında doğrulanır (eş zamanlı çıkışlar sıraya girer)
+        StockService.stok_kilitle(
+            {(malzeme.id, kaynak_depo.id): Decimal(str(miktar))},
+            isimler={(malzeme.id, kaynak_depo.id): f"{malzeme.isim} ({kaynak_depo.isim})"},
+        )
+
         # 1. Kaynak Depodan ÇIKIŞ
-        DepoHareket.objects.create(
+        cikis = StockService.hareket_olustur(
             malzeme=malzeme,
             depo=kaynak_depo,
             miktar=miktar,
@@ -24,13 +559,866 @@ class StockService:
         )
 
         # 2. Hedef Depoya GİRİŞ
-        DepoHareket.objects.create(
+        StockService.hareket_olustur(
             malzeme=malzeme,
             depo=hedef_depo,
             miktar=miktar,
             islem_turu='giris',
             siparis=siparis,
             tarih=islem_tarihi,
-            aciklama=f"GİRİŞ: {aciklama}"
+            aciklama=f"GİRİŞ: {aciklama}",
+            # Maliyet, kaynak depodan tüketilen maliyetle taşınır
+            birim_maliyet=cikis.birim_maliyet,
+            transfer_cikisi=cikis,
+        )
+        return True
+
+    @staticmethod
+    @transaction.atomic
+    def execute_bulk_transfer(irsaliye, kalemler):
+        """
+        Çok kalemli sevk irsaliyesi (Tek kamyon, N malzeme).
+        kalemler: [{'malzeme': Malzeme, 'miktar': Decimal, 'siparis': SatinAlma|None}, ...]
+
+        - Kaynak depo stokları TEK sorguda (kilitlenerek, bkz. stok_kilitle) okunur ve doğrulanır.
+        - Transfer kalemleri ve 2N defter kaydı bulk_create ile yazılır.
+        - post_save sinyali tetiklenmez; sanal depodan çıkış (FIFO sipariş eşleşmesi)
+          bu yoldan yapılmaz, mal kabul ekranı kullanılır.
+        Sıfır/negatif miktarlı kalemde veya yetersiz stokta ValidationError fırlatır ve hiçbir kayıt yazılmaz.
+        """
+        if irsaliye.kaynak_depo_id == irsaliye.hedef_depo_id:
+            raise ValidationError("Kaynak ve Hedef depo aynı olamaz.")
+        if irsaliye.kaynak_depo.is_sanal:
+            raise ValidationError("Sanal depodan çıkışlar için Mal Kabul ekranını kullanınız.")
+        if not kalemler:
+            raise ValidationError("İrsaliyede en az bir kalem olmalıdır.")
+
+        # 1. Stok doğrulama (aynı malzeme birden fazla satırda olabilir)
+        istenen = defaultdict(Decimal)
+        for kalem in kalemler:
+            miktar = Decimal(str(kalem['miktar']))
+            # Sıfır/negatif satır ters yönde stok taşır ve aynı malzemenin diğer satırlarını maskeler
+            if miktar <= 0:
+                raise ValidationError(f"{kalem['malzeme'].isim} için transfer miktarı sıfırdan büyük olmalıdır.")
+            istenen[kalem['malzeme'].id] += miktar
+
+        StockService.stok_kilitle(
+            {(m_id, irsaliye.kaynak_depo_id): miktar for m_id, miktar in istenen.items()},
+            isimler={
+                (kalem['malzeme'].id, irsaliye.kaynak_depo_id): f"{kalem['malzeme'].isim} ({irsaliye.kaynak_depo.isim})"
+                for kalem in kalemler
+            },
+        )
+
+        return StockService._toplu_transfer_yaz(irsaliye, kalemler, istenen)
+
+    @staticmethod
+    @transaction.atomic
+    def toplu_mal_kabul(irsaliye, miktarlar):
+        """
+        Çok siparişli mal kabul (Tedarikçi tek sevkiyatta N siparişi teslim eder).
+        irsaliye: kaynak_depo'su sanal depo olan SevkIrsaliyesi, miktarlar: {siparis_id: teslim alınan miktar}
+
+        - Siparişler kilitlenir, sanal depoda bekleyen miktarları TEK sorguda okunup doğrulanır.
+        - Transfer kalemleri ve defter kayıtları execute_bulk_transfer ile aynı toplu yoldan yazılır
+          (post_save sinyali / FIFO eşleşmesi yok; her kalem kendi siparişine bağlıdır).
+        - teslim_edilen artışları ve teslimat durumları tek UPDATE (CASE WHEN) ile yazılır.
+        Herhangi bir satır geçersizse ValidationError fırlatır ve hiçbir kayıt yazılmaz.
+        """
+        if not irsaliye.kaynak_depo.is_sanal:
+            raise ValidationError("Mal kabulde kaynak depo sanal depo olmalıdır.")
+        if irsaliye.hedef_depo.is_sanal:
+            raise ValidationError("Mal fiziksel bir depoya teslim alınmalıdır.")
+        gecersizler = [str(s_id) for s_id in miktarlar if not str(s_id).isdigit()]
+        if gecersizler:
+            raise ValidationError([f"Geçersiz sipariş numarası: {s_id}" for s_id in gecersizler])
+        miktarlar = {int(s_id): Decimal(str(miktar)) for s_id, miktar in miktarlar.items() if miktar}
+        if not miktarlar:
+            raise ValidationError("En az bir sipariş için teslim alınan miktar girilmelidir.")
+
+        # 1. Doğrulama: siparişler kilitlenir, bekleyen miktarlar ilişkili alt sorgu ile tek seferde okunur
+        siparisler = list(
+            SatinAlma.objects.select_for_update(of=('self',))
+            .filter(id__in=miktarlar)
+            .select_related('teklif__malzeme')
+            .annotate(bekleyen=StockService.sanal_bekleyen_ifadesi())
+            .order_by('id')
         )
-        return True
\ No newline at end of file
+        hatalar = [f"Sipariş #{s_id} bulunamadı." for s_id in sorted(set(miktarlar) - {s.id for s in siparisler})]
+        for siparis in siparisler:
+            miktar = miktarlar[siparis.id]
+            if not siparis.teklif.malzeme_id:
+                hatalar.append(f"Sipariş #{siparis.id} bir hizmet siparişi; mal kabul yapılamaz.")
+            elif miktar < 0:
+                hatalar.append(f"Sipariş #{siparis.id}: miktar eksi olamaz.")
+            elif miktar > siparis.bekleyen:
+                hatalar.append(
+                    f"Sipariş #{siparis.id} ({siparis.teklif.malzeme.isim}): istenen {miktar}, sanal depoda bekleyen {siparis.bekleyen}"
+                )
+        if hatalar:
+            raise ValidationError(hatalar)
+
+        kalemler = [
+            {'malzeme': siparis.teklif.malzeme, 'miktar': miktarlar[siparis.id], 'siparis': siparis}
+            for siparis in siparisler
+        ]
+        istenen = defaultdict(Decimal)
+        for kalem in kalemler:
+            istenen[kalem['malzeme'].id] += kalem['miktar']
+
+        StockService.stok_kilitle(
+            {(m_id, irsaliye.kaynak_depo_id): miktar for m_id, miktar in istenen.items()},
+            isimler={
+                (kalem['malzeme'].id, irsaliye.kaynak_depo_id): f"{kalem['malzeme'].isim} ({irsaliye.kaynak_depo.isim})"
+                for kalem in kalemler
+            },
+        )
+
+        # 2. Transferler, defter, maliyet ve bakiyeler (toplu)
+        StockService._toplu_transfer_yaz(irsaliye, kalemler, istenen)
+
+        # 3. Sipariş sayaçları: kilitli satırlar üzerinden tek UPDATE
+        for siparis in siparisler:
+            siparis.teslim_edilen += miktarlar[siparis.id]
+            siparis.teslimat_durumunu_hesapla()
+        SatinAlma.objects.bulk_update(siparisler, ['teslim_edilen', 'teslimat_durumu'])
+
+        return irsaliye
+
+    @staticmethod
+    def _toplu_transfer_yaz(irsaliye, kalemler, istenen):
+        """
+        Doğrulanmış (stok_kilitle) bir irsaliyenin kalemlerini, defter kayıtlarını, maliyet katmanlarını
+        ve bakiyelerini toplu yazar. istenen: {malzeme_id: toplam miktar}. Transaction içinde çağrılmalıdır.
+        """
+        # 2. Belge başlığı + kalemler
+        irsaliye.save()
+        DepoTransfer.objects.bulk_create([
+            DepoTransfer(
+                irsaliye=irsaliye,
+                kaynak_depo_id=irsaliye.kaynak_depo_id,
+                hedef_depo_id=irsaliye.hedef_depo_id,
+                bagli_siparis=kalem.get('siparis'),
+                malzeme=kalem['malzeme'],
+                miktar=kalem['miktar'],
+                tarih=irsaliye.tarih,
+                aciklama=irsaliye.aciklama,
+            )
+            for kalem in kalemler
+        ], batch_size=500)
+
+        # 3. Maliyet: kaynak katmanları tek sorguda tüketilir, hedefe aynı birim maliyetle taşınır
+        cikis_maliyetleri = MaliyetService.toplu_cikis(irsaliye.kaynak_depo_id, istenen)
+        birim_maliyetler = {
+            m_id: (cikis_maliyetleri[m_id] / miktar).quantize(Decimal('0.0001'))
+            for m_id, miktar in istenen.items()
+        }
+
+        # 4. Defter kayıtları (Her kalem için ÇIKIŞ + GİRİŞ). Çıkışlar önce yazılır: girişler kendi
+        #    çıkış bacağına transfer_cikisi ile bağlanır (maliyet yeniden kurulumu bu bağı izler)
+        aciklama = f"İrsaliye #{irsaliye.irsaliye_no or irsaliye.id} | {irsaliye.aciklama}"
+
+        def bacak(kalem, depo_id, islem_turu, etiket, **ekstra):
+            return DepoHareket(
+                malzeme=kalem['malzeme'],
+                depo_id=depo_id,
+                miktar=kalem['miktar'],
+                islem_turu=islem_turu,
+                siparis=kalem.get('siparis'),
+                tarih=irsaliye.tarih,
+                irsaliye_no=irsaliye.irsaliye_no,
+                aciklama=f"{etiket}: {aciklama}"[:300],
+                birim_maliyet=birim_maliyetler[kalem['malzeme'].id],
+                **ekstra,
+            )
+
+        cikislar = DepoHareket.objects.bulk_create(
+            [bacak(kalem, irsaliye.kaynak_depo_id, 'cikis', 'ÇIKIŞ') for kalem in kalemler], batch_size=500
+        )
+        girisler = DepoHareket.objects.bulk_create([
+            bacak(kalem, irsaliye.hedef_depo_id, 'giris', 'GİRİŞ', transfer_cikisi=cikis)
+            for kalem, cikis in zip(kalemler, cikislar)
+        ], batch_size=500)
+        hareketler = cikislar + girisler
+        MaliyetService.katmanlari_olustur([h for h in hareketler if h.islem_turu == 'giris'])
+
+        # 5. Bakiyeler ve kontrol noktaları
+        farklar, maliyet_farklari = defaultdict(Decimal), defaultdict(Decimal)
+        for m_id, miktar in istenen.items():
+            farklar[(m_id, irsaliye.kaynak_depo_id)] -= miktar
+            farklar[(m_id, irsaliye.hedef_depo_id)] += miktar
+            maliyet_farklari[(m_id, irsaliye.kaynak_depo_id)] -= cikis_maliyetleri[m_id]
+            maliyet_farklari[(m_id, irsaliye.hedef_depo_id)] += cikis_maliyetleri[m_id]
+        StockService.kontrol_noktalarini_gecersiz_kil(irsaliye.tarih)
+        StockService.bakiyeleri_toplu_guncelle(farklar, maliyet_farklari)
+        StockService.siparis_ozetlerini_guncelle(kalem['siparis'].id for kalem in kalemler if kalem.get('siparis'))
+
+        return irsaliye
+
+
+class MaliyetService:
+    """
+    Stok değerleme (TL). GİRİŞ hareketleri maliyet katmanı açar, ÇIKIŞ/İADE katmanları FIFO tüketir.
+    StokBakiye.maliyet_tutari, settings.STOK_MALIYET_YONTEMI'ne göre (FIFO / AGIRLIKLI_ORTALAMA)
+    her hareketle artımlı güncellenir; değerleme raporu defteri yeniden oynatmaz.
+
+    Giriş birim maliyeti önceliği: hareketin kendi birim_maliyet'i (transferlerde kaynaktan taşınan)
+    > bağlı siparişin Teklif.birim_maliyet_tl'si > 0.
+    """
+    FIFO = 'FIFO'
+    AGIRLIKLI_ORTALAMA = 'AGIRLIKLI_ORTALAMA'
+
+    @staticmethod
+    def yontem():
+        return getattr(settings, 'STOK_MALIYET_YONTEMI', MaliyetService.FIFO)
+
+    @staticmethod
+    def siparis_birim_maliyetleri(siparis_ids):
+        """{siparis_id: TL birim maliyet} (tek sorgu)."""
+        return {
+            sp.id: sp.teklif.birim_maliyet_tl
+            for sp in SatinAlma.objects.filter(id__in=[s for s in siparis_ids if s]).select_related('teklif')
+        }
+
+    @staticmethod
+    def tuket(katmanlar, miktar, mevcut_miktar, mevcut_tutar):
+        """
+        Katmanları (tarih, id sırasıyla verilmiş) FIFO tüketir; (TL maliyet, değişen katmanlar) döner.
+        Ağırlıklı ortalama yönteminde katman miktarları yine FIFO düşer ama maliyet ortalamadan alınır.
+        Katmanlar yetmezse (eksi stok) kalan kısım ortalama/son katman maliyetinden fiyatlanır.
+        """
+        ortalama = (mevcut_tutar / mevcut_miktar) if mevcut_miktar > 0 else None
+        kalan = Decimal(str(miktar))
+        fifo_maliyet, son_birim, degisenler = Decimal('0'), None, []
+
+        for katman in katmanlar:
+            if kalan <= 0:
+                break
+            if katman.kalan_miktar <= 0:
+                continue
+            alinan = min(kalan, katman.kalan_miktar)
+            katman.kalan_miktar -= alinan
+            fifo_maliyet += alinan * katman.birim_maliyet
+            son_birim = katman.birim_maliyet
+            kalan -= alinan
+            degisenler.append(katman)
+
+        if kalan > 0:
+            fifo_maliyet += kalan * (ortalama if ortalama is not None else (son_birim or Decimal('0')))
+
+        if MaliyetService.yontem() == MaliyetService.AGIRLIKLI_ORTALAMA and ortalama is not None:
+            maliyet = Decimal(str(miktar)) * ortalama
+        else:
+            maliyet = fifo_maliyet
+        return maliyet.quantize(Decimal('0.01')), degisenler
+
+    @staticmethod
+    def hareket_isle(hareket):
+        """
+        Yeni yazılan tek hareketin maliyet etkisini uygular (katman açar / tüketir) ve
+        StokBakiye.maliyet_tutari'na eklenecek TL farkı döner. Transaction içinde çağrılmalıdır.
+        """
+        if not hareket.depo_id or not hareket.miktar:
+            return Decimal('0')
+
+        if hareket.islem_turu in GIRIS_TURLERI:
+            if hareket.birim_maliyet is None:
+                hareket.birim_maliyet = MaliyetService.siparis_birim_maliyetleri([hareket.siparis_id]).get(
+                    hareket.siparis_id, Decimal('0')
+                )
+                DepoHareket.objects.filter(pk=hareket.pk).update(birim_maliyet=hareket.birim_maliyet)
+            MaliyetService.katmanlari_olustur([hareket])
+            return (hareket.miktar * hareket.birim_maliyet).quantize(Decimal('0.01'))
+
+        katmanlar = MaliyetKatmani.objects.select_for_update().filter(
+            malzeme_id=hareket.malzeme_id, depo_id=hareket.depo_id, kalan_miktar__gt=0
+        ).order_by('tarih', 'id')
+        mevcut_miktar, mevcut_tutar = StokBakiye.objects.filter(
+            malzeme_id=hareket.malzeme_id, depo_id=hareket.depo_id
+        ).values_list('miktar', 'maliyet_tutari').first() or (Decimal('0'), Decimal('0'))
+
+        maliyet, degisenler = MaliyetService.tuket(katmanlar, hareket.miktar, mevcut_miktar, mevcut_tutar)
+        MaliyetKatmani.objects.bulk_update(degisenler, ['kalan_miktar'])
+
+        hareket.birim_maliyet = (maliyet / hareket.miktar).quantize(Decimal('0.0001'))
+        DepoHareket.objects.filter(pk=hareket.pk).update(birim_maliyet=hareket.birim_maliyet)
+        return -maliyet
+
+    @staticmethod
+    def katmanlari_olustur(giris_hareketleri):
+        """Birim maliyeti belirlenmiş GİRİŞ hareketleri için katmanları toplu açar."""
+        MaliyetKatmani.objects.bulk_create([
+            MaliyetKatmani(
+                hareket_id=h.id, malzeme_id=h.malzeme_id, depo_id=h.depo_id, tarih=h.tarih,
+                birim_maliyet=h.birim_maliyet or Decimal('0'),
+                giris_miktari=h.miktar, kalan_miktar=h.miktar,
+            )
+            for h in giris_hareketleri if h.depo_id
+        ], batch_size=500)
+
+    @staticmethod
+    def toplu_cikis(depo_id, miktarlar):
+        """
+        Bir depodan çok malzemenin çıkışı: {malzeme_id: miktar} -> {malzeme_id: TL maliyet}.
+        Açık katmanlar ve bakiyeler tek sorguda okunur, değişen katmanlar tek bulk_update ile yazılır.
+        """
+        katmanlar = defaultdict(list)
+        for katman in MaliyetKatmani.objects.select_for_update().filter(
+            depo_id=depo_id, malzeme_id__in=miktarlar, kalan_miktar__gt=0
+        ).order_by('tarih', 'id'):
+            katmanlar[katman.malzeme_id].append(katman)
+        bakiyeler = {
+            m_id: (miktar, tutar)
+            for m_id, miktar, tutar in StokBakiye.objects.filter(depo_id=depo_id, malzeme_id__in=miktarlar)
+            .values_list('malzeme_id', 'miktar', 'maliyet_tutari')
+        }
+
+        maliyetler, tum_degisenler = {}, []
+        for m_id, miktar in miktarlar.items():
+            mevcut_miktar, mevcut_tutar = bakiyeler.get(m_id, (Decimal('0'), Decimal('0')))
+            maliyetler[m_id], degisenler = MaliyetService.tuket(katmanlar[m_id], miktar, mevcut_miktar, mevcut_tutar)
+            tum_degisenler += degisenler
+
+        MaliyetKatmani.objects.bulk_update(tum_degisenler, ['kalan_miktar'], batch_size=500)
+        return maliyetler
+
+    @staticmethod
+    @transaction.atomic
+    def yeniden_kur(ciftler=None):
+        """
+        Verilen (malzeme_id, depo_id) çiftlerinin (None ise TÜM sistemin) katmanlarını ve stok
+        değerlerini hareket geçmişinden yeniden kurar. Sadece geçmiş düzenlendiğinde, ilk kurulumda
+        ve yöntem değiştiğinde kullanılır; normal akış artımlıdır.
+
+        Tam kurulumda transfer girişleri, transfer_cikisi ile bağlı oldukları ÇIKIŞ bacağının (yeniden
+        hesaplanan) maliyetini devralır; böylece yöntem değişikliği hedef depolara da yansır. Çift bazlı
+        kurulumda diğer bacak görülmediğinden girişin kayıtlı birim maliyeti kullanılır.
+        """
+        tam_kurulum = ciftler is None
+        hareketler = DepoHareket.objects.filter(depo__isnull=False)
+        katman_sorgusu = MaliyetKatmani.objects.all()
+        bakiye_sorgusu = StokBakiye.objects.all()
+        if ciftler is not None:
+            ciftler = {(m, d) for m, d in ciftler if d}
+            if not ciftler:
+                return
+            kosul = Q()
+            for malzeme_id, depo_id in ciftler:
+                kosul |= Q(malzeme_id=malzeme_id, depo_id=depo_id)
+            hareketler = hareketler.filter(kosul)
+            katman_sorgusu = katman_sorgusu.filter(kosul)
+            bakiye_sorgusu = bakiye_sorgusu.filter(kosul)
+
+        hareketler = list(hareketler.order_by('tarih', 'id'))
+        siparis_maliyetleri = MaliyetService.siparis_birim_maliyetleri({h.siparis_id for h in hareketler})
+
+        katmanlar = defaultdict(list)
+        durum = defaultdict(lambda: [Decimal('0'), Decimal('0')])  # (miktar, tutar)
+        yeni_katmanlar, degisen_hareketler = [], []
+        transfer_cikislari = {h.transfer_cikisi_id for h in hareketler if h.transfer_cikisi_id}
+        cikis_maliyetleri = {}  # {transfer çıkış bacağı id: yeniden hesaplanan birim maliyet}
+
+        for h in hareketler:
+            anahtar = (h.malzeme_id, h.depo_id)
+            eski_birim = h.birim_maliyet
+
+            if h.islem_turu in GIRIS_TURLERI:
+                if tam_kurulum and h.transfer_cikisi_id in cikis_maliyetleri:
+                    h.birim_maliyet = cikis_maliyetleri[h.transfer_cikisi_id]
+                elif h.birim_maliyet is None:
+                    h.birim_maliyet = siparis_maliyetleri.get(h.siparis_id, Decimal('0'))
+                katman = MaliyetKatmani(
+                    hareket_id=h.id, malzeme_id=h.malzeme_id, depo_id=h.depo_id, tarih=h.tarih,
+                    birim_maliyet=h.birim_maliyet, giris_miktari=h.miktar, kalan_miktar=h.miktar,
+                )
+                katmanlar[anahtar].append(katman)
+                yeni_katmanlar.append(katman)
+                durum[anahtar][0] += h.miktar
+                durum[anahtar][1] += (h.miktar * h.birim_maliyet).quantize(Decimal('0.01'))
+            else:
+                maliyet, _ = MaliyetService.tuket(katmanlar[anahtar], h.miktar, *durum[anahtar])
+                h.birim_maliyet = (maliyet / h.miktar).quantize(Decimal('0.0001')) if h.miktar else Decimal('0')
+                durum[anahtar][0] -= h.miktar
+                durum[anahtar][1] -= maliyet
+                if h.id in transfer_cikislari:
+                    cikis_maliyetleri[h.id] = h.birim_maliyet
+
+            if h.birim_maliyet != eski_birim:
+                degisen_hareketler.append(h)
+
+        katman_sorgusu.delete()
+        MaliyetKatmani.objects.bulk_create(yeni_katmanlar, batch_size=1000)
+        DepoHareket.objects.bulk_update(degisen_hareketler, ['birim_maliyet'], batch_size=1000)
+
+        bakiyeler = list(bakiye_sorgusu)
+        for bakiye in bakiyeler:
+            bakiye.maliyet_tutari = durum[(bakiye.malzeme_id, bakiye.depo_id)][1] if (bakiye.malzeme_id, bakiye.depo_id) in durum else Decimal('0')
+        StokBakiye.objects.bulk_update(bakiyeler, ['maliyet_tutari'], batch_size=1000)
+        return len(hareketler)
+
+
+class TuketimService:
+    """
+    Tüketim analizi. Gerçek tüketim sinyali, Kullanım/Sarf yerlerine (Depo.is_kullanim_yeri=True)
+    giren malzemedir (iade/geri transferler düşülür -> net tüketim).
+
+    Hesaplar SADECE kapanmış günleri (dün dahil) kapsar; bu yüzden sonuçlar gün boyunca değişmez ve
+    gün anahtarıyla önbelleğe alınır. Panel her açılışta aylarca hareketi yeniden toplamaz.
+    """
+    PERIYOTLAR = {
+        'gun': TruncDay,
+        'hafta': TruncWeek,
+        'ay': TruncMonth,
+    }
+
+    @staticmethod
+    def _gunluk_onbellek(anahtar, hesapla):
+        """Sonucu gece yarısına kadar önbellekte tutar (anahtar günün tarihini içerir)."""
+        simdi = timezone.localtime()
+        anahtar = f"tuketim:{simdi.date().isoformat()}:{anahtar}"
+        sonuc = cache.get(anahtar)
+        if sonuc is None:
+            sonuc = hesapla()
+            gece_yarisi = (simdi + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+            cache.set(anahtar, sonuc, timeout=max(int((gece_yarisi - simdi).total_seconds()), 60))
+        return sonuc
+
+    @staticmethod
+    def _aralik(gun_sayisi):
+        """Son gun_sayisi kapanmış gün: [bugün - gun_sayisi, dün]."""
+        bugun = timezone.localdate()
+        return bugun - timedelta(days=gun_sayisi), bugun - timedelta(days=1)
+
+    @staticmethod
+    def _tuketim_sorgulari(baslangic, bitis, depo_id=None):
+        """Canlı defter + arşiv (pencere kapanış öncesine uzanırsa) üzerinde kullanım yeri hareketleri."""
+        sorgular = []
+        for model in (DepoHareket, ArsivDepoHareket):
+            hareketler = model.objects.filter(
+                depo__is_kullanim_yeri=True, tarih__gte=baslangic, tarih__lte=bitis
+            ).exclude(islem_turu='devir')
+            if depo_id:
+                hareketler = hareketler.filter(depo_id=depo_id)
+            sorgular.append(hareketler)
+        return sorgular
+
+    @staticmethod
+    def donemsel_tuketim(periyot='hafta', gun_sayisi=90, depo_id=None):
+        """
+        [{'donem', 'malzeme_id', 'depo_id', 'miktar'}] -> dönem (gün/hafta/ay) x malzeme x kullanım yeri net tüketimi.
+        Tarih kovalama SQL'de (Trunc + GROUP BY) yapılır; en yeni dönem önce gelir.
+        """
+        trunc = TuketimService.PERIYOTLAR[periyot]
+
+        def hesapla():
+            baslangic, bitis = TuketimService._aralik(gun_sayisi)
+            toplamlar = defaultdict(Decimal)
+            for hareketler in TuketimService._tuketim_sorgulari(baslangic, bitis, depo_id):
+                for donem, malzeme_id, d_id, miktar in (
+                    hareketler.annotate(donem=trunc('tarih'))
+                    .values('donem', 'malzeme_id', 'depo_id')
+                    .annotate(miktar=Sum(StockService.imzali_miktar()))
+                    .values_list('donem', 'malzeme_id', 'depo_id', 'miktar')
+                ):
+                    toplamlar[(donem, malzeme_id, d_id)] += miktar or Decimal('0')
+            return [
+                {'donem': donem, 'malzeme_id': malzeme_id, 'depo_id': d_id, 'miktar': miktar}
+                for (donem, malzeme_id, d_id), miktar in sorted(
+                    toplamlar.items(), key=lambda x: (x[0][0], x[0][1], x[0][2]), reverse=True
+                ) if miktar
+            ]
+
+        return TuketimService._gunluk_onbellek(f"donemsel:{periyot}:{gun_sayisi}:{depo_id or ''}", hesapla)
+
+    @staticmethod
+    def gunluk_hizlar(gun_sayisi=30):
+        """{malzeme_id: ortalama günlük net tüketim} (son gun_sayisi kapanmış gün, tek gruplu sorgu)."""
+        def hesapla():
+            baslangic, bitis = TuketimService._aralik(gun_sayisi)
+            toplamlar = defaultdict(Decimal)
+            for hareketler in TuketimService._tuketim_sorgulari(baslangic, bitis):
+                for malzeme_id, miktar in hareketler.values('malzeme_id').annotate(
+                    miktar=Sum(StockService.imzali_miktar())
+                ).values_list('malzeme_id', 'miktar'):
+                    toplamlar[malzeme_id] += miktar or Decimal('0')
+            hizlar = {
+                malzeme_id: (toplam / gun_sayisi).quantize(Decimal('0.01'))
+                for malzeme_id, toplam in toplamlar.items()
+            }
+            # Yuvarlanınca 0.00'a inen çok küçük tüketimler hız sayılmaz (kapsama hesaplanamaz)
+            return {malzeme_id: hiz for malzeme_id, hiz in hizlar.items() if hiz > 0}
+
+        return TuketimService._gunluk_onbellek(f"hiz:{gun_sayisi}", hesapla)
+
+    @staticmethod
+    def kapsama_gunu(stok, gunluk_hiz):
+        """Mevcut stok, bu tüketim hızıyla kaç gün yeter? (Tüketim yoksa None)"""
+        if not gunluk_hiz:
+            return None
+        return int(max(stok, Decimal('0')) / gunluk_hiz)
+
+
+class FinansService:
+    """
+    Finans paneli özeti. Kategori bazlı imalat maliyeti ve gider dağılımı gruplu sorgularla hesaplanır;
+    sonuç (TL tutarlar) önbellekte anlık görüntü olarak saklanır ve Teklif, Harcama, Hakediş, Fatura,
+    Ödeme kayıtları değiştikçe sinyallerle silinir (bkz. core/signals.py). Süre sınırı, sinyal
+    tetiklemeyen toplu güncellemelere ve süreçler arası paylaşılmayan önbelleğe karşı emniyettir.
+    """
+    ONBELLEK_ANAHTARI = 'finans:dashboard'
+    ONBELLEK_SURESI = 600  # saniye
+
+    @staticmethod
+    def onbellegi_sil():
+        # Kayıt işlemi geri alınırsa eski özet geçerli kalır; silme commit sonrasına bırakılır
+        transaction.on_commit(lambda: cache.delete(FinansService.ONBELLEK_ANAHTARI))
+
+    @staticmethod
+    def harcama_tl_ifadesi():
+        """Harcama.tl_tutar özelliğinin SQL karşılığı: tutar x kur (kur 2 haneye yuvarlanır), 2 haneye yuvarlı."""
+        return Round(F('tutar') * Round(F('kur_degeri'), 2), 2, output_field=DecimalField(max_digits=18, decimal_places=2))
+
+    @staticmethod
+    def odemelerin_tl_toplami(odemeler):
+        """
+        Ödeme tutarları kendi para birimindedir: TL ödemeler SQL'de toplanır, dövizliler (para birimi, tarih)
+        bazında gruplanıp o tarihin kuruyla TL'ye çevrilir (KurService.tl_karsiliklari, tek kur sorgusu).
+        """
+        toplam = odemeler.filter(para_birimi='TRY').aggregate(t=Sum('tutar'))['t'] or Decimal('0.00')
+        dovizli = list(
+            odemeler.exclude(para_birimi='TRY').order_by().values('para_birimi', 'tarih')
+            .annotate(t=Sum('tutar')).values_list('para_birimi', 'tarih', 't')
+        )
+        return toplam + sum(KurService.tl_karsiliklari(dovizli), Decimal('0.00'))
+
+    @staticmethod
+    def dashboard_ozeti():
+        ozet = cache.get(FinansService.ONBELLEK_ANAHTARI)
+        if ozet is None:
+            ozet = FinansService._dashboard_hesapla()
+            cache.set(FinansService.ONBELLEK_ANAHTARI, ozet, timeout=FinansService.ONBELLEK_SURESI)
+        return ozet
+
+    @staticmethod
+    def _dashboard_hesapla():
+        # İş kalemi maliyeti: Onaylı teklif varsa onun, yoksa bekleyen EN DÜŞÜK teklifin saklanan TL tutarı.
+        # Kalem maliyetleri alt sorgu, kategori toplamları GROUP BY ile tek sorguda hesaplanır.
+        onayli_tutar = Teklif.objects.filter(
+            is_kalemi=OuterRef('pk'), durum='onaylandi'
+        ).order_by('id').values('toplam_tutar_tl')[:1]
+        en_dusuk_tutar = Teklif.objects.filter(
+            is_kalemi=OuterRef('pk'), durum='beklemede'
+        ).order_by('toplam_tutar_tl').values('toplam_tutar_tl')[:1]
+        kategoriler = IsKalemi.objects.annotate(
+            maliyet=Coalesce(Subquery(onayli_tutar), Subquery(en_dusuk_tutar))
+        ).values('kategori_id', 'kategori__isim').annotate(
+            toplam=Sum('maliyet'), kalem_sayisi=Count('id'), dolu_kalem_sayisi=Count('maliyet')
+        ).order_by('kategori_id')
+
+        imalat_maliyeti = Decimal('0.00')
+        imalat_labels, imalat_data = [], []
+        toplam_kalem_sayisi = dolu_kalem_sayisi = 0
+        for satir in kategoriler:
+            toplam_kalem_sayisi += satir['kalem_sayisi']
+            dolu_kalem_sayisi += satir['dolu_kalem_sayisi']
+            kat_toplam = (satir['toplam'] or Decimal('0')).quantize(Decimal('0.01'))
+            if kat_toplam > 0:
+                imalat_labels.append(satir['kategori__isim'])
+                imalat_data.append(float(kat_toplam))
+                imalat_maliyeti += kat_toplam
+
+        harcama_tutari = Decimal('0.00')
+        gider_labels, gider_data = [], []
+        for isim, tutar_tl in Harcama.objects.values('kategori_id', 'kategori__isim').annotate(
+            toplam=Sum(FinansService.harcama_tl_ifadesi())
+        ).order_by('kategori_id').values_list('kategori__isim', 'toplam'):
+            tutar_tl = (tutar_tl or Decimal('0')).quantize(Decimal('0.01'))
+            if tutar_tl > 0:
+                gider_labels.append(isim)
+                gider_data.append(float(tutar_tl))
+                harcama_tutari += tutar_tl
+
+        hakedis_borcu = Hakedis.objects.filter(onay_durumu=True).aggregate(t=Sum('odenecek_net_tutar'))['t'] or Decimal('0.00')
+        fatura_borcu = Fatura.objects.aggregate(t=Sum('tutar'))['t'] or Decimal('0.00')
+        toplam_odenen = FinansService.odemelerin_tl_toplami(Odeme.objects.all())
+
+        return {
+            'imalat_maliyeti': imalat_maliyeti,
+            'harcama_tutari': harcama_tutari,
+            'kalan_borc': (hakedis_borcu + fatura_borcu) - toplam_odenen,
+            'oran': int((dolu_kalem_sayisi / toplam_kalem_sayisi) * 100) if toplam_kalem_sayisi else 0,
+            'imalat_labels': imalat_labels,
+            'imalat_data': imalat_data,
+            'gider_labels': gider_labels,
+            'gider_data': gider_data,
+        }
+
+
+class KurService:
+    """
+    Döviz kurları. Kaynak DovizKuru tablosudur ('kur_guncelle' komutu TCMB bülteninden doldurur);
+    ekranlar ağa çıkmaz. En son bülten süreç içinde kısa süreli (TTL) önbellekte tutulur.
+    """
+    ONBELLEK_SURESI = 300  # saniye
+    VARSAYILAN_KUR = Decimal('1.0')
+    # Tarihte bülten yoksa en fazla bu kadar gün geriye bakılır (hafta sonu + bayram tatilleri)
+    GERIYE_GUN = 10
+    _onbellek = None  # (son_gecerlilik, {kod: kur})
+
+    @staticmethod
+    def doviz_kodlari():
+        return [kod for kod, _ in PARA_BIRIMI_CHOICES if kod != 'TRY']
+
+    @staticmethod
+    def onbellegi_sil():
+        KurService._onbellek = None
+
+    @staticmethod
+    def guncel_kurlar():
+        """{kod: kur} -> her dövizin en son bülten kuru. Kaydı olmayan döviz için 1.0 döner."""
+        simdi = time.monotonic()
+        onbellek = KurService._onbellek
+        if onbellek is None or onbellek[0] <= simdi:
+            kurlar = {kod: KurService.VARSAYILAN_KUR for kod in KurService.doviz_kodlari()}
+            son_tarih = DovizKuru.objects.filter(
+                para_birimi=OuterRef('para_birimi')
+            ).order_by('-tarih').values('tarih')[:1]
+            kurlar.update(DovizKuru.objects.filter(tarih=Subquery(son_tarih)).values_list('para_birimi', 'kur'))
+            onbellek = KurService._onbellek = (simdi + KurService.ONBELLEK_SURESI, kurlar)
+        return dict(onbellek[1])
+
+    @staticmethod
+    def kurlari_kaydet(satirlar, parti=1000):
+        """
+        satirlar: [(tarih, kod, {'kur', 'doviz_satis', 'efektif_satis'})]
+        Aynı (para birimi, tarih) varsa üzerine yazar (tekrar çalıştırmaya dayanıklı). Yazılan satır sayısını döner.
+        """
+        # Aynı (para birimi, tarih) bir partide iki kez olamaz (ON CONFLICT aynı satırı iki kez güncelleyemez)
+        tekil = {(kod, tarih): degerler for tarih, kod, degerler in satirlar}
+        kayitlar = [
+            DovizKuru(para_birimi=kod, tarih=tarih, **degerler) for (kod, tarih), degerler in tekil.items()
+        ]
+        with transaction.atomic():
+            DovizKuru.objects.bulk_create(
+                kayitlar, batch_size=parti, update_conflicts=True, unique_fields=['para_birimi', 'tarih'],
+                update_fields=['kur', 'doviz_satis', 'efektif_satis', 'guncelleme_tarihi'],
+            )
+            if kayitlar:
+                # Bu bültenlerle TL karşılığı değişen dövizli ödemelerin carileri ve finans özeti yenilenir
+                tarihler = [tarih for _, tarih in tekil]
+                CariService.doviz_carilerini_guncelle(min(tarihler), max(tarihler) + timedelta(days=KurService.GERIYE_GUN))
+                FinansService.onbellegi_sil()
+        transaction.on_commit(KurService.onbellegi_sil)
+        return len(kayitlar)
+
+    @staticmethod
+    def tarihteki_kurlar(ciftler, geriye_gun=None):
+        """
+        Toplu "tarihteki kur" çözümü (raporlar için): binlerce (kod, tarih) çifti tek sorguyla çözülür.
+        O tarihte bülten yoksa (hafta sonu / resmi tatil) önceki ilk iş gününün bülteni kullanılır;
+        geriye_gun içinde bülten bulunamazsa kur None döner. TRY her zaman 1'dir.
+        Dönüş: {(kod, tarih): kur}
+        """
+        geriye_gun = KurService.GERIYE_GUN if geriye_gun is None else geriye_gun
+        ciftler = set(ciftler)
+        sonuc = {(kod, tarih): Decimal('1') for kod, tarih in ciftler if kod == 'TRY'}
+        aranan = [(kod, tarih) for kod, tarih in ciftler if kod != 'TRY']
+        if not aranan:
+            return sonuc
+
+        # Tüm aralık tek seferde okunur; her para birimi için tarihe göre sıralı seri kurulur
+        tarihler = [tarih for _, tarih in aranan]
+        seriler = defaultdict(lambda: ([], []))
+        for kod, tarih, kur in DovizKuru.objects.filter(
+            para_birimi__in={kod for kod, _ in aranan},
+            tarih__range=(min(tarihler) - timedelta(days=geriye_gun), max(tarihler)),
+        ).order_by('para_birimi', 'tarih').values_list('para_birimi', 'tarih', 'kur'):
+            seriler[kod][0].append(tarih)
+            seriler[kod][1].append(kur)
+
+        for kod, tarih in aranan:
+            bulten_tarihleri, kurlar = seriler.get(kod, ([], []))
+            # tarih'e eşit ya da ondan önceki son bülten
+            sira = bisect_right(bulten_tarihleri, tarih) - 1
+            if sira >= 0 and (tarih - bulten_tarihleri[sira]).days <= geriye_gun:
+                sonuc[(kod, tarih)] = kurlar[sira]
+            else:
+                sonuc[(kod, tarih)] = None
+        return sonuc
+
+    @staticmethod
+    def tl_karsiliklari(satirlar):
+        """
+        Döviz tutarlarını kendi tarihlerinin kuruyla TL'ye çevirir: [(kod, tarih, tutar)] -> [TL tutar] (aynı sırada).
+        Kurlar tarihteki_kurlar ile tek sorguda çözülür; arşivde bülten yoksa güncel kur kullanılır.
+        """
+        satirlar = list(satirlar)
+        kurlar = KurService.tarihteki_kurlar((kod, tarih) for kod, tarih, _ in satirlar)
+        guncel = None
+        sonuc = []
+        for kod, tarih, tutar in satirlar:
+            kur = kurlar[(kod, tarih)]
+            if kur is None:
+                guncel = guncel or KurService.guncel_kurlar()
+                kur = guncel.get(kod, KurService.VARSAYILAN_KUR)
+            sonuc.append((tutar * kur).quantize(Decimal('0.01')))
+        return sonuc
+
+
+class CariService:
+    """
+    Tedarikçi cari hesapları. Bakiye tek formülle, tek yerde hesaplanır ve CariBakiye tablosunda tutulur:
+      Borç   = Faturalar + Onaylı hakedişler (ödenecek net)
+      Alacak = Ödemeler + Faturadan düşülen iadeler (iade_aksiyonu='iptal'; sipariş birim TL fiyatından)
+    Dövizli ödemeler ödeme tarihinin kuruyla TL'ye çevrilir (KurService.tl_karsiliklari).
+    Kaynak kayıtlar değiştiğinde (sinyaller ve StockService) sadece etkilenen tedarikçiler defterden
+    yeniden yazılır; ekranlar bakiyeyi tek satır okur. Kurtarma: 'cari_bakiye_yeniden_kur'.
+    """
+
+    @staticmethod
+    def iade_tutari_ifadesi():
+        """İade satırının TL değeri: miktar x siparişin KDV dahil birim TL fiyatı (2 haneye yuvarlı)."""
+        return Round(
+            F('miktar') * F('siparis__teklif__toplam_tutar_tl') / F('siparis__teklif__miktar'), 2,
+            output_field=DecimalField(max_digits=18, decimal_places=2),
+        )
+
+    @staticmethod
+    def _kaynaklar(tedarikci_ids):
+        """[(yön, tedarikçi alan yolu, queryset, tutar ifadesi)] -> bakiyeyi oluşturan defter kaynakları."""
+        iadeler = {'islem_turu': 'iade', 'iade_aksiyonu': 'iptal', 'siparis__teklif__miktar__gt': 0}
+        return [
+            ('borc', 'satinalma__teklif__tedarikci_id',
+             Fatura.objects.filter(satinalma__teklif__tedarikci_id__in=tedarikci_ids), F('tutar')),
+            ('borc', 'satinalma__teklif__tedarikci_id',
+             Hakedis.objects.filter(onay_durumu=True, satinalma__teklif__tedarikci_id__in=tedarikci_ids),
+             F('odenecek_net_tutar')),
+            ('alacak', 'tedarikci_id', Odeme.objects.filter(para_birimi='TRY', tedarikci_id__in=tedarikci_ids), F('tutar')),
+        ] + [
+            ('alacak', 'siparis__teklif__tedarikci_id',
+             hareketler.filter(siparis__teklif__tedarikci_id__in=tedarikci_ids, **iadeler),
+             CariService.iade_tutari_ifadesi())
+            for hareketler in (DepoHareket.objects, ArsivDepoHareket.objects)
+        ]
+
+    @staticmethod
+    def doviz_odemeleri(odemeler):
+        """Dövizli ödemeler tek tek, kendi tarihlerinin kuruyla: [(ödeme değerleri, TL tutar)]."""
+        satirlar = list(odemeler.exclude(para_birimi='TRY').values(
+            'tedarikci_id', 'tarih', 'odeme_turu', 'aciklama', 'tutar', 'para_birimi'
+        ))
+        return list(zip(satirlar, KurService.tl_karsiliklari((o['para_birimi'], o['tarih'], o['tutar']) for o in satirlar)))
+
+    @staticmethod
+    def doviz_carilerini_guncelle(baslangic, bitis):
+        """Tarih aralığında dövizli ödemesi olan tedarikçilerin carilerini yeniden yazar (yeni kur bülteni geldiğinde)."""
+        return CariService.cari_bakiyelerini_guncelle(set(
+            Odeme.objects.exclude(para_birimi='TRY').filter(tarih__range=(baslangic, bitis))
+            .values_list('tedarikci_id', flat=True).distinct()
+        ))
+
+    @staticmethod
+    def siparis_tedarikcileri(siparis_ids):
+        siparis_ids = {s_id for s_id in siparis_ids if s_id}
+        if not siparis_ids:
+            return set()
+        return set(SatinAlma.objects.filter(id__in=siparis_ids).values_list('teklif__tedarikci_id', flat=True))
+
+    @staticmethod
+    @transaction.atomic
+    def cari_bakiyelerini_guncelle(tedarikci_ids):
+        """
+        Verilen tedarikçilerin CariBakiye satırlarını defterden gruplu sorgularla yeniden yazar (upsert).
+        Tedarikçi satırları kilitlenir: aynı cariye eş zamanlı iki yazma birbirinin sonucunu ezemez.
+        """
+        tedarikci_ids = {t_id for t_id in tedarikci_ids if t_id}
+        if not tedarikci_ids:
+            return 0
+        mevcut = list(Tedarikci.objects.select_for_update().filter(id__in=tedarikci_ids).order_by('id').values_list('id', flat=True))
+
+        toplamlar = {t_id: {'borc': Decimal('0'), 'alacak': Decimal('0'), 'son': None} for t_id in mevcut}
+
+        def ekle(t_id, yon, toplam, son_tarih):
+            satir = toplamlar[t_id]
+            satir[yon] += toplam or Decimal('0')
+            if son_tarih and (satir['son'] is None or son_tarih > satir['son']):
+                satir['son'] = son_tarih
+
+        for yon, alan, sorgu, tutar in CariService._kaynaklar(mevcut):
+            for t_id, toplam, son_tarih in sorgu.order_by().values(alan).annotate(
+                t=Sum(tutar), s=Max('tarih')
+            ).values_list(alan, 't', 's'):
+                ekle(t_id, yon, toplam, son_tarih)
+        for odeme, tutar_tl in CariService.doviz_odemeleri(Odeme.objects.filter(tedarikci_id__in=mevcut)):
+            ekle(odeme['tedarikci_id'], 'alacak', tutar_tl, odeme['tarih'])
+
+        CariBakiye.objects.bulk_create(
+            [
+                CariBakiye(
+                    tedarikci_id=t_id, borc=satir['borc'], alacak=satir['alacak'],
+                    bakiye=satir['borc'] - satir['alacak'], son_hareket_tarihi=satir['son'],
+                )
+                for t_id, satir in toplamlar.items()
+            ],
+            batch_size=500, update_conflicts=True, unique_fields=['tedarikci'],
+            update_fields=['borc', 'alacak', 'bakiye', 'son_hareket_tarihi', 'guncelleme_tarihi'],
+        )
+        return len(mevcut)
+
+    @staticmethod
+    def iade_etkisi(hareketler):
+        """Faturadan düşülen iade satırları değiştiyse ilgili siparişlerin tedarikçi carilerini günceller."""
+        siparis_ids = [
+            h['siparis_id'] for h in hareketler
+            if h['siparis_id'] and h['islem_turu'] == 'iade' and h['iade_aksiyonu'] == 'iptal'
+        ]
+        if siparis_ids:
+            CariService.cari_bakiyelerini_guncelle(CariService.siparis_tedarikcileri(siparis_ids))
+
+    @staticmethod
+    def bakiye(tedarikci_id):
+        """O(1) okuma: CariBakiye satırı (kaydı yoksa sıfır özet)."""
+        return CariBakiye.objects.filter(tedarikci_id=tedarikci_id).first() or CariBakiye(tedarikci_id=tedarikci_id)
+
+    @staticmethod
+    def ekstre_satirlari(tedarikci_id):
+        """Cari ekstre satırları (tarih sırasıyla, yürüyen bakiyeli). Son bakiye CariBakiye ile aynı formüldür."""
+        satirlar = []
+        for f in Fatura.objects.filter(satinalma__teklif__tedarikci_id=tedarikci_id).values(
+            'tarih', 'fatura_no', 'tutar', 'satinalma__teklif__malzeme__isim', 'satinalma__teklif__is_kalemi__isim'
+        ):
+            isim = f['satinalma__teklif__malzeme__isim'] or f['satinalma__teklif__is_kalemi__isim'] or "-"
+            satirlar.append({'tarih': f['tarih'], 'tur': 'FATURA', 'aciklama': f"Fatura #{f['fatura_no']} - {isim}",
+                             'borc': f['tutar'], 'alacak': Decimal('0.00')})
+        for h in Hakedis.objects.filter(satinalma__teklif__tedarikci_id=tedarikci_id, onay_durumu=True).values(
+            'tarih', 'hakedis_no', 'odenecek_net_tutar', 'satinalma__teklif__is_kalemi__isim'
+        ):
+            satirlar.append({'tarih': h['tarih'], 'tur': 'HAKEDİŞ',
+                             'aciklama': f"Hakediş #{h['hakedis_no']} - {h['satinalma__teklif__is_kalemi__isim'] or '-'}",
+                             'borc': h['odenecek_net_tutar'], 'alacak': Decimal('0.00')})
+        odemeler = Odeme.objects.filter(tedarikci_id=tedarikci_id)
+        tl_odemeler = [
+            (o, o['tutar'])
+            for o in odemeler.filter(para_birimi='TRY').values('tarih', 'odeme_turu', 'aciklama', 'tutar', 'para_birimi')
+        ]
+        for o, tutar_tl in tl_odemeler + CariService.doviz_odemeleri(odemeler):
+            satirlar.append({'tarih': o['tarih'], 'tur': f"ÖDEME ({o['odeme_turu']})",
+                             'aciklama': o['aciklama'] or f"Ödeme ({o['odeme_turu']})",
+                             'borc': Decimal('0.00'), 'alacak': tutar_tl,
+                             'para_birimi': o['para_birimi'], 'doviz_tutari': o['tutar']})
+        for hareketler in (DepoHareket.objects, ArsivDepoHareket.objects):
+            for i in hareketler.filter(
+                siparis__teklif__tedarikci_id=tedarikci_id, islem_turu='iade', iade_aksiyonu='iptal',
+                siparis__teklif__miktar__gt=0,
+            ).annotate(tutar=CariService.iade_tutari_ifadesi()).values('tarih', 'miktar', 'malzeme__isim', 'tutar'):
+                satirlar.append({'tarih': i['tarih'], 'tur': 'İADE',
+                                 'aciklama': f"İade: {i['malzeme__isim']} x {i['miktar']}",
+                                 'borc': Decimal('0.00'), 'alacak': i['tutar']})
+
+        satirlar.sort(key=lambda s: s['tarih'])
+        bakiye = Decimal('0.00')
+        for satir in satirlar:
+            bakiye += satir['borc'] - satir['alacak']
+            satir['bakiye'] = bakiye
+            satir.setdefault('para_birimi', 'TRY')
+        return satirlar
@@ -1,11 +1,12 @@
 # core/signals.py
 import logging
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.db import transaction
+from django.db.models import F
 
-from .models import DepoTransfer, SatinAlma
-from core.services import StockService
+from .models import DepoTransfer, Fatura, GiderKategorisi, Hakedis, Harcama, IsKalemi, Kategori, Odeme, SatinAlma, Tedarikci, Teklif
+from core.services import CariService, FinansService, StockService
 
 logger = logging.getLogger(__name__)
 
@@ -26,27 +27,19 @@ def depo_transfer_post_save(sender, instance, created, **kwargs):
 
         if not siparis_obj and instance.kaynak_depo.is_sanal:
             try:
-                aday_siparisler = (
-                    SatinAlma.objects
-                    .filter(teklif__malzeme=instance.malzeme)
-                    .exclude(teslimat_durumu="tamamlandi")
-                    .order_by("created_at")
-                )
-
-                for aday in aday_siparisler:
-                    # 'sanal_depoda_bekleyen' üzerinden FIFO kontrolü
-                    if aday.sanal_depoda_bekleyen > 0:
-                        siparis_obj = aday
-                        
-                        # Açıklamayı ve siparişi güncelle
-                        mevcut_not = (instance.aciklama or "").strip()
-                        ek_not = f"Oto. Sipariş #{aday.id}"
-                        instance.aciklama = f"{mevcut_not} ({ek_not})" if mevcut_not else ek_not
-                        instance.bagli_siparis = aday
-                        
-                        # Sadece gerekli alanları update et (recursive sinyali önlemek için)
-                        instance.save(update_fields=["bagli_siparis", "aciklama"])
-                        break
+                # Tek sorguda (kilitli) en eski, sanal depoda bekleyeni olan sipariş
+                aday = StockService.fifo_siparis_bul(instance.malzeme_id)
+                if aday:
+                    siparis_obj = aday
+
+                    # Açıklamayı ve siparişi güncelle
+                    mevcut_not = (instance.aciklama or "").strip()
+                    ek_not = f"Oto. Sipariş #{aday.id}"
+                    instance.aciklama = f"{mevcut_not} ({ek_not})" if mevcut_not else ek_not
+                    instance.bagli_siparis = aday
+
+                    # save() yerine doğrudan UPDATE (ikinci kayıt/sinyal tetiklenmez)
+                    DepoTransfer.objects.filter(pk=instance.pk).update(bagli_siparis=aday, aciklama=instance.aciklama)
 
             except Exception:
                 logger.exception("FIFO eşleşme hatası (DepoTransfer id=%s)", instance.id)
@@ -62,6 +55,64 @@ def depo_transfer_post_save(sender, instance, created, **kwargs):
             tarih=instance.tarih,
         )
 
-        # 3) Sipariş durum güncellemesini tetikle
+        # 3) Sanal depodan çıkış mal kabuldür: teslim sayacı defterle aynı transaction'da (F() ile) artar,
+        #    durum sadece kendi kolonuna yazılır (bellekteki bayat sayaç geri yazılmaz)
         if siparis_obj:
-            siparis_obj.save()
\ No newline at end of file
+            if instance.kaynak_depo.is_sanal:
+                SatinAlma.objects.filter(pk=siparis_obj.pk).update(teslim_edilen=F('teslim_edilen') + instance.miktar)
+                siparis_obj.refresh_from_db(fields=['teslim_edilen'])
+            siparis_obj.save(update_fields=['teslimat_durumu'])
+
+
+# Finans paneli anlık görüntüsünü besleyen kayıtlar değişince önbellek silinir
+@receiver([post_save, post_delete], sender=Teklif)
+@receiver([post_save, post_delete], sender=Harcama)
+@receiver([post_save, post_delete], sender=Hakedis)
+@receiver([post_save, post_delete], sender=Fatura)
+@receiver([post_save, post_delete], sender=Odeme)
+@receiver([post_save, post_delete], sender=IsKalemi)
+@receiver([post_save, post_delete], sender=Kategori)
+@receiver([post_save, post_delete], sender=GiderKategorisi)
+def finans_ozeti_gecersiz_kil(sender, **kwargs):
+    FinansService.onbellegi_sil()
+
+
+# Cari bakiyeyi oluşturan kayıtlar: kaydın tedarikçiye giden yolu
+CARI_TEDARIKCI_YOLU = {
+    Fatura: 'satinalma__teklif__tedarikci_id',
+    Hakedis: 'satinalma__teklif__tedarikci_id',
+    Odeme: 'tedarikci_id',
+}
+
+
+def _cari_tedarikcisi(instance):
+    if isinstance(instance, Odeme):
+        return instance.tedarikci_id
+    return next(iter(CariService.siparis_tedarikcileri([instance.satinalma_id])), None)
+
+
+@receiver(pre_save, sender=Fatura)
+@receiver(pre_save, sender=Hakedis)
+@receiver(pre_save, sender=Odeme)
+def cari_eski_tedarikciyi_hatirla(sender, instance, **kwargs):
+    # Kayıt başka bir siparişe / tedarikçiye taşınırsa eski cari de yeniden yazılmalı
+    instance._eski_cari_tedarikcisi = sender.objects.filter(pk=instance.pk).values_list(
+        CARI_TEDARIKCI_YOLU[sender], flat=True
+    ).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Fatura)
+@receiver(post_save, sender=Hakedis)
+@receiver(post_save, sender=Odeme)
+def cari_bakiyesini_guncelle(sender, instance, **kwargs):
+    CariService.cari_bakiyelerini_guncelle([_cari_tedarikcisi(instance), getattr(instance, '_eski_cari_tedarikcisi', None)])
+
+
+@receiver(post_delete, sender=Fatura)
+@receiver(post_delete, sender=Hakedis)
+@receiver(post_delete, sender=Odeme)
+def cari_bakiyesini_silmede_guncelle(sender, instance, origin=None, **kwargs):
+    # Tedarikçinin kendisi siliniyorsa CariBakiye satırı da zincirleme silinir; yeniden yazılmaz
+    if isinstance(origin, Tedarikci) or getattr(origin, 'model', None) is Tedarikci:
+        return
+    CariService.cari_bakiyelerini_guncelle([_cari_tedarikcisi(instance)])
@@ -0,0 +1,116 @@
+# core/stok_sorgulari.py
+"""
+Ortak stok sorgu katmanı. Stok gösteren tüm ekranlar (stok listesi, depo paneli, envanter,
+değerleme, admin, Malzeme.stok) stoğu buradan okur; böylece tek sorgu şekli ve tek kural vardır.
+
+KURAL: Kullanım / Sarf yerlerindeki (Depo.is_kullanim_yeri=True) bakiyeler tüketilmiş sayılır,
+malzemenin kullanılabilir stoğuna dahil edilmez. Kullanım yerine yazılan bir İADE de sadece o yerin
+bakiyesinden düşer; kullanılabilir stok değişmez (eski Malzeme.stok, tüketilmiş sayılan bu miktarı
+kullanılabilir stoktan ikinci kez düşüyordu).
+
+Tekil okumalar (malzeme_stogu, depo_stogu) istek boyunca önbelleğe alınır
+(bkz. StokSorguOnbellegiMiddleware); StockService bakiye yazdığında önbellek temizlenir.
+"""
+from contextvars import ContextVar
+from decimal import Decimal
+from django.db.models import Q, F, Sum, Value, Case, When, CharField, DecimalField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from core.models import Malzeme, StokBakiye
+
+# Kullanılabilir stok kuralı (StokBakiye üzerinde)
+KULLANIM_YERI_HARIC = Q(depo__is_kullanim_yeri=False)
+
+# Kritik stok x 1.5'e kadar 'AZALDI' sayılır
+AZALDI_CARPANI = Decimal('1.5')
+
+STOK_DURUM_RENKLERI = {
+    'YOK': 'secondary',
+    'KRİTİK': 'danger',
+    'AZALDI': 'warning',
+    'YETERLİ': 'success',
+}
+
+_onbellek = ContextVar('stok_sorgu_onbellegi', default=None)
+
+
+class StokSorguOnbellegiMiddleware:
+    """Her istek için boş bir stok önbelleği açar, istek bitince kapatır."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _onbellek.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            _onbellek.reset(token)
+
+
+def onbellekli(anahtar, hesapla):
+    """İstek içindeyse sonucu önbellekten döner; istek dışında (komutlar vb.) doğrudan hesaplar."""
+    onbellek = _onbellek.get()
+    if onbellek is None:
+        return hesapla()
+    if anahtar not in onbellek:
+        onbellek[anahtar] = hesapla()
+    return onbellek[anahtar]
+
+
+def onbellegi_temizle():
+    onbellek = _onbellek.get()
+    if onbellek is not None:
+        onbellek.clear()
+
+
+def kullanilabilir_bakiyeler():
+    """Kullanım yerleri hariç StokBakiye satırları (envanter / değerleme ekranları)."""
+    return StokBakiye.objects.filter(KULLANIM_YERI_HARIC)
+
+
+def stok_ifadesi():
+    """
+    Malzeme sorgularına eklenecek kullanılabilir stok ifadesi (StokBakiye toplamı).
+    İlişkili alt sorgu olduğu için GROUP BY oluşturmaz; filtre, sıralama ve aggregate ile birlikte çalışır.
+    """
+    alt_sorgu = StokBakiye.objects.filter(
+        KULLANIM_YERI_HARIC, malzeme=OuterRef('pk')
+    ).values('malzeme').annotate(toplam=Sum('miktar')).values('toplam')
+    return Coalesce(
+        Subquery(alt_sorgu, output_field=DecimalField(max_digits=15, decimal_places=2)),
+        Value(Decimal('0')),
+        output_field=DecimalField(max_digits=15, decimal_places=2),
+    )
+
+
+def stok_durumu_ifadesi():
+    """YOK / KRİTİK / AZALDI / YETERLİ etiketi ('hesaplanan_stok' annotate edilmiş olmalı)."""
+    return Case(
+        When(hesaplanan_stok__lte=0, then=Value('YOK')),
+        When(hesaplanan_stok__lte=F('kritik_stok'), then=Value('KRİTİK')),
+        When(hesaplanan_stok__lte=F('kritik_stok') * AZALDI_CARPANI, then=Value('AZALDI')),
+        default=Value('YETERLİ'),
+        output_field=CharField(),
+    )
+
+
+def stoklu_malzemeler(queryset=None):
+    """Malzeme queryset'ini 'hesaplanan_stok' ve 'stok_durumu' ile işaretler (tek sorgu şekli)."""
+    if queryset is None:
+        queryset = Malzeme.objects.all()
+    return queryset.annotate(hesaplanan_stok=stok_ifadesi()).annotate(stok_durumu=stok_durumu_ifadesi())
+
+
+def malzeme_stogu(malzeme_id):
+    """Tek malzemenin kullanılabilir stoğu (istek boyunca önbellekli)."""
+    return onbellekli(('malzeme', malzeme_id), lambda: (
+        kullanilabilir_bakiyeler().filter(malzeme_id=malzeme_id).aggregate(t=Sum('miktar'))['t'] or Decimal('0')
+    ))
+
+
+def depo_stogu(malzeme_id, depo_id):
+    """(malzeme, depo) bakiyesi (istek boyunca önbellekli)."""
+    return onbellekli(('depo', malzeme_id, int(depo_id)), lambda: (
+        StokBakiye.objects.filter(malzeme_id=malzeme_id, depo_id=depo_id)
+        .values_list('miktar', flat=True).first() or Decimal('0')
+    ))
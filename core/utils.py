@@ -1,43 +1,82 @@
+import base64
+import json
 import requests
 import xml.etree.ElementTree as ET
+from datetime import datetime
 from decimal import Decimal, ROUND_HALF_UP
+from django.core.exceptions import ValidationError
+from django.db.models import Q
 
-def tcmb_kur_getir():
+TCMB_GUNLUK_URL = "https://www.tcmb.gov.tr/kurlar/today.xml"
+
+def tcmb_xml_indir(url=TCMB_GUNLUK_URL, timeout=10):
     """
-    TCMB'den güncel USD, EUR ve GBP kurlarını çeker.
-    Hata durumunda varsayılan olarak 1.0 döner.
+    TCMB kur bültenini (XML) indirir. Ağ erişimi SADECE 'kur_guncelle' komutundan yapılır;
+    ekranlar kurları DovizKuru tablosundan okur.
     """
-    url = "https://www.tcmb.gov.tr/kurlar/today.xml"
-    
-    kurlar = {
-        'USD': Decimal('1.0'),
-        'EUR': Decimal('1.0'),
-        'GBP': Decimal('1.0') # Sterlin Eklendi
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.content
+
+def _tcmb_deger(currency, etiket):
+    eleman = currency.find(etiket)
+    metin = (eleman.text or '').strip() if eleman is not None else ''
+    return Decimal(metin) if metin else None
+
+def _tcmb_bulten_tarihi(kok):
+    # Kök: <Tarih_Date Tarih="17.10.2026" Date="10/17/2026" ...>
+    return datetime.strptime(kok.get('Tarih'), '%d.%m.%Y').date()
+
+def _tcmb_kur_degerleri(currency):
+    """
+    Tek <Currency> elemanının kurları (1 birim döviz için; Unit'e bölünür).
+    kur = Efektif (Banknot) satış, yoksa Döviz (Forex) satış. Satış kuru yoksa None döner.
+    """
+    birim = _tcmb_deger(currency, 'Unit') or Decimal('1')
+    doviz_satis = _tcmb_deger(currency, 'ForexSelling')
+    efektif_satis = _tcmb_deger(currency, 'BanknoteSelling')
+    kur = efektif_satis or doviz_satis
+    if not kur:
+        return None
+    return {
+        'kur': (kur / birim).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP),
+        'doviz_satis': (doviz_satis / birim).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP) if doviz_satis else None,
+        'efektif_satis': (efektif_satis / birim).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP) if efektif_satis else None,
     }
-    
-    try:
-        response = requests.get(url, timeout=5)
-        
-        if response.status_code == 200:
-            root = ET.fromstring(response.content)
-            
-            for currency in root.findall('Currency'):
-                kod = currency.get('Kod')
-                
-                # Banknot Satış yoksa Forex Satış (Piyasa)
-                satis = currency.find('BanknoteSelling').text
-                if not satis:
-                    satis = currency.find('ForexSelling').text
-                    
-                if satis and kod in ['USD', 'EUR', 'GBP']:
-                    # Nokta/Virgül karmaşasını önlemek için güvenli dönüşüm
-                    deger = Decimal(satis)
-                    kurlar[kod] = deger
-
-    except Exception as e:
-        print(f"Kur çekme hatası: {e}")
-        
-    return kurlar
+
+def tcmb_kurlari_ayristir(icerik, kodlar=('USD', 'EUR', 'GBP')):
+    """
+    TCMB bülten XML'ini ayrıştırır.
+    Dönüş: (bulten_tarihi, {kod: {'kur', 'doviz_satis', 'efektif_satis'}})
+    """
+    root = ET.fromstring(icerik)
+    kurlar = {}
+    for currency in root.findall('Currency'):
+        kod = currency.get('Kod') or currency.get('CurrencyCode')
+        degerler = _tcmb_kur_degerleri(currency) if kod in kodlar else None
+        if degerler:
+            kurlar[kod] = degerler
+    return _tcmb_bulten_tarihi(root), kurlar
+
+def tcmb_kurlari_akis(kaynak, kodlar=('USD', 'EUR', 'GBP')):
+    """
+    TCMB bülten XML'ini akış halinde (iterparse) okur; geçmiş kur arşivi gibi çok sayıda/büyük
+    dosyada ağaç bellekte kurulmaz, işlenen her <Currency> elemanı hemen silinir.
+    kaynak: dosya yolu veya ikili (binary) dosya nesnesi
+    Üretir: (bulten_tarihi, kod, {'kur', 'doviz_satis', 'efektif_satis'})
+    """
+    bulten_tarihi = None
+    for olay, eleman in ET.iterparse(kaynak, events=('start', 'end')):
+        if olay == 'start':
+            if eleman.tag == 'Tarih_Date':
+                bulten_tarihi = _tcmb_bulten_tarihi(eleman)
+            continue
+        if eleman.tag == 'Currency':
+            kod = eleman.get('Kod') or eleman.get('CurrencyCode')
+            degerler = _tcmb_kur_degerleri(eleman) if kod in kodlar else None
+            if degerler and bulten_tarihi:
+                yield bulten_tarihi, kod, degerler
+            eleman.clear()
 
 def to_decimal(value, precision=2):
     if value is None or value == '':
@@ -57,4 +96,49 @@ def to_decimal(value, precision=2):
             rounding=ROUND_HALF_UP
         )
     except:
-        return Decimal('0.00')
\ No newline at end of file
+        return Decimal('0.00')
+
+def keyset_sayfala(queryset, imlec, alanlar, boyut=50, azalan=False):
+    """
+    İmleç (keyset) tabanlı sayfalama. OFFSET kullanmaz; her sayfa, sıralama alanlarının
+    son değerinden sonraki satırları indeks üzerinden okur, bu yüzden sayfa süresi
+    tablo büyüdükçe sabit kalır.
+
+    alanlar: benzersiz sıralama oluşturan alan listesi (Örn: ['isim', 'id'], son alan 'id' olmalı).
+             Alanlar NULL olamaz: NULL karşılaştırılamadığı için imleç o satırdan devam edemez.
+    imlec: önceki çağrının döndürdüğü opak metin (ilk sayfa için None/boş). Bozuk, elle değiştirilmiş
+           ya da alan tipine uymayan imleç hata vermez, ilk sayfaya düşer.
+    Dönüş: (satirlar, sonraki_imlec) -> son sayfada sonraki_imlec None'dır.
+    """
+    yon = '-' if azalan else ''
+    karsilastir = 'lt' if azalan else 'gt'
+    queryset = queryset.order_by(*[f"{yon}{alan}" for alan in alanlar])
+
+    if imlec:
+        try:
+            degerler = json.loads(base64.urlsafe_b64decode(imlec.encode()).decode())
+        except (ValueError, UnicodeDecodeError):
+            degerler = None
+
+        if isinstance(degerler, list) and len(degerler) == len(alanlar) and None not in degerler:
+            # (a, b) > (x, y)  =>  a > x OR (a = x AND b > y)
+            kosul = Q()
+            for i, alan in enumerate(alanlar):
+                esitlikler = {alanlar[j]: degerler[j] for j in range(i)}
+                kosul |= Q(**esitlikler, **{f"{alan}__{karsilastir}": degerler[i]})
+            # İlk alana aralık sınırı: planlayıcının indeks aralığı okuması için.
+            # Değerler filter() sırasında alan tipine çevrilir; çevrilemeyen imleç yok sayılır.
+            try:
+                queryset = queryset.filter(Q(**{f"{alanlar[0]}__{karsilastir}e": degerler[0]}) & kosul)
+            except (ValidationError, ValueError, TypeError):
+                pass
+
+    satirlar = list(queryset[:boyut + 1])
+    sonraki_imlec = None
+    if len(satirlar) > boyut:
+        satirlar = satirlar[:boyut]
+        son = satirlar[-1]
+        degerler = [getattr(son, alan) for alan in alanlar]
+        sonraki_imlec = base64.urlsafe_b64encode(json.dumps(degerler, default=str).encode()).decode()
+
+    return satirlar, sonraki_imlec
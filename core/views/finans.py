@@ -3,13 +3,13 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Sum, F, ExpressionWrapper, DecimalField
+from django.db.models import Sum, F, Q, ExpressionWrapper, DecimalField
 from django.http import JsonResponse
-from core.models import Tedarikci, Fatura, Odeme, Kategori, GiderKategorisi, Hakedis, SatinAlma
+from core.models import Tedarikci, Fatura, Odeme, Kategori, GiderKategorisi, Hakedis, SatinAlma, Depo
+from core.services import CariService, FinansService, KurService
 from core.forms import OdemeForm, HakedisForm
-from core.utils import tcmb_kur_getir
 from .guvenlik import yetki_kontrol
-from core.utils import to_decimal
+from core.utils import to_decimal, keyset_sayfala
 
 
 @login_required
@@ -17,7 +17,7 @@ def finans_dashboard(request):
     if not yetki_kontrol(request.user, ['OFIS_VE_SATINALMA', 'MUHASEBE_FINANS', 'YONETICI']):
         return redirect('erisim_engellendi')
 
-    guncel_kurlar = tcmb_kur_getir()
+    guncel_kurlar = KurService.guncel_kurlar()
     kur_usd = to_decimal(guncel_kurlar.get('USD', 1))
     kur_eur = to_decimal(guncel_kurlar.get('EUR', 1))
     kur_gbp = to_decimal(guncel_kurlar.get('GBP', 1))
@@ -29,106 +29,73 @@ def finans_dashboard(request):
             'gbp': (tl_tutar / kur_gbp).quantize(Decimal('0.00'))
         }
     
-    imalat_maliyeti = Decimal('0.00')
-    imalat_labels, imalat_data = [], []
-    kategoriler = Kategori.objects.prefetch_related('kalemler__teklifler').all()
-    
-    toplam_kalem_sayisi = 0
-    dolu_kalem_sayisi = 0
-
-    for kat in kategoriler:
-        kat_toplam = Decimal('0.00')
-        for kalem in kat.kalemler.all():
-            toplam_kalem_sayisi += 1
-            onayli = kalem.teklifler.filter(durum='onaylandi').first()
-            if onayli:
-                kat_toplam += to_decimal(onayli.toplam_fiyat_tl)
-                dolu_kalem_sayisi += 1
-            else:
-                bekleyenler = kalem.teklifler.filter(durum='beklemede')
-                if bekleyenler.exists():
-                    en_dusuk = min(bekleyenler, key=lambda t: t.toplam_fiyat_tl)
-                    kat_toplam += to_decimal(en_dusuk.toplam_fiyat_tl)
-                    dolu_kalem_sayisi += 1
-        
-        if kat_toplam > 0:
-            imalat_labels.append(kat.isim)
-            imalat_data.append(float(kat_toplam))
-            imalat_maliyeti += kat_toplam
-
-    harcama_tutari = Decimal('0.00')
-    gider_labels, gider_data = [], []
-    
-    for gk in GiderKategorisi.objects.all():
-        tutar_tl = sum(to_decimal(h.tl_tutar) for h in gk.harcamalar.all())
-        if tutar_tl > 0:
-            gider_labels.append(gk.isim)
-            gider_data.append(float(tutar_tl))
-            harcama_tutari += tutar_tl
-
-    # Dashboard Borç Hesaplaması (Dinamik & Hassas)
-    hakedis_borcu = Hakedis.objects.filter(onay_durumu=True).aggregate(t=Sum('odenecek_net_tutar'))['t'] or Decimal('0.00')
-    fatura_borcu = Fatura.objects.aggregate(t=Sum('tutar'))['t'] or Decimal('0.00')
-    toplam_odenen = Odeme.objects.aggregate(t=Sum('tutar'))['t'] or Decimal('0.00')
-    kalan_borc = (hakedis_borcu + fatura_borcu) - toplam_odenen
-    
-    oran = int((dolu_kalem_sayisi/toplam_kalem_sayisi)*100) if toplam_kalem_sayisi else 0
+    # TL tutarlar önbellekteki anlık görüntüden gelir; sadece döviz karşılıkları güncel kurla hesaplanır
+    ozet = FinansService.dashboard_ozeti()
+    genel_toplam = ozet['imalat_maliyeti'] + ozet['harcama_tutari']
 
     context = {
-        'imalat_maliyeti': imalat_maliyeti,
-        'harcama_tutari': harcama_tutari,
-        'genel_toplam': imalat_maliyeti + harcama_tutari,
-        'kalan_borc': kalan_borc,
-        'oran': oran,
-        'doviz_genel': cevir(imalat_maliyeti + harcama_tutari),
-        'imalat_labels': imalat_labels,
-        'imalat_data': imalat_data,
-        'gider_labels': gider_labels,
-        'gider_data': gider_data,
+        **ozet,
+        'genel_toplam': genel_toplam,
+        'doviz_genel': cevir(genel_toplam),
         'kurlar': guncel_kurlar,
     }
     return render(request, 'finans_dashboard.html', context)
 
+# Cari tablo sıralamaları: (imleç alanları, azalan mı)
+CARI_SIRALAMALARI = {
+    'bakiye': (['bakiye', 'id'], True),
+    'bakiye_artan': (['bakiye', 'id'], False),
+    'borc': (['borc', 'id'], True),
+    'firma': (['firma_unvani', 'id'], False),
+}
+
+# Bakiye filtresi: borçlu olduğumuz / fazla ödeme yaptığımız / kapanmış cariler
+CARI_BAKIYE_FILTRELERI = {
+    'borclu': Q(bakiye__gt=0),
+    'alacakli': Q(bakiye__lt=0),
+    'kapali': Q(bakiye=0),
+}
+
 @login_required
 def finans_ozeti(request):
     if not yetki_kontrol(request.user, ['OFIS_VE_SATINALMA', 'MUHASEBE_FINANS', 'YONETICI']):
         return redirect('erisim_engellendi')
-    
-    finans_verisi = []
-    genel_borc = Decimal('0.00')
-    genel_odenen = Decimal('0.00')
-
-    # N+1 Sorununu önlemek için prefetch
-    tedarikciler = Tedarikci.objects.prefetch_related('teklifler__satinalma_set__faturalar', 'odemeler').all()
-
-    for ted in tedarikciler:
-        # Fatura bazlı borç hesabı
-        borc = Decimal('0.00')
-        faturalar = Fatura.objects.filter(satinalma__teklif__tedarikci=ted)
-        # Fatura modeli DecimalField kullanıyorsa direkt aggregate yapılabilir
-        borc = faturalar.aggregate(toplam=Sum('tutar'))['toplam'] or Decimal('0.00')
-
-        # Ödemeler
-        odenen = ted.odemeler.aggregate(toplam=Sum('tutar'))['toplam'] or Decimal('0.00')
-        
-        bakiye = borc - odenen
-        
-        if borc > 0 or odenen > 0:
-            finans_verisi.append({
-                'id': ted.id,
-                'firma': ted.firma_unvani,
-                'borc': borc,
-                'odenen': odenen,
-                'bakiye': bakiye
-            })
-            genel_borc += borc
-            genel_odenen += odenen
-            
+
+    # Borç / ödenen / bakiye artımlı tutulan CariBakiye satırından okunur (defter taranmaz)
+    cariler = Tedarikci.objects.filter(cari__isnull=False).annotate(
+        borc=F('cari__borc'), odenen=F('cari__alacak'), bakiye=F('cari__bakiye'),
+    ).filter(Q(borc__gt=0) | Q(odenen__gt=0))
+
+    arama = request.GET.get('q', '').strip()
+    if arama:
+        cariler = cariler.filter(firma_unvani__icontains=arama)
+    bakiye_durumu = request.GET.get('bakiye', '')
+    if bakiye_durumu in CARI_BAKIYE_FILTRELERI:
+        cariler = cariler.filter(CARI_BAKIYE_FILTRELERI[bakiye_durumu])
+
+    sira = request.GET.get('sira')
+    if sira not in CARI_SIRALAMALARI:
+        sira = 'bakiye'
+    alanlar, azalan = CARI_SIRALAMALARI[sira]
+    veriler, sonraki_imlec = keyset_sayfala(
+        cariler.only('id', 'firma_unvani'), request.GET.get('imlec'), alanlar, azalan=azalan
+    )
+
+    # Özet kartları filtrelenmiş tüm cariler üzerinden (sayfadan bağımsız)
+    toplamlar = cariler.aggregate(toplam_borc=Sum('borc'), toplam_odenen=Sum('odenen'))
+    toplam_borc = toplamlar['toplam_borc'] or Decimal('0.00')
+    toplam_odenen = toplamlar['toplam_odenen'] or Decimal('0.00')
+
     return render(request, 'finans_ozeti.html', {
-        'veriler': finans_verisi,
-        'toplam_borc': genel_borc,
-        'toplam_odenen': genel_odenen,
-        'toplam_bakiye': genel_borc - genel_odenen
+        'veriler': veriler,
+        'toplam_borc': toplam_borc,
+        'toplam_odenen': toplam_odenen,
+        'toplam_bakiye': toplam_borc - toplam_odenen,
+        'sonraki_imlec': sonraki_imlec,
+        'ilk_sayfa_mi': not request.GET.get('imlec'),
+        'arama': arama,
+        'bakiye_durumu': bakiye_durumu,
+        'sira': sira,
     })
 
 @login_required
@@ -154,7 +121,8 @@ def odeme_dashboard(request):
         kdvli_toplam = ara_toplam * (1 + (kdv_orani / 100))
         malzeme_borcu += kdvli_toplam
 
-    toplam_odenen = Odeme.objects.aggregate(toplam=Sum('tutar'))['toplam'] or Decimal('0.00')
+    # Dövizli ödemeler ödeme tarihinin kuruyla TL'ye çevrilir
+    toplam_odenen = FinansService.odemelerin_tl_toplami(Odeme.objects.all())
     
     context = {
         'hakedis_toplam': hakedis_toplam,
@@ -191,35 +159,13 @@ def cek_durum_degistir(request, odeme_id):
 def tedarikci_ekstresi(request, tedarikci_id):
     if not yetki_kontrol(request.user, ['OFIS_VE_SATINALMA', 'MUHASEBE_FINANS', 'YONETICI']): return redirect('erisim_engellendi')
     tedarikci = get_object_or_404(Tedarikci, id=tedarikci_id)
-    hareketler = []
-    
-    # Decimal işlem
-    for t in tedarikci.teklifler.filter(durum='onaylandi'):
-        isim = t.malzeme.isim if t.malzeme else (t.is_kalemi.isim if t.is_kalemi else "-")
-        hareketler.append({
-            'tarih': t.olusturulma_tarihi.date(),
-            'tur': 'BORÇ',
-            'aciklama': f"{isim}",
-            'borc': to_decimal(t.toplam_fiyat_tl),
-            'alacak': Decimal('0.00')
-        })
-        
-    for o in tedarikci.odemeler.all():
-        hareketler.append({
-            'tarih': o.tarih,
-            'tur': f'ÖDEME ({o.odeme_turu})',
-            'aciklama': o.aciklama,
-            'borc': Decimal('0.00'),
-            'alacak': to_decimal(o.tutar)
-        })
-    
-    hareketler.sort(key=lambda x: x['tarih'])
-    bakiye = Decimal('0.00')
-    for h in hareketler:
-        bakiye += (h['borc'] - h['alacak'])
-        h['bakiye'] = bakiye
+    hareketler = CariService.ekstre_satirlari(tedarikci.id)
+    cari = CariService.bakiye(tedarikci.id)
 
-    return render(request, 'tedarikci_ekstre.html', {'tedarikci': tedarikci, 'hareketler': hareketler, 'son_bakiye': bakiye})
+    return render(request, 'tedarikci_ekstre.html', {
+        'tedarikci': tedarikci, 'hareketler': hareketler, 'toplam_borc': cari.borc, 'toplam_alacak': cari.alacak,
+        'son_bakiye': cari.bakiye, 'now': timezone.now(),
+    })
 
 @login_required
 def hakedis_ekle(request, siparis_id):
@@ -375,46 +321,15 @@ def odeme_yap(request):
 @login_required
 def cari_ekstre(request, tedarikci_id):
     tedarikci = get_object_or_404(Tedarikci, id=tedarikci_id)
-    hareketler = []
-    
-    # Hakedişler
-    for h in Hakedis.objects.filter(satinalma__teklif__tedarikci=tedarikci, onay_durumu=True):
-        hareketler.append({'tarih': h.tarih, 'aciklama': f"Hakediş #{h.hakedis_no}", 'borc': to_decimal(h.odenecek_net_tutar), 'alacak': Decimal('0')})
-    
-    # Malzemeler
-    for m in SatinAlma.objects.filter(teklif__tedarikci=tedarikci, teklif__malzeme__isnull=False).exclude(teslimat_durumu='bekliyor'):
-        try:
-            # Hesaplama
-            miktar = to_decimal(m.teslim_edilen)
-            fiyat = to_decimal(m.teklif.birim_fiyat)
-            kur = to_decimal(m.teklif.kur_degeri)
-            tutar = miktar * fiyat * kur
-            
-            if tutar > 0: 
-                hareketler.append({'tarih': m.created_at.date(), 'aciklama': m.teklif.malzeme.isim, 'borc': tutar, 'alacak': Decimal('0')})
-        except: pass
-        
-    # Ödemeler
-    for o in Odeme.objects.filter(tedarikci=tedarikci):
-        hareketler.append({'tarih': o.tarih, 'aciklama': f"Ödeme ({o.odeme_turu})", 'borc': Decimal('0'), 'alacak': to_decimal(o.tutar)})
-    
-    hareketler.sort(key=lambda x: x['tarih'])
-    bakiye = Decimal('0.00')
-    for h in hareketler: 
-        bakiye += (h['borc'] - h['alacak'])
-        h['bakiye'] = bakiye
-        
+    hareketler = CariService.ekstre_satirlari(tedarikci.id)
     return render(request, 'cari_ekstre.html', {'tedarikci': tedarikci, 'hareketler': hareketler})
 
 @login_required
 def get_tedarikci_bakiye(request, tedarikci_id):
     try:
         tedarikci = Tedarikci.objects.get(id=tedarikci_id)
-        # Basit bakiye sorgusu
-        hakedis_borc = Hakedis.objects.filter(satinalma__teklif__tedarikci=tedarikci, onay_durumu=True).aggregate(t=Sum('odenecek_net_tutar'))['t'] or Decimal('0')
-        odenen = Odeme.objects.filter(tedarikci=tedarikci).aggregate(t=Sum('tutar'))['t'] or Decimal('0')
-        # Malzeme borcu eklenebilir, şimdilik temel mantık
-        return JsonResponse({'success': True, 'kalan_bakiye': float(hakedis_borc-odenen)})
+        # Faturalar, hakedişler, ödemeler ve iadeler CariBakiye'de tek satırda toplanmış durumda
+        return JsonResponse({'success': True, 'kalan_bakiye': float(CariService.bakiye(tedarikci.id).bakiye)})
     except Exception as e: return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
@@ -3,6 +3,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth import logout
 from django.utils import timezone
 from core.models import MalzemeTalep, Teklif, Odeme, Harcama
+from core.services import CariService
 from .guvenlik import yetki_kontrol
 
 def erisim_engellendi(request):
@@ -25,9 +26,8 @@ def belge_yazdir(request, model_name, pk):
     
     def hesapla_bakiye(tedarikci):
         if not tedarikci: return 0
-        borc = sum(t.toplam_fiyat_tl for t in tedarikci.teklifler.filter(durum='onaylandi'))
-        odenen = float(sum(o.tutar for o in tedarikci.odemeler.all()))
-        return borc - odenen
+        # Cari bakiye CariBakiye tablosunda artımlı tutulur: tek satır okunur
+        return CariService.bakiye(tedarikci.id).bakiye
 
     if model_name == 'teklif':
         obj = get_object_or_404(Teklif, pk=pk)
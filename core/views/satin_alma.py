@@ -3,11 +3,36 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
-from core.models import SatinAlma, Depo, DepoHareket, Fatura, DepoTransfer
-from core.forms import FaturaGirisForm
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from core.models import SatinAlma, Depo, DepoHareket, Fatura, DepoTransfer, Tedarikci
+from core.forms import FaturaGirisForm, TopluMalKabulForm
+from core.services import StockService
 from .guvenlik import yetki_kontrol
-from core.utils import to_decimal
-from django.db.models import F
+from core.utils import to_decimal, keyset_sayfala
+from django.db.models import F, Q
+
+
+SIPARIS_SIRALAMALARI = {
+    'yeni': ['-created_at', '-id'],
+    'eski': ['created_at', 'id'],
+    'bekleyen': ['-sanal_bekleyen', '-created_at', '-id'],
+}
+
+
+def _siparis_sorgusu(request):
+    """Onaylı siparişler + ?tedarikci= ve ?q= (malzeme / iş kalemi adı) süzgeçleri."""
+    siparisler = SatinAlma.objects.filter(
+        teklif__durum='onaylandi'
+    ).select_related('teklif__tedarikci', 'teklif__malzeme', 'teklif__is_kalemi')
+
+    tedarikci_id = request.GET.get('tedarikci')
+    if tedarikci_id and tedarikci_id.isdigit():
+        siparisler = siparisler.filter(teklif__tedarikci_id=tedarikci_id)
+    arama = request.GET.get('q', '').strip()
+    if arama:
+        siparisler = siparisler.filter(Q(teklif__malzeme__isim__icontains=arama) | Q(teklif__is_kalemi__isim__icontains=arama))
+    return siparisler
 
 
 @login_required
@@ -16,23 +41,29 @@ def siparis_listesi(request):
         return redirect('erisim_engellendi')
     
     # KRİTİK FİLTRE: Sadece teklifi 'onaylandi' durumunda olan siparişleri getiriyoruz
-    tum_siparisler = SatinAlma.objects.filter(
-        teklif__durum='onaylandi'
-    ).select_related(
-        'teklif__tedarikci', 'teklif__malzeme', 'teklif__is_kalemi'
-    ).prefetch_related('depo_hareketleri', 'depo_hareketleri__depo').order_by('-created_at')
-
-    bekleyenler, bitenler = [], []
-    for siparis in tum_siparisler:
-        # Sanal depoda mal varsa veya fatura kesilmemiş miktar varsa işlem bitmemiştir.
-        if siparis.sanal_depoda_bekleyen > 0 or siparis.kalan_fatura_miktar > 0:
-            bekleyenler.append(siparis)
-        else:
-            bitenler.append(siparis)
+    # Açık / kapalı ayrımı projeksiyon kolonundan (acik_mi) SQL'de yapılır:
+    # sanal depoda mal veya fatura kesilmemiş miktar varsa işlem bitmemiştir.
+    siparisler = _siparis_sorgusu(request)
+
+    sira = request.GET.get('sira')
+    if sira not in SIPARIS_SIRALAMALARI:
+        sira = 'yeni'
+    bekleyenler = siparisler.filter(acik_mi=True).order_by(*SIPARIS_SIRALAMALARI[sira])
+
+    # Biten siparişler sürekli büyür: (created_at, id) üzerinden yeniden eskiye imleçli sayfalama
+    bitenler, sonraki_imlec = keyset_sayfala(
+        siparisler.filter(acik_mi=False), request.GET.get('imlec'), ['created_at', 'id'], azalan=True
+    )
 
     return render(request, 'siparis_listesi.html', {
         'bekleyenler': bekleyenler,
-        'bitenler': bitenler
+        'bitenler': bitenler,
+        'sonraki_imlec': sonraki_imlec,
+        'ilk_sayfa_mi': not request.GET.get('imlec'),
+        'tedarikciler': Tedarikci.objects.filter(teklifler__satinalma_donusumu__isnull=False).distinct().order_by('firma_unvani'),
+        'secili_tedarikci': request.GET.get('tedarikci', ''),
+        'arama': request.GET.get('q', ''),
+        'sira': sira,
     })
 
 @login_required
@@ -44,13 +75,8 @@ def mal_kabul(request):
     if not yetki_kontrol(request.user, ['SAHA_VE_DEPO', 'YONETICI']):
         return redirect('erisim_engellendi')
     
-    # KRİTİK FİLTRE: Sadece onaylı teklifler
-    siparisler = SatinAlma.objects.filter(
-        teklif__durum='onaylandi'
-    ).select_related('teklif__tedarikci', 'teklif__malzeme').order_by('-created_at')
-    
-    # Sadece sanal depoda stoğu olanları göster
-    aktif_siparisler = [s for s in siparisler if s.sanal_depoda_bekleyen > 0]
+    # KRİTİK FİLTRE: Sadece onaylı teklifler; sanal depoda stoğu olanlar (projeksiyon kolonu ile SQL'de)
+    aktif_siparisler = _siparis_sorgusu(request).filter(sanal_bekleyen__gt=0).order_by('-created_at', '-id')
     
     fiziksel_depolar = Depo.objects.filter(is_sanal=False)
     
@@ -81,15 +107,11 @@ def fatura_girisi(request, siparis_id=None):
             fatura = form.save(commit=False)
             fatura.satinalma = secili_siparis
             fatura.kayit_eden = request.user
+            # Not: Fatura.save() siparişteki 'faturalanan_miktar'ı F() ile artırır (burada tekrar artırılmaz)
             fatura.save()
-            
-            # F() Kullanımı: Yarış durumunu (Lost Update) önlemek için
-            SatinAlma.objects.filter(id=secili_siparis.id).update(
-                faturalanan_miktar=F('faturalanan_miktar') + fatura.miktar
-            )
 
-            # Sanal depoya giriş hareketi
-            DepoHareket.objects.create(
+            # Sanal depoya giriş hareketi (Bakiye aynı transaction içinde güncellenir)
+            StockService.hareket_olustur(
                 siparis=secili_siparis,
                 depo=fatura.depo, 
                 malzeme=secili_siparis.teklif.malzeme,
@@ -155,26 +177,89 @@ def mal_kabul_islem(request, siparis_id):
         
         # ✅ TEK YOL: Manuel DepoHareket yerine Transfer oluşturuyoruz.
         # Bu işlem core/signals.py üzerinden merkezi olarak yönetilir.
-        DepoTransfer.objects.create(
-            malzeme=siparis.teklif.malzeme,
-            miktar=miktar,
-            kaynak_depo=sanal_depo,
-            hedef_depo=hedef_depo,
-            bagli_siparis=siparis,
-            tarih=timezone.now().date(),
-            notlar=f"Satın alma mal kabulü: {siparis.id}"
-        )
-
-        # Teslim edilen miktarı güvenli şekilde (F() ile) artırıyoruz
-        SatinAlma.objects.filter(id=siparis.id).update(
-            teslim_edilen=F('teslim_edilen') + miktar
-        )
+        # Sanal depo bakiyesi kilit altında yeniden doğrulanır (StockService.stok_kilitle).
+        try:
+            with transaction.atomic():
+                DepoTransfer.objects.create(
+                    malzeme=siparis.teklif.malzeme,
+                    miktar=miktar,
+                    kaynak_depo=sanal_depo,
+                    hedef_depo=hedef_depo,
+                    bagli_siparis=siparis,
+                    tarih=timezone.now().date(),
+                    aciklama=f"Satın alma mal kabulü: {siparis.id}"
+                )  # Teslim edilen miktarı sinyal (F() ile) artırır
+        except ValidationError as e:
+            messages.error(request, f"Hata: {' '.join(e.messages)}")
+            return redirect('mal_kabul')
 
         messages.success(request, f"✅ {miktar} birim mal başarıyla {hedef_depo.isim} deposuna alındı.")
         return redirect('mal_kabul')
 
     return render(request, 'mal_kabul_islem.html', {'siparis': siparis, 'depolar': fiziksel_depolar})
 
+@login_required
+def toplu_mal_kabul(request):
+    """
+    Çok siparişli mal kabul: Tedarikçi tek sevkiyatta birden fazla siparişi teslim ettiğinde
+    tüm satırlar tek formda girilir; doğrulama ve yazım tek transaction'da topludur (StockService.toplu_mal_kabul).
+    """
+    if not yetki_kontrol(request.user, ['SAHA_VE_DEPO', 'YONETICI']):
+        return redirect('erisim_engellendi')
+
+    sanal_depo = Depo.objects.filter(is_sanal=True).first()
+    tedarikci_id = request.GET.get('tedarikci') or request.POST.get('tedarikci') or ''
+    if not tedarikci_id.isdigit():
+        tedarikci_id = ''
+
+    # Sanal depoda malı bekleyen siparişler (bekleyen miktar ilişkili alt sorgu ile, tek sorguda)
+    siparisler = SatinAlma.objects.filter(
+        teklif__durum='onaylandi', teklif__malzeme__isnull=False
+    ).annotate(
+        bekleyen=StockService.sanal_bekleyen_ifadesi()
+    ).filter(bekleyen__gt=0).select_related('teklif__tedarikci', 'teklif__malzeme').order_by('created_at', 'id')
+    if tedarikci_id:
+        siparisler = siparisler.filter(teklif__tedarikci_id=tedarikci_id)
+
+    girilen = {}
+    if request.method == 'POST':
+        form = TopluMalKabulForm(request.POST)
+        for anahtar, deger in request.POST.items():
+            if anahtar.startswith('miktar_') and deger.strip():
+                siparis_no = anahtar[len('miktar_'):]
+                if siparis_no.isdigit():
+                    girilen[siparis_no] = to_decimal(deger)
+                else:
+                    messages.warning(request, f"⚠️ Geçersiz satır atlandı: {anahtar}")
+
+        if not sanal_depo:
+            messages.error(request, "⛔ Sistemde sanal depo tanımlı değil.")
+        elif form.is_valid():
+            irsaliye = form.save(commit=False)
+            irsaliye.kaynak_depo = sanal_depo
+            try:
+                StockService.toplu_mal_kabul(irsaliye, girilen)
+                adet = sum(1 for miktar in girilen.values() if miktar)
+                messages.success(request, f"✅ {adet} sipariş için mal kabul yapıldı: {irsaliye}")
+                return redirect('siparis_listesi')
+            except ValidationError as e:
+                for hata in e.messages:
+                    messages.error(request, f"⛔ {hata}")
+    else:
+        form = TopluMalKabulForm(initial={'tarih': timezone.now().date()})
+
+    siparisler = list(siparisler)
+    for siparis in siparisler:
+        siparis.girilen = girilen.get(str(siparis.id), '')
+
+    return render(request, 'toplu_mal_kabul.html', {
+        'form': form,
+        'siparisler': siparisler,
+        'tedarikciler': Tedarikci.objects.filter(teklifler__satinalma_donusumu__isnull=False).distinct().order_by('firma_unvani'),
+        'secili_tedarikci': tedarikci_id,
+        'sanal_depo': sanal_depo,
+    })
+
 @login_required
 def siparis_detay(request, siparis_id):
     if not yetki_kontrol(request.user, ['OFIS_VE_SATINALMA', 'SAHA_VE_DEPO', 'YONETICI']):
@@ -202,14 +287,16 @@ def fatura_sil(request, fatura_id):
         faturalanan_miktar=F('faturalanan_miktar') - fatura.miktar
     )
     
-    # Faturaya bağlı DepoHareket kaydını bul ve sil
-    DepoHareket.objects.filter(
+    # Faturaya bağlı DepoHareket kaydını bul ve sil (Bakiye de geri alınır)
+    StockService.hareketleri_sil(DepoHareket.objects.filter(
         siparis=siparis, 
         miktar=fatura.miktar, 
         islem_turu='giris',
         aciklama__icontains=fatura.fatura_no
-    ).delete()
+    ))
     
     fatura.delete()
+    # Hizmet faturalarında defter hareketi yoktur; açık/kapalı projeksiyonu burada yenilenir
+    StockService.siparis_ozetlerini_guncelle([siparis.id])
     messages.warning(request, f"🗑️ {fatura.fatura_no} nolu fatura ve ilgili stok girişi silindi.")
     return redirect('siparis_detay', siparis_id=siparis.id)
\ No newline at end of file
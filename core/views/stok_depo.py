@@ -1,15 +1,23 @@
+import hashlib
 import json
+from datetime import date
 from decimal import Decimal
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Sum, Q, F, Value, DecimalField
+from django.db import transaction
+from django.db.models import Sum, Q, F, Value, DecimalField, CharField, Count, Max, Case, When
 from django.db.models.functions import Coalesce
-from django.http import JsonResponse, HttpResponse
-from core.models import Malzeme, DepoHareket, MalzemeTalep, SatinAlma, Depo, DepoTransfer
-from core.forms import DepoTransferForm
-from core.services import StockService
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from core.models import Malzeme, DepoHareket, ArsivDepoHareket, MalzemeTalep, SatinAlma, Depo, DepoTransfer, StokBakiye
+from django.core.exceptions import ValidationError
+from core.forms import DepoTransferForm, SevkIrsaliyesiForm, IrsaliyeKalemiFormSet
+from core.services import StockService, MaliyetService, TuketimService
+from core.utils import keyset_sayfala
+from core import stok_sorgulari
+from core.stok_sorgulari import STOK_DURUM_RENKLERI
 from .guvenlik import yetki_kontrol
 
 @login_required
@@ -17,22 +25,20 @@ def depo_dashboard(request):
     if not yetki_kontrol(request.user, ['SAHA_EKIBI', 'OFIS_VE_SATINALMA', 'YONETICI']): 
         return redirect('erisim_engellendi')
     
-    # Uzman Formülü: Giriş - Çıkış - İade (Dashboard için Coalesce ile koruma sağlandı)
-    malzemeler = Malzeme.objects.annotate(
-        giren=Coalesce(Sum('hareketler__miktar', filter=Q(hareketler__islem_turu='giris')), Value(0, output_field=DecimalField())),
-        cikan=Coalesce(Sum('hareketler__miktar', filter=Q(hareketler__islem_turu='cikis')), Value(0, output_field=DecimalField())),
-        iadeler=Coalesce(Sum('hareketler__miktar', filter=Q(hareketler__islem_turu='iade')), Value(0, output_field=DecimalField())),
-    ).annotate(hesaplanan_stok=F('giren') - F('cikan') - F('iadeler'))
-
+    # Stok ve durum ortak sorgu katmanından gelir (kullanım yerlerindeki bakiyeler hariç)
+    # Günlük tüketim hızları (son 30 gün) günlük önbellekten gelir; panel her açılışta defteri toplamaz
+    hizlar = TuketimService.gunluk_hizlar()
     depo_ozeti = []
-    for mal in malzemeler:
-        stok_degeri = mal.hesaplanan_stok
-        durum_renk = "danger" if stok_degeri <= mal.kritik_stok else ("warning" if stok_degeri <= (mal.kritik_stok * 1.5) else "success")
+    for mal in stok_sorgulari.stoklu_malzemeler():
+        # Panel kartlarında stoksuz malzeme de kırmızı çerçeveyle gösterilir
+        durum_renk = 'danger' if mal.stok_durumu == 'YOK' else STOK_DURUM_RENKLERI[mal.stok_durumu]
         depo_ozeti.append({
             'isim': mal.isim, 
             'birim': mal.get_birim_display(), 
-            'stok': stok_degeri, 
-            'durum_renk': durum_renk
+            'stok': mal.hesaplanan_stok, 
+            'durum': mal.stok_durumu,
+            'durum_renk': durum_renk,
+            'kapsama_gun': TuketimService.kapsama_gunu(mal.hesaplanan_stok, hizlar.get(mal.id)),
         })
 
     context = {
@@ -49,54 +55,67 @@ def stok_listesi(request):
         return redirect('erisim_engellendi')
     
     search = request.GET.get('search', '')
+    durum = request.GET.get('durum', '')
     
-    # KRİTİK DÜZELTME: 
-    # hesaplanan_stok formülünde girişleri toplarken kullanım depolarını (is_kullanim_yeri=True) hariç tutuyoruz.
-    malzemeler = Malzeme.objects.annotate(
-        hesaplanan_stok=Coalesce(
-            Sum('hareketler__miktar', filter=Q(hareketler__islem_turu='giris', hareketler__depo__is_kullanim_yeri=False)), 
-            Value(0, output_field=DecimalField())
-        ) - Coalesce(
-            Sum('hareketler__miktar', filter=Q(hareketler__islem_turu='cikis')), 
-            Value(0, output_field=DecimalField())
-        ) - Coalesce(
-            Sum('hareketler__miktar', filter=Q(hareketler__islem_turu='iade')), 
-            Value(0, output_field=DecimalField())
-        )
-    )
+    # Stok ve durum etiketi ortak sorgu katmanından gelir (kullanım yerleri hariç).
+    # Alt sorgu (GROUP BY yok) sayesinde durum filtresi ve sayaçlar doğrudan SQL'de çalışır.
+    malzemeler = stok_sorgulari.stoklu_malzemeler()
     
     if search:
         malzemeler = malzemeler.filter(isim__icontains=search)
-    
-    # Görsel Durum Belirleme (Renkler ve Etiketler)
-    for m in malzemeler:
-        stok = m.hesaplanan_stok
-        limit = Decimal(str(m.kritik_stok or 0))
-        
-        if stok <= 0:
-            m.stok_durumu = "YOK"
-            m.stok_renk = "secondary"
-        elif stok <= limit:
-            m.stok_durumu = "KRİTİK"
-            m.stok_renk = "danger"
-        elif stok <= (limit * Decimal('1.5')):
-            m.stok_durumu = "AZALDI"
-            m.stok_renk = "warning"
-        else:
-            m.stok_durumu = "YETERLİ"
-            m.stok_renk = "success"
-
-    # İstatistikler (Filtrelenmiş stok üzerinden)
-    kritik_sayisi = sum(1 for m in malzemeler if 0 < m.hesaplanan_stok <= Decimal(str(m.kritik_stok or 0)))
-    yok_sayisi = sum(1 for m in malzemeler if m.hesaplanan_stok <= 0)
+
+    # İstatistikler (Arama filtresi uygulanmış stok üzerinden, TEK sorgu)
+    istatistik = malzemeler.aggregate(
+        toplam_sayisi=Count('id'),
+        kritik_sayisi=Count('id', filter=Q(stok_durumu='KRİTİK')),
+        yok_sayisi=Count('id', filter=Q(stok_durumu='YOK')),
+    )
+
+    if durum in STOK_DURUM_RENKLERI:
+        malzemeler = malzemeler.filter(stok_durumu=durum)
+
+    sayfa, sonraki_imlec = keyset_sayfala(malzemeler, request.GET.get('imlec'), ['isim', 'id'])
+    for m in sayfa:
+        m.stok_renk = STOK_DURUM_RENKLERI[m.stok_durumu]
 
     return render(request, 'stok_listesi.html', {
-        'malzemeler': malzemeler, 
+        'malzemeler': sayfa, 
         'search_query': search, 
-        'kritik_sayisi': kritik_sayisi,
-        'yok_sayisi': yok_sayisi
+        'durum': durum,
+        'durumlar': list(STOK_DURUM_RENKLERI),
+        'sonraki_imlec': sonraki_imlec,
+        'ilk_sayfa_mi': not request.GET.get('imlec'),
+        **istatistik,
     })
 
+@login_required
+def yeniden_siparis(request):
+    """
+    Kritik stok altındaki malzemeler için sipariş önerileri (tek sorgu) ve
+    seçilenler için toplu taslak talep oluşturma.
+    """
+    if not yetki_kontrol(request.user, ['OFIS_VE_SATINALMA', 'SAHA_VE_DEPO', 'YONETICI']):
+        return redirect('erisim_engellendi')
+
+    try:
+        katsayi = Decimal(request.POST.get('katsayi') or request.GET.get('katsayi') or '2')
+    except ArithmeticError:
+        katsayi = Decimal('2')
+
+    oneriler = StockService.yeniden_siparis_onerileri(katsayi)
+
+    if request.method == 'POST':
+        secilenler = set(request.POST.getlist('secili'))
+        talepler = StockService.yeniden_siparis_talepleri_olustur(
+            [m for m in oneriler if str(m.id) in secilenler], talep_eden=request.user
+        )
+        if talepler:
+            messages.success(request, f"✅ {len(talepler)} malzeme için taslak talep oluşturuldu.")
+            return redirect('icmal_raporu')
+        messages.warning(request, "Talep oluşturmak için en az bir malzeme seçiniz.")
+
+    return render(request, 'yeniden_siparis.html', {'oneriler': oneriler, 'katsayi': katsayi})
+
 @login_required
 def depo_transfer(request):
     if not yetki_kontrol(request.user, ['OFIS_VE_SATINALMA', 'DEPO_SORUMLUSU', 'SAHA_VE_DEPO', 'YONETICI']): 
@@ -122,56 +141,170 @@ def depo_transfer(request):
         form = DepoTransferForm(request.POST)
         if form.is_valid():
             transfer = form.save(commit=False)
-            
-            # Stok kontrolü
-            kaynak_stok = transfer.malzeme.depo_stogu(transfer.kaynak_depo.id)
-            if transfer.miktar > kaynak_stok:
-                messages.error(request, f"⛔ Kaynak depoda yeterli stok yok! Mevcut: {kaynak_stok}")
-                return redirect(f"{request.path}?siparis_id={siparis_id}" if siparis_id else request.path)
-            
             if siparis:
                 transfer.bagli_siparis = siparis
-                
-            transfer.save() # Sinyaller üzerinden StockService'i tetikler
-            messages.success(request, "✅ Transfer başarıyla kaydedildi.")
-            return redirect('siparis_listesi') if siparis else redirect('stok_listesi')
+
+            # Stok kontrolü kaydetmeyle AYNI transaction'da, kaynak bakiye satırı kilitlenerek yapılır
+            # (StockService.stok_kilitle). Yetersizse transfer kaydı da geri alınır ve form girilen
+            # değerlerle, hata mesajıyla tekrar gösterilir.
+            try:
+                with transaction.atomic():
+                    transfer.save() # Sinyaller üzerinden StockService'i tetikler
+            except ValidationError as e:
+                form.add_error(None, e)
+            else:
+                messages.success(request, "✅ Transfer başarıyla kaydedildi.")
+                return redirect('siparis_listesi') if siparis else redirect('stok_listesi')
     else:
         form = DepoTransferForm(initial=initial_data)
         
     return render(request, 'depo_transfer.html', {'form': form, 'siparis': siparis})
 
+@login_required
+def irsaliye_olustur(request):
+    """
+    Çok kalemli sevk irsaliyesi (Tek kamyon, N malzeme).
+    Stok doğrulaması tek sorguda, defter ve bakiye yazımı toplu (bulk) yapılır.
+    """
+    if not yetki_kontrol(request.user, ['OFIS_VE_SATINALMA', 'DEPO_SORUMLUSU', 'SAHA_VE_DEPO', 'YONETICI']): 
+        return redirect('erisim_engellendi')
+
+    if request.method == 'POST':
+        form = SevkIrsaliyesiForm(request.POST)
+        formset = IrsaliyeKalemiFormSet(request.POST, prefix='kalem')
+        if form.is_valid() and formset.is_valid():
+            kalemler = [f.cleaned_data for f in formset if f.cleaned_data]
+            try:
+                irsaliye = StockService.execute_bulk_transfer(form.save(commit=False), kalemler)
+                messages.success(request, f"✅ İrsaliye kaydedildi ({len(kalemler)} kalem): {irsaliye}")
+                return redirect('stok_listesi')
+            except ValidationError as e:
+                for hata in e.messages:
+                    messages.error(request, f"⛔ {hata}")
+    else:
+        form = SevkIrsaliyesiForm(initial={'tarih': timezone.now().date()})
+        formset = IrsaliyeKalemiFormSet(prefix='kalem')
+
+    return render(request, 'irsaliye_olustur.html', {'form': form, 'formset': formset})
+
 @login_required
 def stok_hareketleri(request, malzeme_id):
     if not yetki_kontrol(request.user, ['OFIS_VE_SATINALMA', 'SAHA_VE_DEPO', 'YONETICI']): 
         return redirect('erisim_engellendi')
     malzeme = get_object_or_404(Malzeme, id=malzeme_id)
-    hareketler = DepoHareket.objects.filter(malzeme_id=malzeme_id).order_by('-tarih')
-    return render(request, 'stok_hareketleri.html', {'malzeme': malzeme, 'hareketler': hareketler})
+    # ?arsiv=1: Kapanış öncesi arşivlenmiş geçmiş (ArsivDepoHareket), istenirse sayfalanır
+    arsiv_modu = request.GET.get('arsiv') == '1'
+    if arsiv_modu:
+        model, sira_alani = ArsivDepoHareket, 'orijinal_id'
+    else:
+        model, sira_alani = DepoHareket, 'id'
+
+    # (malzeme, tarih, id) indeksi üzerinden yeniden eskiye imleçli sayfalama
+    hareketler, sonraki_imlec = keyset_sayfala(
+        model.objects.filter(malzeme_id=malzeme_id).select_related('depo'),
+        request.GET.get('imlec'), ['tarih', sira_alani], azalan=True
+    )
+    # Depo bazında yürüyen bakiye (SQL window fonksiyonu + tek sorguda sayfa açılış bakiyesi)
+    bakiyeler = StockService.yuruyen_bakiyeler(hareketler, model=model, sira_alani=sira_alani)
+    for h in hareketler:
+        h.yuruyen_bakiye = bakiyeler.get(h.id)
+    return render(request, 'stok_hareketleri.html', {
+        'malzeme': malzeme,
+        'hareketler': hareketler,
+        'sonraki_imlec': sonraki_imlec,
+        'ilk_sayfa_mi': not request.GET.get('imlec'),
+        'arsiv_modu': arsiv_modu,
+        # Canlı defterin son sayfasında arşive geçiş bağlantısı gösterilir
+        'arsiv_var_mi': not arsiv_modu and not sonraki_imlec and malzeme.arsiv_hareketleri.exists(),
+    })
+
+def _toplu_stok_parametreleri(request):
+    """
+    ?ciftler=12:3,15:3 (malzeme_id:depo_id) ve/veya ?depo_id=3 parametrelerini çözer.
+    Geçersiz parametrede ValueError fırlatır.
+    """
+    ciftler = None
+    if request.GET.get('ciftler'):
+        ciftler = set()
+        for cift in request.GET['ciftler'].split(','):
+            mal_id, depo_id = cift.split(':')
+            ciftler.add((int(mal_id), int(depo_id)))
+
+    depo_id = request.GET.get('depo_id')
+    depo_id = int(depo_id) if depo_id else None
+
+    if ciftler is None and depo_id is None:
+        raise ValueError("'ciftler' veya 'depo_id' parametresi gereklidir.")
+    return ciftler, depo_id
 
 @login_required
-def get_depo_stok(request):
+def toplu_depo_stok(request):
+    """
+    Toplu stok API'si: çok sayıda (malzeme, depo) bakiyesini TEK sorguda döner.
+    ETag / If-None-Match desteklidir; bakiyeler değişmediyse 304 döner ve veri okunmaz.
+    """
     try:
-        mal_id = request.GET.get('malzeme_id')
-        depo_id = request.GET.get('depo_id')
-        if mal_id and depo_id:
-            stok = Malzeme.objects.get(id=mal_id).depo_stogu(depo_id)
-            return JsonResponse({'stok': float(stok)})
-        return JsonResponse({'stok': 0})
-    except Exception as e:
+        ciftler, depo_id = _toplu_stok_parametreleri(request)
+    except ValueError as e:
+        return JsonResponse({'hata': f"Geçersiz parametre: {e}"}, status=400)
+
+    bakiyeler = StockService.bakiye_sorgusu(ciftler=ciftler, depo_id=depo_id)
+
+    # Parmak izi: eşleşen satır sayısı + en son güncelleme anı (bakiye yazan her yol guncelleme_tarihi'ni yeniler)
+    ozet = bakiyeler.aggregate(adet=Count('id'), son=Max('guncelleme_tarihi'))
+    etag = quote_etag(hashlib.md5(
+        f"{request.GET.urlencode()}|{ozet['adet']}|{ozet['son']}".encode()
+    ).hexdigest())
+
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        yanit = HttpResponseNotModified()
+    else:
+        stoklar = {
+            (m_id, d_id): miktar
+            for m_id, d_id, miktar in bakiyeler.values_list('malzeme_id', 'depo_id', 'miktar')
+        }
+        if ciftler is not None:
+            # İstenen ama bakiye satırı olmayan çiftler 0 döner, istenmeyenler süzülür
+            stoklar = {cift: stoklar.get(cift, Decimal('0')) for cift in ciftler}
+
+        yanit = JsonResponse({'stoklar': [
+            {'malzeme_id': m_id, 'depo_id': d_id, 'stok': float(miktar)}
+            for (m_id, d_id), miktar in sorted(stoklar.items())
+        ]})
+
+    yanit['ETag'] = etag
+    yanit['Cache-Control'] = 'private, no-cache'  # Tarayıcı saklar ama her seferinde ETag ile doğrular
+    return yanit
+
+@login_required
+def get_depo_stok(request):
+    """Tekil stok sorgusu (Eski API), toplu API'nin ince bir sarmalayıcısıdır."""
+    mal_id = request.GET.get('malzeme_id')
+    depo_id = request.GET.get('depo_id')
+    if not (mal_id and depo_id):
         return JsonResponse({'stok': 0})
+    try:
+        cift = (int(mal_id), int(depo_id))
+    except ValueError:
+        return JsonResponse({'hata': "Geçersiz malzeme_id / depo_id"}, status=400)
+
+    stok = StockService.bakiye_sorgusu(ciftler=[cift]).values_list('miktar', flat=True).first()
+    return JsonResponse({'stok': float(stok or 0)})
 
 @login_required
 def stok_rontgen(request, malzeme_id):
     if not request.user.is_superuser: return HttpResponse("Yetkisiz")
-    h = DepoHareket.objects.filter(malzeme_id=malzeme_id).order_by('tarih', 'id')
-    html = "<table border='1'><tr><th>ID</th><th>İşlem</th><th>Depo</th><th>Miktar</th></tr>" + \
-           "".join([f"<tr><td>{x.id}</td><td>{x.get_islem_turu_display()}</td><td>{x.depo.isim if x.depo else '-'}</td><td>{x.miktar}</td></tr>" for x in h]) + "</table>"
+    h = DepoHareket.objects.filter(malzeme_id=malzeme_id).select_related('depo').annotate(
+        yuruyen=StockService.yuruyen_bakiye_penceresi()
+    ).order_by('tarih', 'id')
+    html = "<table border='1'><tr><th>ID</th><th>Tarih</th><th>İşlem</th><th>Depo</th><th>Miktar</th><th>Depo Bakiyesi</th></tr>" + \
+           "".join([f"<tr><td>{x.id}</td><td>{x.tarih}</td><td>{x.get_islem_turu_display()}</td><td>{x.depo.isim if x.depo else '-'}</td><td>{x.miktar}</td><td>{x.yuruyen if x.depo else '-'}</td></tr>" for x in h]) + "</table>"
     return HttpResponse(html)
 
 @login_required
 def envanter_raporu(request):
     """
-    PERFORMANS OPTİMİZASYONU: Uzman raporu uyarınca Group By (annotate) kullanılmıştır.
+    PERFORMANS OPTİMİZASYONU: Stoklar StokBakiye tablosundan (malzeme x depo) tek sorguda okunur.
     Kullanım/Sarf depolarına giren malzemeler 'harcanmış' sayılır ve raporda görünmez.
     """
     if not yetki_kontrol(request.user, ['OFIS_VE_SATINALMA', 'SAHA_VE_DEPO', 'YONETICI', 'MUHASEBE_FINANS']): 
@@ -179,33 +312,159 @@ def envanter_raporu(request):
     
     # 1. KRİTİK FİLTRE: Sadece kullanım yeri OLMAYAN (is_kullanim_yeri=False) depoların stoklarını getir
     # Böylece Şantiye'ye (Kullanım yeri) giden 180 adet otomatik olarak 'yok' sayılır.
-    stok_verileri = DepoHareket.objects.filter(
-        depo__is_kullanim_yeri=False
-    ).values('depo_id', 'malzeme_id').annotate(
-        toplam_stok=Coalesce(Sum('miktar', filter=Q(islem_turu='giris')), Value(0, output_field=DecimalField())) - 
-                    Coalesce(Sum('miktar', filter=Q(islem_turu='cikis')), Value(0, output_field=DecimalField())) -
-                    Coalesce(Sum('miktar', filter=Q(islem_turu='iade')), Value(0, output_field=DecimalField()))
-    ).filter(toplam_stok__gt=0) # Sadece gerçek stoğu kalanları listele
-
-    # 2. Modelleri tek seferde hafızaya al (N+1 Query problemini önlemek için)
-    depo_map = {d.id: d for d in Depo.objects.all()}
-    malzeme_map = {m.id: m for m in Malzeme.objects.all()}
-
-    # 3. Veriyi şablonun beklediği hiyerarşik yapıya dönüştür
+    # Bakiyeler StokBakiye tablosundan okunur, hareket geçmişi taranmaz.
+    bakiyeler = stok_sorgulari.kullanilabilir_bakiyeler().filter(
+        miktar__gt=0  # Sadece gerçek stoğu kalanları listele
+    ).select_related('depo', 'malzeme').order_by('depo_id', 'malzeme__isim')
+
+    # 2. Veriyi şablonun beklediği hiyerarşik yapıya dönüştür
     rapor_dict = {}
-    for veri in stok_verileri:
-        d_id = veri['depo_id']
-        m_id = veri['malzeme_id']
-        stok_miktari = veri['toplam_stok']
+    for bakiye in bakiyeler:
+        d_id = bakiye.depo_id
 
         if d_id not in rapor_dict:
-            rapor_dict[d_id] = {'depo': depo_map.get(d_id), 'stoklar': []}
+            rapor_dict[d_id] = {'depo': bakiye.depo, 'stoklar': []}
         
         rapor_dict[d_id]['stoklar'].append({
-            'malzeme': malzeme_map.get(m_id),
-            'miktar': stok_miktari
+            'malzeme': bakiye.malzeme,
+            'miktar': bakiye.miktar
         })
 
     rapor_data = list(rapor_dict.values())
             
-    return render(request, 'envanter_raporu.html', {'rapor_data': rapor_data})
\ No newline at end of file
+    return render(request, 'envanter_raporu.html', {'rapor_data': rapor_data})
+
+TUKETIM_PENCERELERI = (30, 90, 180, 365)
+
+@login_required
+def tuketim_raporu(request):
+    """
+    Malzeme ve kullanım yeri bazında günlük / haftalık / aylık net tüketim + mevcut stoğun kaç gün yeteceği.
+    Tüketim toplamları kapanmış günlerden, SQL'de tarih kovalanarak hesaplanır ve gün boyu önbellekte tutulur.
+    """
+    if not yetki_kontrol(request.user, ['OFIS_VE_SATINALMA', 'SAHA_VE_DEPO', 'YONETICI']):
+        return redirect('erisim_engellendi')
+
+    periyot = request.GET.get('periyot', 'hafta')
+    if periyot not in TuketimService.PERIYOTLAR:
+        periyot = 'hafta'
+    try:
+        gun_sayisi = int(request.GET.get('gun', 90))
+    except ValueError:
+        gun_sayisi = 90
+    if gun_sayisi not in TUKETIM_PENCERELERI:
+        gun_sayisi = 90
+    kullanim_yerleri = Depo.objects.filter(is_kullanim_yeri=True).order_by('isim')
+    secili_depo = request.GET.get('depo', '')
+    depo_id = int(secili_depo) if secili_depo.isdigit() else None
+
+    # 1. Kapsama (Days of cover): Ortalama günlük tüketim x mevcut kullanılabilir stok
+    hizlar = TuketimService.gunluk_hizlar(gun_sayisi)
+    kapsama = []
+    for mal in stok_sorgulari.stoklu_malzemeler(Malzeme.objects.filter(id__in=hizlar)):
+        kapsama.append({
+            'malzeme': mal,
+            'stok': mal.hesaplanan_stok,
+            'gunluk_hiz': hizlar[mal.id],
+            'kapsama_gun': TuketimService.kapsama_gunu(mal.hesaplanan_stok, hizlar[mal.id]),
+            'durum_renk': STOK_DURUM_RENKLERI[mal.stok_durumu],
+        })
+    kapsama.sort(key=lambda x: (x['kapsama_gun'] is None, x['kapsama_gun'] or 0))
+
+    # 2. Dönemsel tüketim (dönem x malzeme x kullanım yeri)
+    donemsel = TuketimService.donemsel_tuketim(periyot, gun_sayisi, depo_id)
+    malzemeler = Malzeme.objects.in_bulk({satir['malzeme_id'] for satir in donemsel})
+    depolar = {d.id: d for d in kullanim_yerleri}
+    satirlar = [
+        {**satir, 'malzeme': malzemeler.get(satir['malzeme_id']), 'depo': depolar.get(satir['depo_id'])}
+        for satir in donemsel
+    ]
+
+    return render(request, 'tuketim_raporu.html', {
+        'kapsama': kapsama,
+        'satirlar': satirlar,
+        'periyot': periyot,
+        'periyotlar': [('gun', 'Günlük'), ('hafta', 'Haftalık'), ('ay', 'Aylık')],
+        'gun_sayisi': gun_sayisi,
+        'pencereler': TUKETIM_PENCERELERI,
+        'kullanim_yerleri': kullanim_yerleri,
+        'secili_depo': secili_depo,
+    })
+
+@login_required
+def stok_degerleme_raporu(request):
+    """
+    Depo bazında stok değeri (TL). Değerler StokBakiye.maliyet_tutari'ndan okunur
+    (maliyet katmanlarıyla artımlı tutulur), hareket geçmişi yeniden oynatılmaz.
+    Kullanım/Sarf depoları (harcanmış sayılır) hariçtir.
+    """
+    if not yetki_kontrol(request.user, ['OFIS_VE_SATINALMA', 'YONETICI', 'MUHASEBE_FINANS']):
+        return redirect('erisim_engellendi')
+
+    bakiyeler = stok_sorgulari.kullanilabilir_bakiyeler().exclude(miktar=0, maliyet_tutari=0)
+
+    # 1. Depo özetleri (Tek gruplu sorgu)
+    depo_ozetleri = list(
+        bakiyeler.values('depo_id', 'depo__isim', 'depo__is_sanal')
+        .annotate(kalem_sayisi=Count('id'), toplam_deger=Sum('maliyet_tutari'))
+        .order_by('depo__isim')
+    )
+    genel_toplam = sum((d['toplam_deger'] or Decimal('0')) for d in depo_ozetleri)
+
+    # 2. Kalem detayı (seçili depo, imleçli sayfalama)
+    secili_depo = request.GET.get('depo', '')
+    if secili_depo.isdigit():
+        bakiyeler = bakiyeler.filter(depo_id=secili_depo)
+
+    kalemler, sonraki_imlec = keyset_sayfala(
+        bakiyeler.select_related('malzeme', 'depo').annotate(malzeme_isim=F('malzeme__isim')),
+        request.GET.get('imlec'), ['malzeme_isim', 'id'], boyut=100
+    )
+
+    return render(request, 'stok_degerleme.html', {
+        'depo_ozetleri': depo_ozetleri,
+        'genel_toplam': genel_toplam,
+        'kalemler': kalemler,
+        'secili_depo': secili_depo,
+        'sonraki_imlec': sonraki_imlec,
+        'ilk_sayfa_mi': not request.GET.get('imlec'),
+        'maliyet_yontemi': MaliyetService.yontem(),
+    })
+
+@login_required
+def envanter_raporu_tarihli(request):
+    """
+    'Şu tarihteki stok' raporu (Ay sonu sayımı vb.).
+    En yakın ay sonu kontrol noktasından başlanır, sadece sonrasındaki hareketler toplanır.
+    """
+    if not yetki_kontrol(request.user, ['OFIS_VE_SATINALMA', 'SAHA_VE_DEPO', 'YONETICI', 'MUHASEBE_FINANS']): 
+        return redirect('erisim_engellendi')
+
+    try:
+        rapor_tarihi = date.fromisoformat(request.GET.get('tarih', ''))
+    except ValueError:
+        rapor_tarihi = timezone.now().date()
+
+    # Kullanım/Sarf depoları anlık raporda olduğu gibi hariç
+    depo_map = {d.id: d for d in Depo.objects.filter(is_kullanim_yeri=False)}
+    bakiyeler = {
+        anahtar: miktar
+        for anahtar, miktar in StockService.tarihteki_bakiyeler(rapor_tarihi, depo_ids=list(depo_map)).items()
+        if miktar > 0
+    }
+    malzeme_map = Malzeme.objects.in_bulk({m_id for m_id, _ in bakiyeler})
+
+    rapor_dict = {}
+    for (m_id, d_id), miktar in sorted(bakiyeler.items(), key=lambda x: (x[0][1], malzeme_map[x[0][0]].isim)):
+        if d_id not in rapor_dict:
+            rapor_dict[d_id] = {'depo': depo_map[d_id], 'stoklar': []}
+
+        rapor_dict[d_id]['stoklar'].append({
+            'malzeme': malzeme_map[m_id],
+            'miktar': miktar
+        })
+
+    return render(request, 'envanter_raporu.html', {
+        'rapor_data': list(rapor_dict.values()),
+        'rapor_tarihi': rapor_tarihi,
+    })
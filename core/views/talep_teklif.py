@@ -4,30 +4,69 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
+from django.db.models import Case, Count, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
 from core.models import MalzemeTalep, Teklif, Malzeme, IsKalemi, SatinAlma
 from core.forms import TalepForm, TeklifForm
-from core.utils import tcmb_kur_getir
+from core.services import KurService
+from core.utils import keyset_sayfala
 from .guvenlik import yetki_kontrol
 
+# Aktif talepler aciliyete göre sıralanır (alfabetik sıra 'normal'ı en üste taşıyordu)
+ONCELIK_SIRASI = Case(
+    When(oncelik='cok_acil', then=Value(2)),
+    When(oncelik='acil', then=Value(1)),
+    default=Value(0),
+    output_field=IntegerField(),
+)
+
+def _talep_kartlari(request, durumlar, alanlar, **ekstra):
+    """
+    İcmal / arşiv kartlarının ortak sorgusu. Filtreler (öncelik, durum) SQL'de uygulanır;
+    en uygun teklif (reddedilmemişler içinde en düşük saklı TL tutarı) ve teklif sayısı
+    talep başına ilişkili alt sorgu olarak gelir. Teklifler sadece ekrandaki sayfa için çekilir.
+    """
+    talepler = MalzemeTalep.objects.filter(durum__in=durumlar)
+
+    oncelik = request.GET.get('oncelik', '')
+    if oncelik in dict(MalzemeTalep.ONCELIKLER):
+        talepler = talepler.filter(oncelik=oncelik)
+    durum = request.GET.get('durum', '')
+    if durum in durumlar:
+        talepler = talepler.filter(durum=durum)
+
+    gecerli_teklifler = Teklif.objects.filter(talep=OuterRef('pk')).exclude(durum='reddedildi')
+    en_uygun = gecerli_teklifler.order_by('toplam_tutar_tl', 'id')
+    talepler = talepler.select_related('malzeme', 'is_kalemi', 'talep_eden').prefetch_related(
+        'teklifler__tedarikci'
+    ).annotate(
+        en_uygun_teklif_id=Subquery(en_uygun.values('id')[:1]),
+        en_dusuk_tutar=Subquery(en_uygun.values('toplam_tutar_tl')[:1]),
+        teklif_sayisi=Coalesce(Subquery(
+            gecerli_teklifler.order_by().values('talep').annotate(adet=Count('id')).values('adet')
+        ), 0),
+        **ekstra
+    )
+
+    kartlar, sonraki_imlec = keyset_sayfala(talepler, request.GET.get('imlec'), alanlar, boyut=20, azalan=True)
+    return {
+        'aktif_talepler': kartlar,
+        'sonraki_imlec': sonraki_imlec,
+        'ilk_sayfa_mi': not request.GET.get('imlec'),
+        'oncelikler': MalzemeTalep.ONCELIKLER,
+        'durumlar': [(kod, etiket) for kod, etiket in MalzemeTalep.DURUMLAR if kod in durumlar],
+        'secili_oncelik': oncelik,
+        'secili_durum': durum,
+    }
+
 @login_required
 def icmal_raporu(request):
     if not yetki_kontrol(request.user, ['OFIS_VE_SATINALMA', 'MUHASEBE_FINANS', 'YONETICI']):
         return redirect('erisim_engellendi')
 
-    talepler_query = MalzemeTalep.objects.filter(
-        durum__in=['bekliyor', 'islemde', 'onaylandi']
-    ).select_related('malzeme', 'is_kalemi', 'talep_eden').prefetch_related('teklifler', 'teklifler__tedarikci').order_by('-oncelik', '-tarih')
-
-    aktif_talepler = list(talepler_query)
-    for talep in aktif_talepler:
-        teklifler = talep.teklifler.all()
-        if teklifler:
-            try:
-                en_uygun = min(teklifler, key=lambda t: t.toplam_fiyat_tl)
-                talep.en_uygun_teklif_id = en_uygun.id
-            except ValueError: pass
-
-    context = {'aktif_talepler': aktif_talepler}
+    context = _talep_kartlari(
+        request, ['bekliyor', 'islemde', 'onaylandi'], ['oncelik_sirasi', 'tarih', 'id'], oncelik_sirasi=ONCELIK_SIRASI
+    )
     return render(request, 'icmal.html', context)
 
 @login_required
@@ -73,7 +112,7 @@ def teklif_ekle(request):
         elif secili_talep.is_kalemi:
             initial_data['kdv_orani_secimi'] = secili_talep.is_kalemi.kdv_orani
 
-    guncel_kurlar = tcmb_kur_getir()
+    guncel_kurlar = KurService.guncel_kurlar()
     kurlar_dict = {k: float(v) for k, v in guncel_kurlar.items()}
     kurlar_dict['TRY'] = 1.0
     kurlar_json = json.dumps(kurlar_dict)
@@ -195,8 +234,9 @@ def talep_sil(request, talep_id):
 def arsiv_raporu(request):
     if not yetki_kontrol(request.user, ['OFIS_VE_SATINALMA', 'MUHASEBE_FINANS', 'YONETICI']):
         return redirect('erisim_engellendi')
-    arsiv_talepler = MalzemeTalep.objects.filter(durum='tamamlandi').select_related('malzeme', 'talep_eden').prefetch_related('teklifler__tedarikci').order_by('-temin_tarihi', '-tarih')
-    context = {'aktif_talepler': arsiv_talepler, 'arsiv_modu': True}
+    # temin_tarihi hiçbir akışta doldurulmadığından arşiv fiilen talep tarihine göre sıralıdır
+    context = _talep_kartlari(request, ['tamamlandi'], ['tarih', 'id'])
+    context['arsiv_modu'] = True
     return render(request, 'icmal.html', context)
 
 @login_required
@@ -39,6 +39,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.stok_sorgulari.StokSorguOnbellegiMiddleware',
 ]
 
 ROOT_URLCONF = 'fabrika.urls'
@@ -67,6 +68,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # SQLite'ta SELECT ... FOR UPDATE yoktur: Her transaction yazma kilidini BEGIN'de alır (BEGIN IMMEDIATE),
+            # böylece stok kontrolü + düşüm eş zamanlı isteklerde sıraya girer. Kilit için en fazla 20 sn beklenir.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -178,4 +185,8 @@ SESSION_COOKIE_AGE = 2592000
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 
 # Her işlemde süreyi sıfırla (Böylece aktif kullanıcı atılmaz)
-SESSION_SAVE_EVERY_REQUEST = True
\ No newline at end of file
+SESSION_SAVE_EVERY_REQUEST = True
+
+# Stok değerleme yöntemi (core/services.py -> MaliyetService)
+# 'FIFO' veya 'AGIRLIKLI_ORTALAMA'. Değiştirildiğinde: python manage.py maliyet_yeniden_kur
+STOK_MALIYET_YONTEMI = 'FIFO'
@@ -48,14 +48,21 @@ urlpatterns = [
     path('hizmet/sil/<int:pk>/', views.hizmet_sil, name='hizmet_sil'),
     path('siparisler/', views.siparis_listesi, name='siparis_listesi'),
     path('mal-kabul/<int:siparis_id>/', views.mal_kabul, name='mal_kabul'),
+    path('mal-kabul/toplu/', views.toplu_mal_kabul, name='toplu_mal_kabul'),
     path('siparis/detay/<int:siparis_id>/', views.siparis_detay, name='siparis_detay'),
     path('fatura-gir/<int:siparis_id>/', views.fatura_girisi, name='fatura_girisi'),
     path('fatura/sil/<int:fatura_id>/', views.fatura_sil, name='fatura_sil'),
     path('depo/transfer/', views.depo_transfer, name='depo_transfer'),
+    path('depo/irsaliye/', views.irsaliye_olustur, name='irsaliye_olustur'),
+    path('depo/yeniden-siparis/', views.yeniden_siparis, name='yeniden_siparis'),
     path('api/depo-stok/', views.get_depo_stok, name='get_depo_stok'),
+    path('api/depo-stok/toplu/', views.toplu_depo_stok, name='toplu_depo_stok'),
     path('debug/stok/<int:malzeme_id>/', views.stok_rontgen),
     path('stok/gecmis/<int:malzeme_id>/', views.stok_hareketleri, name='stok_hareketleri'),
     path('rapor/envanter/', views.envanter_raporu, name='envanter_raporu'),
+    path('rapor/envanter/tarihli/', views.envanter_raporu_tarihli, name='envanter_raporu_tarihli'),
+    path('rapor/stok-degerleme/', views.stok_degerleme_raporu, name='stok_degerleme_raporu'),
+    path('rapor/tuketim/', views.tuketim_raporu, name='tuketim_raporu'),
     path('hakedis/ekle/<int:siparis_id>/', views.hakedis_ekle, name='hakedis_ekle'),
     path('odeme/yap/', views.odeme_yap, name='odeme_yap'),
     path('cari/ekstre/<int:tedarikci_id>/', views.cari_ekstre, name='cari_ekstre'),